@@ -0,0 +1,130 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""Run python pipeline stages in a single interpreter.
+
+Usage: ``python -m scripts._py <stage> [<stage> ...] [options]``
+
+The stages (the scripts in this directory) run in the given order,
+in this process: each stage module is only imported when its turn
+comes, and the shared modules (``_lib``, the workspace index, the
+provisioned tools) are loaded once. The options are passed to every
+stage, e.g. ``python -m scripts._py format lint --changed-since main``.
+The first stage that fails stops the run with its exit code.
+"""
+
+import sys
+from importlib import import_module
+from pathlib import Path
+from typing import List
+
+HERE = Path(__file__).parent
+STAGES = (
+    "requirements",
+    "format",
+    "lint",
+    "test",
+    "docs",
+    "build",
+    "images",
+    "clean",
+    "benchmark",
+    "all",
+)
+
+
+def show_help() -> None:
+    """Show the usage."""
+    print("Usage: python -m scripts._py <stage> [<stage> ...] [options]")
+    print(f"Stages: {', '.join(STAGES)}")
+
+
+def split_args(args: List[str]) -> List[str]:
+    """Get the stages of the command line, leaving only the options.
+
+    Parameters
+    ----------
+    args : List[str]
+        The command line arguments (without the program).
+
+    Returns
+    -------
+    List[str]
+        The stages, in the given order.
+    """
+    stages: List[str] = []
+    while args and args[0] in STAGES:
+        stages.append(args.pop(0))
+    return stages
+
+
+def run_stage(stage: str) -> int:
+    """Run the ``main`` of a stage's script.
+
+    Parameters
+    ----------
+    stage : str
+        The stage (the name of a script in this directory).
+
+    Returns
+    -------
+    int
+        The stage's exit code.
+    """
+    # the stage's label in its output and in its timings
+    sys.argv[0] = str(HERE / f"{stage}.py")
+    try:
+        import_module(stage).main()
+    except SystemExit as error:
+        code = error.code
+        if code is None or isinstance(code, int):
+            return code or 0
+        print(code, file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_stages(stages: List[str]) -> int:
+    """Run stages until one of them fails.
+
+    Parameters
+    ----------
+    stages : List[str]
+        The stages, in order.
+
+    Returns
+    -------
+    int
+        The exit code of the failed stage, 0 if all succeeded.
+    """
+    for stage in stages:
+        exit_code = run_stage(stage)
+        if exit_code:
+            return exit_code
+    return 0
+
+
+def main() -> None:
+    """Run the stages given on the command line."""
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        show_help()
+        sys.exit(0)
+    stages = split_args(args)
+    if not stages:
+        if args:
+            print(f"Unknown stage: {args[0]}", file=sys.stderr)
+        show_help()
+        sys.exit(2)
+    sys.argv[1:] = args
+    try:
+        exit_code = run_stages(stages)
+    finally:
+        if len(stages) > 1:
+            # the timings of all the stages are written to one report
+            sys.argv[0] = "-".join(stages)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(HERE))
+    main()
@@ -0,0 +1,349 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""Content hashing and on-disk caches for the python scripts.
+
+Attributes
+----------
+CACHE_DIR_NAME : str
+    Name of the (per project) directory that holds the caches.
+
+Functions
+---------
+hash_file(path: Path) -> str
+    Get the sha256 of a file's content.
+hash_files(paths: Iterable[Path], relative_to: Path) -> str
+    Get a single hash for a set of files.
+
+Classes
+-------
+LintCache
+    Per file verdicts of a lint tool.
+BuildCache
+    The built artifacts of a project by the hash of its inputs.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Set, Tuple
+
+CACHE_DIR_NAME = ".cache"
+_CHUNK_SIZE = 1024 * 1024
+# (mtime_ns, size, sha256) per resolved path, to avoid re-reading files
+_HASHES: Dict[Path, Tuple[int, int, str]] = {}
+
+
+def hash_bytes(*parts: str) -> str:
+    """Get the sha256 of some strings.
+
+    Parameters
+    ----------
+    *parts : str
+        The strings to hash.
+
+    Returns
+    -------
+    str
+        The hex digest.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """Get the sha256 of a file's content.
+
+    The hash is remembered for the file's (mtime, size),
+    so unchanged files are only read once per process.
+
+    Parameters
+    ----------
+    path : Path
+        The file to hash.
+
+    Returns
+    -------
+    str
+        The hex digest, empty if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ""
+    cached = _HASHES.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    _HASHES[path] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def hash_files(paths: Iterable[Path], relative_to: Path) -> str:
+    """Get a single hash for a set of files (names and contents).
+
+    Parameters
+    ----------
+    paths : Iterable[Path]
+        The files to hash.
+    relative_to : Path
+        The directory the file names are relative to.
+
+    Returns
+    -------
+    str
+        The hex digest.
+    """
+    entries = sorted(
+        f"{path.relative_to(relative_to).as_posix()}:{hash_file(path)}"
+        for path in paths
+    )
+    return hash_bytes(*entries)
+
+
+def load_json(path: Path, default: Any) -> Any:
+    """Load a json file, falling back to a default.
+
+    Parameters
+    ----------
+    path : Path
+        The file to load.
+    default : Any
+        What to return if the file is missing or invalid.
+
+    Returns
+    -------
+    Any
+        The loaded data or the default.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return default
+
+
+def dump_json(path: Path, data: object) -> None:
+    """Atomically write a json file.
+
+    Parameters
+    ----------
+    path : Path
+        The file to write.
+    data : object
+        The data to write.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as file:
+        json.dump(data, file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class LintCache:
+    """Per file verdicts of a lint tool.
+
+    A file passes if a previous run of the same tool (same version and
+    arguments) with the same configuration succeeded on the same
+    content. Only the verdicts of successful runs are recorded.
+    """
+
+    def __init__(
+        self,
+        in_dir: Path,
+        tool_args: Sequence[str],
+        tool_version: str,
+        config_files: Sequence[str],
+    ) -> None:
+        """Load the cache of a tool.
+
+        Parameters
+        ----------
+        in_dir : Path
+            The directory the tool runs in.
+        tool_args : Sequence[str]
+            The tool's arguments (without the files to check).
+        tool_version : str
+            The installed version of the tool.
+        config_files : Sequence[str]
+            The config files (relative to in_dir) the tool reads.
+        """
+        self.in_dir = in_dir
+        tool_id = " ".join(tool_args)
+        self._salt = hash_bytes(
+            tool_id,
+            tool_version,
+            *(hash_file(in_dir / name) for name in config_files),
+        )
+        self._path = (
+            in_dir
+            / CACHE_DIR_NAME
+            / "lint"
+            / f"{hash_bytes(tool_id)[:16]}.json"
+        )
+        self._passed: Set[str] = set(load_json(self._path, []))
+
+    def _key(self, path: Path) -> str:
+        """Get the cache key of a file."""
+        relative = path.relative_to(self.in_dir).as_posix()
+        return hash_bytes(self._salt, relative, hash_file(path))[:32]
+
+    def get_misses(self, files: Sequence[Path]) -> List[Path]:
+        """Get the files without a (valid) passing verdict.
+
+        Parameters
+        ----------
+        files : Sequence[Path]
+            The files to check.
+
+        Returns
+        -------
+        List[Path]
+            The files the tool needs to check.
+        """
+        return [path for path in files if self._key(path) not in self._passed]
+
+    def is_tree_clean(self, files: Sequence[Path]) -> bool:
+        """Check if the tool passed on exactly this set of files.
+
+        Parameters
+        ----------
+        files : Sequence[Path]
+            All the files the tool checks.
+
+        Returns
+        -------
+        bool
+            Whether none of the files changed since the last pass.
+        """
+        return self._tree_key(files) in self._passed
+
+    def _tree_key(self, files: Sequence[Path]) -> str:
+        """Get a key for the whole set of files."""
+        return hash_bytes(self._salt, hash_files(files, self.in_dir))[:32]
+
+    def record(self, files: Sequence[Path], passed: Sequence[Path]) -> None:
+        """Record a successful run and save the cache.
+
+        Only the verdicts of the current files are kept.
+
+        Parameters
+        ----------
+        files : Sequence[Path]
+            All the files the tool checks.
+        passed : Sequence[Path]
+            The files the tool just checked successfully.
+        """
+        keys = {self._key(path) for path in files}
+        current = {key for key in keys if key in self._passed}
+        current.update(self._key(path) for path in passed)
+        if set(passed) == set(files):
+            current.add(self._tree_key(files))
+        self._passed = current
+        dump_json(self._path, sorted(current))
+
+
+class BuildCache:
+    """The built artifacts (wheels, sdists) of a project.
+
+    The artifacts are stored by the hash of the build's inputs, with
+    their sha256 (checked on restore). Only the most recently used
+    entries of each project are kept.
+    """
+
+    def __init__(self, cache_dir: Path, key: str, keep: int = 3) -> None:
+        """Get the entry of a key.
+
+        Parameters
+        ----------
+        cache_dir : Path
+            The project's build cache directory.
+        key : str
+            The hash of the build's inputs.
+        keep : int
+            The number of entries to keep.
+        """
+        self.cache_dir = cache_dir
+        self.key = key
+        self.keep = keep
+        self._entry = cache_dir / key
+
+    def restore(self, output_dir: Path) -> bool:
+        """Restore the artifacts of the entry (if any).
+
+        Parameters
+        ----------
+        output_dir : Path
+            The build's output directory (replaced on a hit).
+
+        Returns
+        -------
+        bool
+            Whether the artifacts were restored.
+        """
+        artifacts: Dict[str, str] = load_json(
+            self._entry / "artifacts.json", {}
+        )
+        if not artifacts or any(
+            hash_file(self._entry / name) != digest
+            for name, digest in artifacts.items()
+        ):
+            return False
+        shutil.rmtree(output_dir, ignore_errors=True)
+        output_dir.mkdir(parents=True)
+        for name in artifacts:
+            shutil.copy2(self._entry / name, output_dir / name)
+        # the entry was just used
+        os.utime(self._entry)
+        return True
+
+    def store(self, output_dir: Path) -> Dict[str, str]:
+        """Store the artifacts of a build.
+
+        Parameters
+        ----------
+        output_dir : Path
+            The build's output directory.
+
+        Returns
+        -------
+        Dict[str, str]
+            The sha256 of each artifact (by file name).
+        """
+        names = sorted(
+            path.name for path in output_dir.iterdir() if path.is_file()
+        )
+        artifacts = {name: hash_file(output_dir / name) for name in names}
+        if not artifacts:
+            return artifacts
+        tmp_entry = self.cache_dir / f"{self.key}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        tmp_entry.mkdir(parents=True)
+        for name in names:
+            shutil.copy2(output_dir / name, tmp_entry / name)
+        dump_json(tmp_entry / "artifacts.json", artifacts)
+        shutil.rmtree(self._entry, ignore_errors=True)
+        os.replace(tmp_entry, self._entry)
+        self._prune()
+        return artifacts
+
+    def _prune(self) -> None:
+        """Remove the least recently used entries."""
+        entries = sorted(
+            (
+                path
+                for path in self.cache_dir.iterdir()
+                if path.is_dir() and path.suffix != ".tmp"
+            ),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True,
+        )
+        for path in entries[self.keep :]:
+            shutil.rmtree(path, ignore_errors=True)
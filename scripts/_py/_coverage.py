@@ -0,0 +1,268 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""LCOV coverage reports.
+
+The reports are merged without loading them: a first pass only
+indexes where the record of each source file starts in each report,
+then the records of one source file at a time are read back (from
+every report that has one), added up and written out. The memory
+used is that of the largest source file's record, not of the reports.
+
+Classes
+-------
+CoverageSummary
+    The line/branch/function totals of a report.
+
+Functions
+---------
+merge_lcov(inputs, output: Path, root: Path) -> CoverageSummary
+    Merge LCOV reports, adding up the hit counts.
+"""
+
+import os
+from contextlib import ExitStack
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+
+class CoverageSummary(NamedTuple):
+    """The line/branch/function totals of a report.
+
+    Attributes
+    ----------
+    files : int
+        The number of source files.
+    lines_found : int
+        The number of instrumented lines.
+    lines_hit : int
+        The number of executed lines.
+    branches_found : int
+        The number of branches.
+    branches_hit : int
+        The number of taken branches.
+    functions_found : int
+        The number of functions.
+    functions_hit : int
+        The number of called functions.
+    """
+
+    files: int = 0
+    lines_found: int = 0
+    lines_hit: int = 0
+    branches_found: int = 0
+    branches_hit: int = 0
+    functions_found: int = 0
+    functions_hit: int = 0
+
+    def format(self) -> str:
+        """Format the totals as percentages.
+
+        Returns
+        -------
+        str
+            The lines, branches and functions coverage.
+        """
+        parts = [f"{self.files} files"]
+        for label, hit, found in (
+            ("lines", self.lines_hit, self.lines_found),
+            ("branches", self.branches_hit, self.branches_found),
+            ("functions", self.functions_hit, self.functions_found),
+        ):
+            percent = f"{100 * hit / found:.1f}%" if found else "n/a"
+            parts.append(f"{label}: {percent} ({hit}/{found})")
+        return ", ".join(parts)
+
+
+class _Record:
+    """The coverage of a source file."""
+
+    def __init__(self) -> None:
+        """Start an empty record."""
+        self.lines: Dict[int, int] = {}
+        self.branches: Dict[Tuple[int, str, str], int] = {}
+        self.taken: Dict[Tuple[int, str, str], bool] = {}
+        self.functions: Dict[str, int] = {}
+        self.function_hits: Dict[str, int] = {}
+
+    def add(self, key: str, value: str) -> None:
+        """Add a line of the record.
+
+        Parameters
+        ----------
+        key : str
+            The LCOV key (``DA``, ``BRDA``, ``FN``, ``FNDA``).
+        value : str
+            The value after the colon.
+        """
+        fields = value.split(",")
+        if key == "DA":
+            line = int(fields[0])
+            self.lines[line] = self.lines.get(line, 0) + int(fields[1])
+        elif key == "BRDA":
+            branch = (int(fields[0]), fields[1], fields[2])
+            hits = 0 if fields[3] == "-" else int(fields[3])
+            self.branches[branch] = self.branches.get(branch, 0) + hits
+            self.taken[branch] = self.taken.get(branch, False) or (
+                fields[3] != "-"
+            )
+        elif key == "FN":
+            self.functions.setdefault(fields[-1], int(fields[0]))
+        elif key == "FNDA":
+            name = fields[-1]
+            self.function_hits[name] = self.function_hits.get(name, 0) + int(
+                fields[0]
+            )
+
+    def summarize(self) -> CoverageSummary:
+        """Get the totals of the record.
+
+        Returns
+        -------
+        CoverageSummary
+            The totals (of one file).
+        """
+        return CoverageSummary(
+            files=1,
+            lines_found=len(self.lines),
+            lines_hit=sum(1 for hits in self.lines.values() if hits),
+            branches_found=len(self.branches),
+            branches_hit=sum(1 for hits in self.branches.values() if hits),
+            functions_found=len(self.functions),
+            functions_hit=sum(
+                1 for name in self.functions if self.function_hits.get(name)
+            ),
+        )
+
+    def to_lines(self, source: str) -> List[str]:
+        """Get the record in LCOV format.
+
+        Parameters
+        ----------
+        source : str
+            The source file.
+
+        Returns
+        -------
+        List[str]
+            The lines of the record.
+        """
+        lines = [f"SF:{source}"]
+        for name, line in sorted(
+            self.functions.items(), key=lambda item: item[1]
+        ):
+            lines.append(f"FN:{line},{name}")
+        for name in self.functions:
+            lines.append(f"FNDA:{self.function_hits.get(name, 0)},{name}")
+        lines.append(f"FNF:{len(self.functions)}")
+        hit = sum(1 for name in self.functions if self.function_hits.get(name))
+        lines.append(f"FNH:{hit}")
+        for branch, hits in sorted(self.branches.items()):
+            taken = str(hits) if self.taken[branch] else "-"
+            lines.append(f"BRDA:{branch[0]},{branch[1]},{branch[2]},{taken}")
+        lines.append(f"BRF:{len(self.branches)}")
+        lines.append(f"BRH:{sum(1 for hits in self.branches.values() if hits)}")
+        for line, hits in sorted(self.lines.items()):
+            lines.append(f"DA:{line},{hits}")
+        lines.append(f"LF:{len(self.lines)}")
+        lines.append(f"LH:{sum(1 for hits in self.lines.values() if hits)}")
+        lines.append("end_of_record")
+        return lines
+
+
+def _normalize(source: str, base_dir: Path, root: Path) -> str:
+    """Get a source path relative to the root (if it is under it)."""
+    path = Path(os.path.normpath(base_dir / source))
+    try:
+        return path.relative_to(root).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def _index_records(
+    path: Path, base_dir: Path, root: Path
+) -> Iterator[Tuple[str, int]]:
+    """Get the (normalized) source and the offset of each record."""
+    offset = 0
+    with open(path, "rb") as file:
+        for line in file:
+            if line.startswith(b"SF:"):
+                source = line[3:].decode("utf-8").strip()
+                yield _normalize(source, base_dir, root), offset + len(line)
+            offset += len(line)
+
+
+def _read_record(file: BinaryIO, offset: int, record: _Record) -> None:
+    """Add the record that starts at an offset of a report."""
+    file.seek(offset)
+    for raw in file:
+        key, _, value = raw.decode("utf-8").strip().partition(":")
+        if key in ("end_of_record", "SF"):
+            return
+        if key:
+            record.add(key, value)
+
+
+def _write_records(
+    out: TextIO,
+    offsets: Dict[str, List[Tuple[int, int]]],
+    files: Sequence[BinaryIO],
+) -> CoverageSummary:
+    """Merge and write the records of each source file, one at a time."""
+    totals = [0] * len(CoverageSummary._fields)
+    for source in sorted(offsets):
+        record = _Record()
+        for index, offset in offsets[source]:
+            _read_record(files[index], offset, record)
+        out.write("\n".join(record.to_lines(source)) + "\n")
+        totals = [
+            total + value for total, value in zip(totals, record.summarize())
+        ]
+    return CoverageSummary(*totals)
+
+
+def merge_lcov(
+    inputs: Sequence[Tuple[Path, Path]], output: Path, root: Path
+) -> CoverageSummary:
+    """Merge LCOV reports, adding up the hit counts.
+
+    Parameters
+    ----------
+    inputs : Sequence[Tuple[Path, Path]]
+        The reports to merge, each with the directory its (relative)
+        source paths are relative to.
+    output : Path
+        The merged report.
+    root : Path
+        The source paths are written relative to this directory
+        (if they are under it).
+
+    Returns
+    -------
+    CoverageSummary
+        The totals of the merged report.
+    """
+    root = Path(os.path.normpath(root.resolve()))
+    offsets: Dict[str, List[Tuple[int, int]]] = {}
+    for index, (path, base_dir) in enumerate(inputs):
+        base_dir = Path(os.path.normpath(base_dir.resolve()))
+        for source, offset in _index_records(path, base_dir, root):
+            offsets.setdefault(source, []).append((index, offset))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_output = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+    with ExitStack() as stack:
+        files = [stack.enter_context(open(path, "rb")) for path, _ in inputs]
+        out = stack.enter_context(
+            open(tmp_output, "w", encoding="utf-8", newline="\n")
+        )
+        summary = _write_records(out, offsets, files)
+    os.replace(tmp_output, output)
+    return summary
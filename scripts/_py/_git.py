@@ -0,0 +1,234 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""Git helpers for the python scripts.
+
+The projects are git submodules, so the changes of a project are
+computed in its own repository, against the commit the parent
+repository recorded for it at the merge base.
+
+Functions
+---------
+get_base_commit(repo_dir: Path, ref: str) -> Optional[str]
+    Get the commit to compare a repository against.
+get_changed_files(in_dir: Path, ref: Optional[str], staged: bool)
+    Get the added/modified files under a directory.
+get_changed_lines(in_dir: Path, ref: str)
+    Get the changed lines of the files under a directory.
+"""
+
+import re
+import subprocess  # nosemgrep # nosec
+from functools import cache
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+
+def git(args: List[str], cwd: Path) -> str:
+    """Run a git command and return its output.
+
+    Parameters
+    ----------
+    args : List[str]
+        The git arguments.
+    cwd : Path
+        The directory to run git in.
+
+    Returns
+    -------
+    str
+        The command's stdout.
+    """
+    result = subprocess.run(  # nosemgrep # nosec
+        ["git"] + args,
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+    )
+    return result.stdout
+
+
+@cache
+def get_toplevel(path: Path) -> Path:
+    """Get the root of the repository that contains a path.
+
+    Parameters
+    ----------
+    path : Path
+        A directory in the repository.
+
+    Returns
+    -------
+    Path
+        The repository's root directory.
+    """
+    return Path(git(["rev-parse", "--show-toplevel"], cwd=path).strip())
+
+
+@cache
+def get_base_commit(repo_dir: Path, ref: str) -> Optional[str]:
+    """Get the commit to compare a repository against.
+
+    For the outermost repository this is the merge base of ``ref``
+    and ``HEAD``, for a submodule it is the commit its parent recorded
+    for it at the parent's base commit.
+
+    Parameters
+    ----------
+    repo_dir : Path
+        The repository's root directory.
+    ref : str
+        The git ref (branch, tag, commit) of the outermost repository.
+
+    Returns
+    -------
+    Optional[str]
+        The commit, None if the repository did not exist at the base.
+    """
+    try:
+        superproject = git(
+            ["rev-parse", "--show-superproject-working-tree"], cwd=repo_dir
+        ).strip()
+    except subprocess.CalledProcessError:
+        superproject = ""
+    if not superproject:
+        return git(["merge-base", ref, "HEAD"], cwd=repo_dir).strip()
+    parent_dir = Path(superproject)
+    parent_base = get_base_commit(parent_dir, ref)
+    if parent_base is None:
+        return None
+    relative = repo_dir.relative_to(parent_dir).as_posix()
+    entry = git(["ls-tree", parent_base, "--", relative], cwd=parent_dir)
+    # <mode> SP commit SP <sha> TAB <path>
+    fields = entry.split()
+    if len(fields) < 3 or fields[1] != "commit":
+        return None
+    return fields[2]
+
+
+def _split_names(output: str) -> List[str]:
+    """Split the output of a ``-z`` git command."""
+    return [name for name in output.split("\0") if name]
+
+
+def get_changed_files(
+    in_dir: Path, ref: Optional[str], staged: bool
+) -> Optional[Set[Path]]:
+    """Get the added/modified files under a directory.
+
+    Parameters
+    ----------
+    in_dir : Path
+        The directory.
+    ref : Optional[str]
+        Compare the working tree (including untracked files)
+        against the merge base of this ref and ``HEAD``.
+    staged : bool
+        Only get the staged files (ignores ``ref``).
+
+    Returns
+    -------
+    Optional[Set[Path]]
+        The resolved paths of the changed files, None if they
+        cannot be determined (everything should be considered changed).
+    """
+    repo_dir = get_toplevel(in_dir.resolve())
+    if staged:
+        diff = ["diff", "--cached", "--name-only", "--diff-filter=d", "-z"]
+        names = _split_names(git(diff, cwd=repo_dir))
+    elif ref is not None:
+        base = get_base_commit(repo_dir, ref)
+        if base is None:
+            return None
+        diff = ["diff", "--name-only", "--diff-filter=d", "-z", base]
+        names = _split_names(git(diff, cwd=repo_dir))
+        names += _split_names(
+            git(
+                ["ls-files", "--others", "--exclude-standard", "-z"],
+                cwd=repo_dir,
+            )
+        )
+    else:
+        return None
+    in_dir = in_dir.resolve()
+    changed = {(repo_dir / name).resolve() for name in names}
+    return {path for path in changed if path.is_relative_to(in_dir)}
+
+
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@")
+
+
+def _parse_hunks(diff: str, repo_dir: Path) -> Dict[Path, Set[int]]:
+    """Get the changed (base side) lines of each file in a diff."""
+    changed: Dict[Path, Set[int]] = {}
+    lines: Set[int] = set()
+    old_name = ""
+    for line in diff.splitlines():
+        if line.startswith("--- "):
+            old_name = line[4:].strip()
+            continue
+        if line.startswith("+++ "):
+            new_name = line[4:].strip()
+            lines = set()
+            if old_name == "/dev/null":
+                # new files are recorded without lines
+                changed[(repo_dir / new_name[2:]).resolve()] = set()
+            else:
+                # deleted files are recorded with their (old) lines
+                changed[(repo_dir / old_name[2:]).resolve()] = lines
+            continue
+        match = _HUNK.match(line)
+        if match:
+            start = int(match[1])
+            count = 1 if match[2] is None else int(match[2])
+            # a pure addition (count 0) is between start and start + 1
+            lines.update(range(start, start + max(count, 2)))
+    return changed
+
+
+def get_changed_lines(in_dir: Path, ref: str) -> Optional[Dict[Path, Set[int]]]:
+    """Get the changed lines of the files under a directory.
+
+    Parameters
+    ----------
+    in_dir : Path
+        The directory.
+    ref : str
+        Compare the working tree (including untracked files)
+        against the merge base of this ref and ``HEAD``.
+
+    Returns
+    -------
+    Optional[Dict[Path, Set[int]]]
+        The changed line numbers (in the base version) by resolved
+        path, an empty set for new files. None if the changes cannot
+        be determined.
+    """
+    try:
+        repo_dir = get_toplevel(in_dir.resolve())
+        base = get_base_commit(repo_dir, ref)
+    except (OSError, subprocess.CalledProcessError):
+        # not a repository, an unknown ref or a shallow clone
+        return None
+    if base is None:
+        return None
+    try:
+        diff = git(
+            ["diff", "--unified=0", "--no-color", "--no-renames", base],
+            cwd=repo_dir,
+        )
+        untracked = git(
+            ["ls-files", "--others", "--exclude-standard", "-z"], cwd=repo_dir
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    changed = _parse_hunks(diff, repo_dir)
+    for name in _split_names(untracked):
+        changed[(repo_dir / name).resolve()] = set()
+    in_dir = in_dir.resolve()
+    return {
+        path: lines
+        for path, lines in changed.items()
+        if path.is_relative_to(in_dir)
+    }
@@ -0,0 +1,242 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""Test impact analysis.
+
+The index keeps, for each test, the source lines it executed (from
+the per test coverage contexts of ``pytest --cov-context=test``), the
+lines executed outside of any test (at import time: ``def`` and
+decorator lines, default arguments, module constants) and the test
+files that failed on their last run. Given the changed lines of a
+project, it selects the tests that executed them, all the tests that
+executed a changed file if one of its changed lines ran at import time
+(or no test executed them), the changed/new test files and the ones
+that failed. Changes it cannot reason about (``conftest.py``, non python
+files other than docs, files of other projects that no test executed)
+or an empty index select everything.
+
+Classes
+-------
+ImpactIndex
+    The per test coverage of a project.
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+# relative to each project directory
+INDEX_FILE = Path(".cache") / "test-impact.json"
+# changes to these never affect the tests
+DOCS_SUFFIXES = (".md", ".rst")
+
+
+def _decode_numbits(numbits: bytes) -> List[int]:
+    """Get the line numbers of a coverage.py numbits blob."""
+    return [
+        index * 8 + bit
+        for index, byte in enumerate(numbits)
+        if byte
+        for bit in range(8)
+        if byte & (1 << bit)
+    ]
+
+
+def read_contexts(
+    data_file: Path, project_dir: Path
+) -> Dict[str, Dict[str, Set[int]]]:
+    """Read the lines each test executed from a coverage data file.
+
+    Parameters
+    ----------
+    data_file : Path
+        The coverage.py (sqlite) data file.
+    project_dir : Path
+        The project directory (the paths are made relative to it).
+
+    Returns
+    -------
+    Dict[str, Dict[str, Set[int]]]
+        The executed lines by source file by test id, the lines
+        executed outside of the tests under the empty id.
+    """
+    contexts: Dict[str, Dict[str, Set[int]]] = {}
+    if not data_file.exists():
+        return contexts
+    connection = sqlite3.connect(f"file:{data_file}?mode=ro", uri=True)
+    with connection:
+        tables = {
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        if "line_bits" in tables:
+            query = (
+                "SELECT file.path, context.context, line_bits.numbits "
+                "FROM line_bits JOIN file ON file.id = line_bits.file_id "
+                "JOIN context ON context.id = line_bits.context_id"
+            )
+            rows = [
+                (path, context, _decode_numbits(numbits))
+                for path, context, numbits in connection.execute(query)
+            ]
+        else:
+            query = (
+                "SELECT file.path, context.context, arc.fromno, arc.tono "
+                "FROM arc JOIN file ON file.id = arc.file_id "
+                "JOIN context ON context.id = arc.context_id"
+            )
+            rows = [
+                (path, context, [line for line in (start, end) if line > 0])
+                for path, context, start, end in connection.execute(query)
+            ]
+    connection.close()
+    for path, context, lines in rows:
+        # pytest-cov contexts are <test id>|setup/run/teardown
+        test_id = context.rsplit("|", 1)[0]
+        relative = Path(os.path.relpath(path, project_dir)).as_posix()
+        contexts.setdefault(test_id, {}).setdefault(relative, set()).update(
+            lines
+        )
+    return contexts
+
+
+class ImpactIndex:
+    """The per test coverage (and the failures) of a project."""
+
+    def __init__(self, project_dir: Path) -> None:
+        """Load the index of a project.
+
+        Parameters
+        ----------
+        project_dir : Path
+            The project directory.
+        """
+        self.project_dir = project_dir
+        self._path = project_dir / INDEX_FILE
+        try:
+            with open(self._path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            data = {}
+        self.tests: Dict[str, Dict[str, List[int]]] = data.get("tests", {})
+        # the lines executed at import time, by source file
+        self.static: Dict[str, List[int]] = data.get("static", {})
+        self.failed: Set[str] = set(data.get("failed", []))
+
+    def update(
+        self,
+        contexts: Dict[str, Dict[str, Set[int]]],
+        ran: Iterable[str],
+        failed: Iterable[str],
+        test_files: Iterable[str],
+    ) -> None:
+        """Update the index with a run and save it.
+
+        Parameters
+        ----------
+        contexts : Dict[str, Dict[str, Set[int]]]
+            The executed lines by source file by test id (the empty
+            id for the lines executed outside of the tests).
+        ran : Iterable[str]
+            The test files that ran.
+        failed : Iterable[str]
+            The test files that failed.
+        test_files : Iterable[str]
+            All the current test files (the others are dropped).
+        """
+        for name, lines in contexts.get("", {}).items():
+            self.static[name] = sorted(lines)
+        for test_id, covered in contexts.items():
+            if not test_id:
+                continue
+            self.tests[test_id] = {
+                name: sorted(lines) for name, lines in covered.items()
+            }
+        self.failed = (self.failed - set(ran)) | set(failed)
+        existing = set(test_files)
+        self.tests = {
+            test_id: covered
+            for test_id, covered in self.tests.items()
+            if test_id.split("::", 1)[0] in existing
+        }
+        self.failed &= existing
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(f"{self._path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8", newline="\n") as file:
+            json.dump(
+                {
+                    "tests": self.tests,
+                    "static": self.static,
+                    "failed": sorted(self.failed),
+                },
+                file,
+                sort_keys=True,
+            )
+        os.replace(tmp_path, self._path)
+
+    def _select_for_source(self, name: str, lines: Set[int]) -> Set[str]:
+        """Select the tests affected by a changed source file."""
+        covering = {
+            test_id: covered[name]
+            for test_id, covered in self.tests.items()
+            if name in covered
+        }
+        hits = {
+            test_id
+            for test_id, covered_lines in covering.items()
+            if lines.intersection(covered_lines)
+        }
+        # a change at import time affects every test using the file
+        if not hits or lines.intersection(self.static.get(name, [])):
+            return set(covering)
+        return hits
+
+    def select(
+        self, changed: Dict[str, Set[int]], test_files: List[str]
+    ) -> Optional[List[str]]:
+        """Select the tests affected by changes.
+
+        Parameters
+        ----------
+        changed : Dict[str, Set[int]]
+            The changed lines (empty for new files) by file
+            (relative to the project, ``../`` for the files of
+            its dependencies).
+        test_files : List[str]
+            All the current test files.
+
+        Returns
+        -------
+        Optional[List[str]]
+            The test files and test ids to run, None to run everything.
+        """
+        if not self.tests:
+            return None
+        selected: Set[str] = set()
+        for name, lines in changed.items():
+            if name in test_files:
+                selected.add(name)
+            elif name.endswith(DOCS_SUFFIXES) or name.startswith("docs/"):
+                continue
+            elif not name.endswith(".py") or Path(name).name == "conftest.py":
+                return None
+            elif name.startswith("../"):
+                # a dependency, only if its coverage was recorded
+                tests = self._select_for_source(name, lines)
+                if not tests:
+                    return None
+                selected.update(tests)
+            else:
+                selected.update(self._select_for_source(name, lines))
+        indexed = {test_id.split("::", 1)[0] for test_id in self.tests}
+        selected.update(name for name in test_files if name not in indexed)
+        selected.update(name for name in self.failed if name in test_files)
+        whole_files = {item for item in selected if "::" not in item}
+        return sorted(
+            item
+            for item in selected
+            if "::" not in item or item.split("::", 1)[0] not in whole_files
+        )
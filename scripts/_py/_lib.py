@@ -11,93 +11,482 @@ ROOT_DIR : Path
 
 Functions
 ---------
-run_command(args: List[str], cwd: Path = ROOT_DIR) -> None
+run_command(args: List[str], cwd: Path = ROOT_DIR, env=None) -> None
     Run a command.
+get_workspace() -> Workspace
+    Get the (cached) workspace of the repository.
+get_affected_projects(projects: Sequence[Path]) -> List[Path]
+    Get the projects affected by the changes since ``--affected <ref>``.
 ensure_command_exists(command: str) -> None
     Ensure a command exists.
 """
 
-import json
 import os
 import subprocess  # nosemgrep # nosec
 import sys
+import threading
+import time
 from functools import cache
 from importlib.metadata import version as package_version
 from pathlib import Path
-from typing import Generator, List, NamedTuple
+from typing import Dict, Generator, List, Optional, Sequence, Set
+
+# pylint: disable=ungrouped-imports,too-many-try-statements
+try:
+    from _cache import LintCache
+    from _git import get_base_commit, get_changed_files, get_toplevel
+    from _provision import (
+        TOOLS,
+        canonicalize_name,
+        get_install_command,
+        get_missing_requirements,
+        load_toml,
+    )
+    from _tasks import (
+        emit,
+        execute,
+        exit_if_cancelled,
+        is_capturing,
+        measure,
+        track,
+    )
+    from _worker import WORKER_TOOLS, run_in_worker
+    from _workspace import ImageConfig, Workspace, load_workspace
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from _cache import LintCache  # type: ignore
+    from _git import (  # type: ignore
+        get_base_commit,
+        get_changed_files,
+        get_toplevel,
+    )
+    from _provision import (  # type: ignore
+        TOOLS,
+        canonicalize_name,
+        get_install_command,
+        get_missing_requirements,
+        load_toml,
+    )
+    from _tasks import (  # type: ignore
+        emit,
+        execute,
+        exit_if_cancelled,
+        is_capturing,
+        measure,
+        track,
+    )
+    from _worker import WORKER_TOOLS, run_in_worker  # type: ignore
+    from _workspace import (  # type: ignore
+        ImageConfig,
+        Workspace,
+        load_workspace,
+    )
+# pylint: enable=ungrouped-imports,too-many-try-statements
 
 ROOT_DIR = Path(__file__).parent.parent.parent
+# changes to these (root) files affect every project
+WORKSPACE_FILES = ("package.json", "pyproject.toml", "uv.lock")
 os.environ["PYTHONUNBUFFERED"] = "1"
 os.environ["PYTHONUTF8"] = "1"
 
+# packages already checked/installed by ensure_package_exists
+_PROVISIONED: Set[str] = set()
+_PROVISION_LOCK = threading.Lock()
 
-def run_command(args: List[str], cwd: Path = ROOT_DIR) -> None:
+
+def get_arg_value(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Get the value of a command line option.
+
+    Both ``--name value`` and ``--name=value`` forms are supported.
+
+    Parameters
+    ----------
+    name : str
+        The option name (including the leading dashes).
+    default : Optional[str]
+        The value to return if the option is not given.
+
+    Returns
+    -------
+    Optional[str]
+        The option value or the default.
+    """
+    for index, arg in enumerate(sys.argv):
+        if arg == name and index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+        if arg.startswith(f"{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+def get_jobs() -> int:
+    """Get the number of parallel jobs from ``--jobs N`` (or ``-j N``).
+
+    Returns
+    -------
+    int
+        The number of jobs, defaults to the number of cores.
+    """
+    value = get_arg_value("--jobs", get_arg_value("-j"))
+    if value is None:
+        return os.cpu_count() or 1
+    try:
+        return max(1, int(value))
+    except ValueError:
+        print(f"Invalid number of jobs: {value}", file=sys.stderr)
+        sys.exit(2)
+
+
+def run_command(
+    args: List[str],
+    cwd: Path = ROOT_DIR,
+    env: Optional[Dict[str, str]] = None,
+) -> None:
     """Run a command.
 
+    The command's wall time, CPU time, peak RSS and exit code are
+    recorded (see ``_metrics``).
+
     Parameters
     ----------
     args : List[str]
         List of arguments to pass to the command.
     cwd : Path
         Current working directory.
+    env : Optional[Dict[str, str]]
+        The environment, defaults to this process's environment.
     """
     args_str = " ".join(args).replace(str(ROOT_DIR), ".")
-    print(f"Running command: {args_str}")
+    emit(f"Running command: {args_str}")
+    capture = is_capturing()
+    exit_code, output = execute(args, cwd, capture, env)
+    if output:
+        emit(output)
+    if exit_code != 0:
+        sys.exit(exit_code)
+
+
+def run_tool(tool: str, args: List[str], cwd: Path) -> None:
+    """Run ``python -m <tool> <args>``.
+
+    Tools in ``WORKER_TOOLS`` run in the warm worker process (see
+    ``_worker``), unless ``--no-worker`` is given. Like the commands,
+    the worker's process running a tool is stopped with ``--fail-fast``.
+
+    Parameters
+    ----------
+    tool : str
+        The tool (module) name.
+    args : List[str]
+        The tool's arguments.
+    cwd : Path
+        The directory to run the tool in.
+    """
+    command = [sys.executable, "-m", tool] + args
+    exit_if_cancelled()
+    if tool not in WORKER_TOOLS or "--no-worker" in sys.argv:
+        run_command(command, cwd=cwd)
+        return
+    args_str = " ".join(command).replace(str(ROOT_DIR), ".")
+    emit(f"Running command (in worker): {args_str}")
+    start = time.perf_counter()
     try:
-        subprocess.run(  # nosemgrep # nosec
-            args,
-            cwd=cwd,
-            check=True,
-            stdout=sys.stdout,
-            stderr=subprocess.STDOUT,
-            env=os.environ,
-            encoding="utf-8",
-        )
-    except subprocess.CalledProcessError as e:
-        print(e.output)
-        sys.exit(e.returncode)
+        code, output, usage = run_in_worker(tool, args, cwd, track)
+    except (OSError, ValueError) as error:
+        exit_if_cancelled()
+        emit(f"Lint worker failed ({error}), using a subprocess")
+        run_command(command, cwd=cwd)
+        return
+    measure("command", tool, start, code, usage)
+    if output:
+        emit(output)
+    if code != 0:
+        sys.exit(code)
+
+
+def get_workspace() -> Workspace:
+    """Get the workspace of the repository.
+
+    It is loaded once per process, from its on-disk index if
+    ``package.json`` and the projects' pyproject.toml did not change
+    (see ``_workspace``).
+
+    Returns
+    -------
+    Workspace
+        The packages, ignore patterns and images of the repository.
+    """
+    return load_workspace(ROOT_DIR)
 
 
-@cache
-def get_python_projects() -> Generator[Path, None, None]:
+def get_python_projects() -> List[Path]:
     """Get all python projects in the repository.
 
-    Yields
-    ------
-    Path
-        Path to the python project.
+    Returns
+    -------
+    List[Path]
+        The python project directories, in the ``package.json`` order.
 
     Raises
     ------
     FileNotFoundError
         If the package.json or if a package directory does not exist.
     """
-    # read package.json instead
-    package_json_path = ROOT_DIR / "package.json"
-    if not package_json_path.exists():
-        raise FileNotFoundError(f"{package_json_path} does not exist.")
-    with open(package_json_path, "r", encoding="utf-8") as file:
-        package_json = json.load(file)
-    packages = package_json.get("packages", {}).get("py", [])
-    for package in packages:
-        package_dir = ROOT_DIR / package
-        if not package_dir.exists():
-            raise FileNotFoundError(f"{package_dir} does not exist.")
-        yield package_dir
+    return [project.path for project in get_workspace().py_projects]
+
+
+def get_project_dependencies(project_dir: Path) -> List[Path]:
+    """Get the projects that a project depends on.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+
+    Returns
+    -------
+    List[Path]
+        The directories of the workspace projects its pyproject.toml
+        requires, they need to be installed/built before this one.
+    """
+    return get_workspace().get_dependencies(project_dir)
+
+
+def _get_changed_projects(ref: str) -> Optional[Set[Path]]:
+    """Get the projects with changes since a ref, None if all of them."""
+    workspace = get_workspace()
+    root_changes = get_changed_files(ROOT_DIR, ref, False)
+    if root_changes is None or any(
+        (ROOT_DIR / name).resolve() in root_changes for name in WORKSPACE_FILES
+    ):
+        return None
+    changed: Set[Path] = set()
+    for project in workspace.py_projects:
+        # the projects are submodules, compared in their own repository
+        if get_changed_files(project.path, ref, False) != set():
+            changed.add(project.path)
+    return changed
+
+
+def get_affected_projects(projects: Sequence[Path]) -> List[Path]:
+    """Get the projects affected by the changes since ``--affected <ref>``.
+
+    A project is affected if any of its files changed or if it depends
+    (see ``get_project_dependencies``) on an affected project. A change
+    of a workspace file (``WORKSPACE_FILES``) affects every project.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[Path]
+        The affected ones (in the given order), all of them if the
+        option is not given or if the changes cannot be determined.
+    """
+    ref = get_arg_value("--affected")
+    if ref is None:
+        return list(projects)
+    try:
+        changed = _get_changed_projects(ref)
+    except (OSError, subprocess.CalledProcessError) as error:
+        print(f"Could not get the changed files: {error}", file=sys.stderr)
+        changed = None
+    if changed is None:
+        print(f"All the projects are affected since {ref}")
+        return list(projects)
+    dependents = get_workspace().get_dependents(changed)
+    affected = [project for project in projects if project in dependents]
+    names = [project.relative_to(ROOT_DIR).as_posix() for project in affected]
+    print(f"Projects affected since {ref}: {', '.join(names) or 'none'}")
+    return affected
+
+
+@cache
+def get_changed_scope(in_dir: Path) -> Optional[Set[Path]]:
+    """Get the changed files under a directory.
+
+    Uses the ``--changed-since <ref>`` or ``--staged`` command line
+    options, see ``_git.get_changed_files``.
+
+    Parameters
+    ----------
+    in_dir : Path
+        The directory.
+
+    Returns
+    -------
+    Optional[Set[Path]]
+        The resolved paths of the changed files, None if no option
+        was given or if they cannot be determined.
+    """
+    ref = get_arg_value("--changed-since")
+    staged = "--staged" in sys.argv
+    if ref is None and not staged:
+        return None
+    try:
+        return get_changed_files(in_dir, ref, staged)
+    except (OSError, subprocess.CalledProcessError) as error:
+        print(f"Could not get the changed files: {error}", file=sys.stderr)
+        return None
+
+
+def get_scope_args(in_dir: Path) -> List[str]:
+    """Get the options to pass the changed files scope to a project.
+
+    Parameters
+    ----------
+    in_dir : Path
+        The project directory (in its own repository or not).
+
+    Returns
+    -------
+    List[str]
+        ``--staged``, ``--changed-since <commit>`` (the project
+        repository's base commit) or nothing (full run).
+    """
+    if "--staged" in sys.argv:
+        return ["--staged"]
+    ref = get_arg_value("--changed-since")
+    if ref is None:
+        return []
+    try:
+        base = get_base_commit(get_toplevel(in_dir.resolve()), ref)
+    except (OSError, subprocess.CalledProcessError):
+        base = None
+    return [] if base is None else ["--changed-since", base]
 
 
 def ensure_package_exists(package_name: str) -> None:
     """Ensure a package exists.
 
+    The first call provisions all the tools (``_provision.TOOLS``)
+    at once, with their pinned versions from the root pyproject.toml,
+    later calls only check the packages that were not provisioned yet.
+
     Parameters
     ----------
     package_name : str
         Name of the package to ensure exists.
     """
-    try:
-        package_version(package_name)
-    except BaseException:  # pylint: disable=broad-except
-        run_command([sys.executable, "-m", "pip", "install", package_name])
+    name = canonicalize_name(package_name)
+    if name in _PROVISIONED:
+        return
+    with _PROVISION_LOCK:
+        if name in _PROVISIONED:
+            return
+        names = {name} if _PROVISIONED else {name, *TOOLS}
+        missing = get_missing_requirements(names)
+        if missing:
+            run_command(get_install_command(missing))
+        _PROVISIONED.update(names)
+
+
+# not walked when collecting the files to pass to the linters
+LINT_SKIP_DIRS = {
+    ".git",
+    ".venv",
+    "venv",
+    ".local",
+    ".cache",
+    ".mypy_cache",
+    ".ruff_cache",
+    ".pytest_cache",
+    ".tox",
+    ".nox",
+    "__pycache__",
+    "node_modules",
+    "examples",
+    "harmony_out",
+    "packages",
+    "package_templates",
+    "build",
+    "dist",
+    "site",
+    "coverage",
+    "reports",
+}
+PY_SUFFIXES = (".py", ".pyi")
+YAML_SUFFIXES = (".yaml", ".yml")
+
+
+def find_files(in_dir: Path, suffixes: Sequence[str]) -> List[Path]:
+    """Find the files a linter would check in a directory.
+
+    Parameters
+    ----------
+    in_dir : Path
+        The directory to search in.
+    suffixes : Sequence[str]
+        The file suffixes to include.
+
+    Returns
+    -------
+    List[Path]
+        The sorted file paths.
+    """
+    found: List[Path] = []
+    for root, dirs, files in os.walk(in_dir):
+        dirs[:] = [name for name in dirs if name not in LINT_SKIP_DIRS]
+        found.extend(
+            Path(root) / name
+            for name in files
+            if name.endswith(tuple(suffixes))
+        )
+    return sorted(found)
+
+
+def _run_lint_tool(
+    in_dir: Path,
+    tool: str,
+    args: List[str],
+    suffixes: Sequence[str],
+    config_files: Sequence[str],
+    per_file: bool = True,
+    whole_project: bool = False,
+) -> None:
+    """Run a lint/format tool, skipping the files it already passed.
+
+    Per file tools only get the changed files (the ones without a
+    passing verdict in the cache), tools that analyse the files
+    together (``per_file=False``) run on the whole directory only if
+    any of the files changed. Use ``--no-cache`` to always run.
+
+    With ``--changed-since <ref>`` or ``--staged`` only the files
+    changed in git are checked, unless the tool needs the whole
+    project (``whole_project=True``, e.g. mypy for cross module
+    types) in which case it runs on everything if any file changed.
+    """
+    ensure_package_exists(tool)
+    files = find_files(in_dir, suffixes)
+    changed = get_changed_scope(in_dir)
+    if changed is not None:
+        scoped = [path for path in files if path.resolve() in changed]
+        files = files if scoped and whole_project else scoped
+        per_file = per_file or not whole_project
+    if not files:
+        emit(f"No files to check with {tool} in {in_dir}, skipping ...")
+        return
+    lint_cache = LintCache(
+        in_dir, [tool] + args, package_version(tool), config_files
+    )
+    if "--no-cache" in sys.argv:
+        to_check = files
+    elif per_file:
+        to_check = lint_cache.get_misses(files)
+    else:
+        to_check = [] if lint_cache.is_tree_clean(files) else files
+    if not to_check:
+        emit(f"{tool}: {len(files)} unchanged files, skipping ...")
+        return
+    if per_file:
+        paths = [str(path.relative_to(in_dir)) for path in to_check]
+    else:
+        paths = ["."]
+    run_tool(tool, args + paths, cwd=in_dir)
+    lint_cache.record(files, to_check)
 
 
 def run_isort(in_dir: Path, fix: bool) -> None:
@@ -110,12 +499,28 @@ def run_isort(in_dir: Path, fix: bool) -> None:
     fix : bool
         Whether to fix the imports.
     """
-    ensure_package_exists("isort")
-    args = [sys.executable, "-m", "isort"]
+    args = ["--filter-files"]
     if not fix:
         args.append("--check-only")
-    args.append(".")
-    run_command(args, cwd=in_dir)
+    _run_lint_tool(in_dir, "isort", args, PY_SUFFIXES, ["pyproject.toml"])
+
+
+def _get_black_excludes(in_dir: Path) -> str:
+    """Get the configured black excludes as a ``--force-exclude`` regex."""
+    # black only applies --force-exclude to the files it is given
+    config = (
+        load_toml(in_dir / "pyproject.toml").get("tool", {}).get("black", {})
+    )
+    patterns = [
+        config[key]
+        for key in ("exclude", "extend-exclude", "force-exclude")
+        if config.get(key)
+    ]
+    # black compiles the regex as verbose if it is multi line
+    return "|".join(
+        f"(?x:{pattern})" if "\n" in pattern else f"(?-x:{pattern})"
+        for pattern in patterns
+    )
 
 
 def run_black(in_dir: Path, fix: bool) -> None:
@@ -128,12 +533,13 @@ def run_black(in_dir: Path, fix: bool) -> None:
     fix : bool
         Whether to fix the formatting.
     """
-    ensure_package_exists("black")
-    args = [sys.executable, "-m", "black", "--config", "pyproject.toml"]
+    args = ["--config", "pyproject.toml"]
+    force_exclude = _get_black_excludes(in_dir)
+    if force_exclude:
+        args.extend(["--force-exclude", force_exclude])
     if not fix:
         args.append("--check")
-    args.append(".")
-    run_command(args, cwd=in_dir)
+    _run_lint_tool(in_dir, "black", args, PY_SUFFIXES, ["pyproject.toml"])
 
 
 def run_mypy(in_dir: Path) -> None:
@@ -144,10 +550,14 @@ def run_mypy(in_dir: Path) -> None:
     in_dir : Path
         Directory to run mypy in.
     """
-    ensure_package_exists("mypy")
-    run_command(
-        [sys.executable, "-m", "mypy", "--config", "pyproject.toml", "."],
-        cwd=in_dir,
+    _run_lint_tool(
+        in_dir,
+        "mypy",
+        ["--config", "pyproject.toml"],
+        PY_SUFFIXES,
+        ["pyproject.toml"],
+        per_file=False,
+        whole_project=True,
     )
 
 
@@ -159,10 +569,8 @@ def run_flake8(in_dir: Path) -> None:
     in_dir : Path
         Directory to run flake8 in.
     """
-    ensure_package_exists("flake8")
-    run_command(
-        [sys.executable, "-m", "flake8", "--config", ".flake8", "."],
-        cwd=in_dir,
+    _run_lint_tool(
+        in_dir, "flake8", ["--config", ".flake8"], PY_SUFFIXES, [".flake8"]
     )
 
 
@@ -174,10 +582,12 @@ def run_pydocstyle(in_dir: Path) -> None:
     in_dir : Path
         Directory to run pydocstyle in.
     """
-    ensure_package_exists("pydocstyle")
-    run_command(
-        [sys.executable, "-m", "pydocstyle", "--config", "pyproject.toml", "."],
-        cwd=in_dir,
+    _run_lint_tool(
+        in_dir,
+        "pydocstyle",
+        ["--config", "pyproject.toml"],
+        (".py",),
+        ["pyproject.toml"],
     )
 
 
@@ -189,10 +599,12 @@ def run_bandit(in_dir: Path) -> None:
     in_dir : Path
         Directory to run bandit in.
     """
-    ensure_package_exists("bandit")
-    run_command(
-        [sys.executable, "-m", "bandit", "-r", "-c", "pyproject.toml", "."],
-        cwd=in_dir,
+    _run_lint_tool(
+        in_dir,
+        "bandit",
+        ["-r", "-c", "pyproject.toml"],
+        (".py",),
+        ["pyproject.toml"],
     )
 
 
@@ -204,10 +616,12 @@ def run_yamllint(in_dir: Path) -> None:
     in_dir : Path
         Directory to run yamllint in.
     """
-    ensure_package_exists("yamllint")
-    run_command(
-        [sys.executable, "-m", "yamllint", "-c", ".yamllint.yaml", "."],
-        cwd=in_dir,
+    _run_lint_tool(
+        in_dir,
+        "yamllint",
+        ["-c", ".yamllint.yaml"],
+        YAML_SUFFIXES,
+        [".yamllint.yaml", ".yamlignore", ".gitignore"],
     )
 
 
@@ -221,15 +635,14 @@ def run_ruff(in_dir: Path, fix: bool) -> None:
     fix : bool
         Whether to fix the formatting.
     """
-    ensure_package_exists("ruff")
-    args = [sys.executable, "-m", "ruff"]
+    args = []
     if not fix:
         args.append("check")
         args.append("--fix")
     else:
         args.append("format")
-    args.extend(["--config", "pyproject.toml", "."])
-    run_command(args, cwd=in_dir)
+    args.extend(["--config", "pyproject.toml", "--force-exclude"])
+    _run_lint_tool(in_dir, "ruff", args, PY_SUFFIXES, ["pyproject.toml"])
 
 
 def run_autoflake(in_dir: Path) -> None:
@@ -240,18 +653,16 @@ def run_autoflake(in_dir: Path) -> None:
     in_dir : Path
         Directory to run autoflake in.
     """
-    ensure_package_exists("autoflake")
-    run_command(
+    _run_lint_tool(
+        in_dir,
+        "autoflake",
         [
-            sys.executable,
-            "-m",
-            "autoflake",
             "--remove-all-unused-imports",
             "--remove-unused-variables",
             "--in-place",
-            ".",
         ],
-        cwd=in_dir,
+        (".py",),
+        [],
     )
 
 
@@ -263,21 +674,16 @@ def run_pylint(in_dir: Path) -> None:
     in_dir : Path
         Directory to run pylint in.
     """
-    ensure_package_exists("pylint")
-    run_command(
-        [sys.executable, "-m", "pylint", "--rcfile=pyproject.toml", "."],
-        cwd=in_dir,
+    _run_lint_tool(
+        in_dir,
+        "pylint",
+        ["--rcfile=pyproject.toml"],
+        (".py",),
+        ["pyproject.toml"],
+        per_file=False,
     )
 
 
-class ImageConfig(NamedTuple):
-    """Python image configuration."""
-
-    name: str
-    file: Path
-    platforms: List[str]
-
-
 def get_py_image_configs() -> Generator[ImageConfig, None, None]:
     """Get all python images configurations.
 
@@ -291,18 +697,7 @@ def get_py_image_configs() -> Generator[ImageConfig, None, None]:
     FileNotFoundError
         If the package.json or the container files do not exist.
     """
-    package_json_path = ROOT_DIR / "package.json"
-    if not package_json_path.exists():
-        raise FileNotFoundError(f"{package_json_path} does not exist.")
-    with open(package_json_path, "r", encoding="utf-8") as file:
-        package_json = json.load(file)
-    images = package_json.get("images", {}).get("py", [])
-    for image in images:
-        container_file_path = ROOT_DIR / image["file"]
-        if not container_file_path.exists():
-            raise FileNotFoundError(f"{container_file_path} does not exist.")
-        yield ImageConfig(
-            name=image["name"],
-            file=container_file_path,
-            platforms=image["platforms"],
-        )
+    for config in get_workspace().py_images:
+        if not config.file.exists():
+            raise FileNotFoundError(f"{config.file} does not exist.")
+        yield config
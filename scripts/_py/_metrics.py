@@ -0,0 +1,344 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""Timing and resource usage of the tasks and commands the scripts run.
+
+Each measurement has the wall time, the CPU user/system time, the
+peak RSS and the exit code of a command (or a whole task), labelled
+with its stage and project. At exit, the measurements are written as
+JSON lines (``reports/timings/<script>.jsonl`` or ``--report <path>``)
+and a summary table (slowest first) is printed.
+
+The durations and failures of the commands and tasks are also kept
+across runs (``.cache/step-history.json``), as averages that favour
+the recent runs, to run the ones most likely to fail early first
+(see ``get_priority``). The history is updated under a lock, so
+concurrent runs (e.g. of different stages) merge their measurements.
+
+Functions
+---------
+add_measurement(measurement: Measurement) -> None
+    Record a measurement.
+discard_files() -> None
+    Do not write the report and the history of this run.
+get_usage(rusage: Any) -> Tuple[float, float, int]
+    Get the CPU user/system time and peak RSS from a rusage.
+get_priority(kind: str, stage: str, project: str, name: str) -> float
+    Get the expected failures per second of a command or task.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+if sys.platform == "win32":
+    import msvcrt  # pylint: disable=import-error
+else:
+    import fcntl
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+REPORTS_DIR = ROOT_DIR / "reports" / "timings"
+HISTORY_PATH = ROOT_DIR / ".cache" / "step-history.json"
+# weight of the previous runs in the history's averages
+HISTORY_DECAY = 0.8
+# the duration assumed for the steps that never ran
+DEFAULT_DURATION = 1.0
+
+
+class Measurement(NamedTuple):
+    """The resources used by a command or a task.
+
+    Attributes
+    ----------
+    kind : str
+        ``command`` or ``task``.
+    stage : str
+        The stage (lint, test, ...).
+    project : str
+        The project, relative to the root directory.
+    name : str
+        The command (tool or script) or task name.
+    wall : float
+        Wall time in seconds.
+    user : float
+        CPU user time in seconds.
+    system : float
+        CPU system time in seconds.
+    max_rss_kb : int
+        Peak resident set size in KiB (0 if unknown).
+    exit_code : int
+        The exit code.
+    """
+
+    kind: str
+    stage: str
+    project: str
+    name: str
+    wall: float
+    user: float = 0.0
+    system: float = 0.0
+    max_rss_kb: int = 0
+    exit_code: int = 0
+
+
+_MEASUREMENTS: List[Measurement] = []
+_LOCK = threading.Lock()
+_DISCARDED = threading.Event()
+
+
+def get_usage(rusage: Any) -> Tuple[float, float, int]:
+    """Get the CPU user/system time and peak RSS from a rusage.
+
+    Parameters
+    ----------
+    rusage : Any
+        The ``resource.struct_rusage`` (or None).
+
+    Returns
+    -------
+    Tuple[float, float, int]
+        User time, system time (seconds) and peak RSS (KiB).
+    """
+    if rusage is None:
+        return 0.0, 0.0, 0
+    max_rss = int(rusage.ru_maxrss)
+    if sys.platform == "darwin":
+        # bytes on macOS, KiB elsewhere
+        max_rss //= 1024
+    return float(rusage.ru_utime), float(rusage.ru_stime), max_rss
+
+
+def add_measurement(measurement: Measurement) -> None:
+    """Record a measurement (reported at exit).
+
+    Parameters
+    ----------
+    measurement : Measurement
+        The measurement.
+    """
+    with _LOCK:
+        if not _MEASUREMENTS:
+            atexit.register(report)
+        _MEASUREMENTS.append(measurement)
+
+
+def discard_files() -> None:
+    """Do not write the report and the history of this run.
+
+    For the scripts that remove them (``clean``), only the summary
+    is printed at exit.
+    """
+    _DISCARDED.set()
+
+
+def get_measurements() -> List[Measurement]:
+    """Get the measurements so far.
+
+    Returns
+    -------
+    List[Measurement]
+        The measurements.
+    """
+    with _LOCK:
+        return list(_MEASUREMENTS)
+
+
+def _get_key(kind: str, stage: str, project: str, name: str) -> str:
+    """Get the history key of a command or task."""
+    return "|".join((kind, stage, project, name))
+
+
+@cache
+def load_history() -> Dict[str, List[float]]:
+    """Load the history of the commands and tasks.
+
+    Returns
+    -------
+    Dict[str, List[float]]
+        The (decayed) number of runs and failures and the average
+        duration by ``kind|stage|project|name``.
+    """
+    return _read_history()
+
+
+def _read_history() -> Dict[str, List[float]]:
+    """Read the history file (empty if missing or invalid)."""
+    try:
+        with open(HISTORY_PATH, "r", encoding="utf-8") as file:
+            history: Dict[str, List[float]] = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return history if isinstance(history, dict) else {}
+
+
+@contextmanager
+def _lock_history() -> Iterator[None]:
+    """Hold an exclusive lock on the history, across processes."""
+    lock_path = HISTORY_PATH.with_name(f"{HISTORY_PATH.name}.lock")
+    with open(lock_path, "a+b") as file:
+        if sys.platform == "win32":
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def update_history(measurements: List[Measurement]) -> None:
+    """Add the measurements of this run to the history.
+
+    The commands that were killed (negative exit code) are not
+    added, their duration and outcome are not meaningful. The
+    history is read again under the lock, so that the measurements
+    of concurrent runs are merged rather than overwritten.
+
+    Parameters
+    ----------
+    measurements : List[Measurement]
+        The measurements.
+    """
+    HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with _lock_history():
+        history = _read_history()
+        for item in measurements:
+            if item.exit_code < 0:
+                continue
+            key = _get_key(item.kind, item.stage, item.project, item.name)
+            runs, failures, wall = history.get(key, [0.0, 0.0, item.wall])
+            average = wall * HISTORY_DECAY + item.wall * (1 - HISTORY_DECAY)
+            history[key] = [
+                round(runs * HISTORY_DECAY + 1, 3),
+                round(failures * HISTORY_DECAY + (item.exit_code != 0), 3),
+                round(average, 3),
+            ]
+        tmp_path = HISTORY_PATH.with_name(f"{HISTORY_PATH.name}.{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8", newline="\n") as file:
+            json.dump(history, file, sort_keys=True)
+        os.replace(tmp_path, HISTORY_PATH)
+
+
+def get_priority(kind: str, stage: str, project: str, name: str) -> float:
+    """Get the expected failures per second of a command or task.
+
+    The failure rate is smoothed (one failure in two runs is assumed
+    before any run), so that the steps that never ran, or never
+    failed, are not ruled out.
+
+    Parameters
+    ----------
+    kind : str
+        ``command`` or ``task``.
+    stage : str
+        The stage (lint, test, ...).
+    project : str
+        The project, relative to the root directory.
+    name : str
+        The command (tool or script) or task name.
+
+    Returns
+    -------
+    float
+        The failure rate divided by the average duration, the steps
+        with the highest priority should run first.
+    """
+    key = _get_key(kind, stage, project, name)
+    runs, failures, wall = load_history().get(key, [0.0, 0.0, DEFAULT_DURATION])
+    return (failures + 1) / (runs + 2) / max(wall, 0.01)
+
+
+def get_report_path() -> Path:
+    """Get the path of the JSON lines report.
+
+    Returns
+    -------
+    Path
+        ``--report <path>`` or ``reports/timings/<script>.jsonl``.
+    """
+    for index, arg in enumerate(sys.argv[:-1]):
+        if arg == "--report":
+            return Path(sys.argv[index + 1]).resolve()
+    return REPORTS_DIR / f"{Path(sys.argv[0]).stem or 'python'}.jsonl"
+
+
+def write_report(path: Path, measurements: List[Measurement]) -> None:
+    """Write the measurements as JSON lines.
+
+    Parameters
+    ----------
+    path : Path
+        The report file.
+    measurements : List[Measurement]
+        The measurements.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="\n") as file:
+        for measurement in measurements:
+            file.write(json.dumps(measurement._asdict()) + "\n")
+
+
+def format_summary(measurements: List[Measurement]) -> str:
+    """Format the measurements as a table, slowest first.
+
+    Parameters
+    ----------
+    measurements : List[Measurement]
+        The measurements.
+
+    Returns
+    -------
+    str
+        The table.
+    """
+    header = (
+        f"{'kind':<8}{'stage':<14}{'project':<32}{'name':<22}"
+        f"{'wall(s)':>9}{'user(s)':>9}{'sys(s)':>8}{'rss(MiB)':>10}{'exit':>6}"
+    )
+    lines = [header, "-" * len(header)]
+    for item in sorted(measurements, key=lambda item: -item.wall):
+        lines.append(
+            f"{item.kind:<8}{item.stage[:13]:<14}{item.project[-31:]:<32}"
+            f"{item.name[-21:]:<22}{item.wall:>9.2f}{item.user:>9.2f}"
+            f"{item.system:>8.2f}{item.max_rss_kb / 1024:>10.1f}"
+            f"{item.exit_code:>6}"
+        )
+    return "\n".join(lines)
+
+
+def report(path: Optional[Path] = None) -> None:
+    """Write the report and the history and print the summary table.
+
+    Nothing is written after ``discard_files()``.
+
+    Parameters
+    ----------
+    path : Optional[Path]
+        The report file, defaults to ``get_report_path()``.
+    """
+    measurements = get_measurements()
+    if not measurements:
+        return
+    print(f"\n{format_summary(measurements)}\n", flush=True)
+    if _DISCARDED.is_set():
+        return
+    report_path = path or get_report_path()
+    try:
+        write_report(report_path, measurements)
+    except OSError as error:
+        print(f"Could not write {report_path}: {error}", file=sys.stderr)
+    try:
+        update_history(measurements)
+    except OSError as error:
+        print(f"Could not write {HISTORY_PATH}: {error}", file=sys.stderr)
+    print(f"Timings written to {report_path}", flush=True)
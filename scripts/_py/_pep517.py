@@ -0,0 +1,99 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""Build a project's sdist and wheel with its PEP 517 backend.
+
+The backend is called in the current environment (no isolated build
+environment is created), in the project directory::
+
+    python _pep517.py <build-backend> <output dir> [<backend-path> ...]
+
+With ``--requires`` (first), the output is a json file and the
+requirements the backend asks for (its ``get_requires_for_build_sdist``
+and ``get_requires_for_build_wheel`` hooks) are written to it, to be
+installed in the environment before the build.
+
+This runs with the interpreter of the shared build environment, so it
+only uses the standard library (and the backend).
+"""
+
+import importlib
+import json
+import os
+import sys
+from typing import Any, List
+
+
+def load_backend(name: str) -> Any:
+    """Load a build backend.
+
+    Parameters
+    ----------
+    name : str
+        The ``build-backend`` (``module`` or ``module:object``).
+
+    Returns
+    -------
+    Any
+        The backend (module or object).
+    """
+    module_name, _, attributes = name.partition(":")
+    backend: Any = importlib.import_module(module_name)
+    for attribute in filter(None, attributes.split(".")):
+        backend = getattr(backend, attribute)
+    return backend
+
+
+def get_requires(backend: Any) -> List[str]:
+    """Get the additional requirements to build the sdist and the wheel.
+
+    Parameters
+    ----------
+    backend : Any
+        The build backend.
+
+    Returns
+    -------
+    List[str]
+        The requirements of its (optional) ``get_requires_for_build_*``
+        hooks.
+    """
+    requires: List[str] = []
+    for hook in (
+        "get_requires_for_build_sdist",
+        "get_requires_for_build_wheel",
+    ):
+        for requirement in getattr(backend, hook, lambda: [])():
+            if requirement not in requires:
+                requires.append(requirement)
+    return requires
+
+
+def main() -> None:
+    """Build the sdist and the wheel of the project in this directory."""
+    args = sys.argv[1:]
+    requires_only = bool(args) and args[0] == "--requires"
+    if requires_only:
+        args.pop(0)
+    if len(args) < 2:
+        print(
+            f"Usage: {sys.argv[0]} [--requires] <backend> <output> "
+            "[<path> ...]",
+            file=sys.stderr,
+        )
+        sys.exit(2)
+    name, output = args[0], args[1]
+    # in-tree backends
+    sys.path[:0] = [os.path.abspath(path) for path in args[2:]]
+    backend = load_backend(name)
+    if requires_only:
+        with open(output, "w", encoding="utf-8", newline="\n") as file:
+            json.dump(get_requires(backend), file)
+        return
+    os.makedirs(output, exist_ok=True)
+    for hook in ("build_sdist", "build_wheel"):
+        artifact = getattr(backend, hook)(output)
+        print(f"Built {os.path.join(output, artifact)}")
+
+
+if __name__ == "__main__":
+    main()
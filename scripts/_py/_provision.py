@@ -0,0 +1,277 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""Provision the tools the python scripts use.
+
+The tools are pinned in the ``dev`` extra of the root pyproject.toml.
+They are checked against the installed distributions in a single pass
+and all the missing (or mismatching) ones are installed with a single
+resolver call (uv if available, pip otherwise).
+
+Attributes
+----------
+TOOLS : Tuple[str, ...]
+    The tools the lint/format scripts use.
+
+Functions
+---------
+get_missing_requirements(names: Iterable[str]) -> List[str]
+    Get the (pinned) requirements that are not satisfied.
+is_satisfied(requirement: str, installed: Dict[str, str]) -> bool
+    Check if a requirement is satisfied by the installed versions.
+get_install_command(requirements: List[str], python: str) -> List[str]
+    Get the command to install requirements.
+load_toml(path: Path) -> Dict[str, Any]
+    Load a toml file.
+"""
+
+import importlib.util
+import re
+import sys
+from functools import cache
+from importlib import import_module, metadata
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+TOOLS = (
+    "autoflake",
+    "bandit",
+    "black",
+    "flake8",
+    "isort",
+    "mypy",
+    "pydocstyle",
+    "pylint",
+    "ruff",
+    "yamllint",
+)
+
+
+def canonicalize_name(name: str) -> str:
+    """Normalize a distribution name (PEP 503).
+
+    Parameters
+    ----------
+    name : str
+        The distribution name.
+
+    Returns
+    -------
+    str
+        The normalized name.
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def get_requirement_name(requirement: str) -> str:
+    """Get the distribution name of a requirement string.
+
+    Parameters
+    ----------
+    requirement : str
+        The requirement, e.g. ``black==24.10.0``.
+
+    Returns
+    -------
+    str
+        The normalized name, e.g. ``black``.
+    """
+    return canonicalize_name(re.split(r"[\s<>=!~;\[@]", requirement, 1)[0])
+
+
+def load_toml(path: Path) -> Dict[str, Any]:
+    """Load a toml file.
+
+    Parameters
+    ----------
+    path : Path
+        The toml file.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The data, empty if the file (or a toml library) is missing.
+    """
+    # toml uses 'r' mode, tomllib uses 'rb' mode
+    module, mode = (
+        ("tomllib", "rb") if sys.version_info >= (3, 11) else ("toml", "r")
+    )
+    try:
+        loader = import_module(module)
+    except ImportError:
+        return {}
+    try:
+        with open(path, mode) as file:  # pylint: disable=unspecified-encoding
+            data: Dict[str, Any] = loader.load(file)
+    except OSError:
+        return {}
+    return data
+
+
+@cache
+def get_pinned_requirements() -> Dict[str, str]:
+    """Get the requirements of the root ``dev`` extra.
+
+    Returns
+    -------
+    Dict[str, str]
+        The requirement strings by normalized name.
+    """
+    pyproject = load_toml(ROOT_DIR / "pyproject.toml")
+    extras = pyproject.get("project", {}).get("optional-dependencies", {})
+    return {
+        get_requirement_name(requirement): requirement
+        for requirement in extras.get("dev", [])
+    }
+
+
+def get_installed_versions(
+    path: Optional[List[str]] = None,
+) -> Dict[str, str]:
+    """Get the installed distributions.
+
+    Parameters
+    ----------
+    path : Optional[List[str]]
+        The directories to look in, defaults to ``sys.path``.
+
+    Returns
+    -------
+    Dict[str, str]
+        The installed versions by normalized name.
+    """
+    installed: Dict[str, str] = {}
+    for distribution in metadata.distributions(path=path or sys.path):
+        name = distribution.metadata["Name"]
+        if name:
+            installed.setdefault(canonicalize_name(name), distribution.version)
+    return installed
+
+
+def _get_packaging() -> Optional[Any]:
+    """Get the ``packaging.requirements`` module (or pip's copy)."""
+    for module in (
+        "packaging.requirements",
+        "pip._vendor.packaging.requirements",
+    ):
+        try:
+            return import_module(module)
+        except ImportError:
+            continue
+    return None
+
+
+def _is_version_satisfied(parsed: Any, installed: Dict[str, str]) -> bool:
+    """Check if a parsed requirement's version is installed."""
+    version = installed.get(canonicalize_name(parsed.name))
+    if version is None:
+        return False
+    return bool(parsed.specifier.contains(version, prereleases=True))
+
+
+def _are_extras_satisfied(
+    packaging: Any, parsed: Any, installed: Dict[str, str]
+) -> bool:
+    """Check if the (direct) requirements of the extras are installed."""
+    try:
+        requires = metadata.requires(parsed.name) or []
+    except metadata.PackageNotFoundError:
+        return False
+    for line in requires:
+        extra_requirement = packaging.Requirement(line)
+        marker = extra_requirement.marker
+        if marker is None or not any(
+            marker.evaluate({"extra": extra}) for extra in parsed.extras
+        ):
+            continue
+        if not _is_version_satisfied(extra_requirement, installed):
+            return False
+    return True
+
+
+def is_satisfied(requirement: str, installed: Dict[str, str]) -> bool:
+    """Check if a requirement is satisfied by the installed versions.
+
+    Only the requirement itself (and the direct requirements of its
+    extras) are checked, not its whole dependency tree.
+
+    Parameters
+    ----------
+    requirement : str
+        The requirement string.
+    installed : Dict[str, str]
+        The installed versions by normalized name.
+
+    Returns
+    -------
+    bool
+        Whether the requirement is satisfied (or does not apply to
+        this environment).
+    """
+    packaging = _get_packaging()
+    if packaging is None:
+        # no way to evaluate specifiers/markers, presence is enough
+        return get_requirement_name(requirement) in installed
+    parsed = packaging.Requirement(requirement)
+    if parsed.marker is not None and not parsed.marker.evaluate():
+        return True
+    if not _is_version_satisfied(parsed, installed):
+        return False
+    return not parsed.extras or _are_extras_satisfied(
+        packaging, parsed, installed
+    )
+
+
+def get_missing_requirements(names: Iterable[str]) -> List[str]:
+    """Get the (pinned) requirements that are not satisfied.
+
+    Parameters
+    ----------
+    names : Iterable[str]
+        The distribution names.
+
+    Returns
+    -------
+    List[str]
+        The requirements to install.
+    """
+    pinned = get_pinned_requirements()
+    installed = get_installed_versions()
+    requirements = sorted(
+        {pinned.get(canonicalize_name(name), name) for name in names}
+    )
+    return [
+        requirement
+        for requirement in requirements
+        if not is_satisfied(requirement, installed)
+    ]
+
+
+def get_install_command(
+    requirements: List[str], python: str = sys.executable
+) -> List[str]:
+    """Get the command to install requirements (one resolver call).
+
+    Parameters
+    ----------
+    requirements : List[str]
+        The requirements to install.
+    python : str
+        The interpreter (environment) to install them for.
+
+    Returns
+    -------
+    List[str]
+        The command (``uv pip install`` if uv is available).
+    """
+    if importlib.util.find_spec("uv") is not None:
+        return [
+            sys.executable,
+            "-m",
+            "uv",
+            "pip",
+            "install",
+            "--python",
+            python,
+        ] + requirements
+    return [python, "-m", "pip", "install"] + requirements
@@ -0,0 +1,585 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""The task graph and the commands of the python scripts.
+
+The tasks run on a pool of worker threads, the output of each one is
+buffered and printed at once when it is done. Every task and every
+command it runs is measured (see ``_metrics``), the history of these
+measurements decides which ready tasks (and steps of a task) run
+first. The running commands are tracked, so that they can be stopped
+on the first failure (``--fail-fast``).
+
+Classes
+-------
+Task
+    A node in the task graph.
+
+Functions
+---------
+execute(args: List[str], cwd: Path, capture: bool, env) -> Tuple[int, str]
+    Run and measure a command.
+track(pid: int)
+    Stop a process running a command if the commands are cancelled.
+emit(text: str) -> None
+    Print, or add to the output of the running task.
+cancel_running(timeout: float = 5.0) -> None
+    Stop the running commands and do not start new ones.
+get_task_name(stage: str, project_dir: Path) -> str
+    Get the name of a (stage, project) task.
+run_tasks(tasks: Sequence[Task], jobs: int = 1) -> None
+    Run a graph of tasks on a bounded worker pool.
+run_steps(steps: Sequence[Tuple[str, Callable[[], None]]]) -> None
+    Run the independent steps of a task, the cheapest signal first.
+"""
+
+import os
+import signal
+import subprocess  # nosemgrep # nosec
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+# pylint: disable=ungrouped-imports,too-many-try-statements
+try:
+    from _metrics import Measurement, add_measurement, get_priority, get_usage
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from _metrics import (  # type: ignore
+        Measurement,
+        add_measurement,
+        get_priority,
+        get_usage,
+    )
+# pylint: enable=ungrouped-imports,too-many-try-statements
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+
+# per thread output buffer, set while a task runs on the worker pool
+_TASK_OUTPUT = threading.local()
+_PRINT_LOCK = threading.Lock()
+# the processes running commands (see cancel_running)
+_RUNNING: Set[int] = set()
+_RUNNING_LOCK = threading.Lock()
+_CANCELLED = threading.Event()
+
+
+def _get_command_name(args: List[str]) -> str:
+    """Get a short name of a command (the module or script it runs)."""
+    if len(args) > 2 and args[1] == "-m":
+        return args[2]
+    if len(args) > 1 and args[0] == sys.executable:
+        return args[1].replace(str(ROOT_DIR), ".")
+    return Path(args[0]).name
+
+
+def _get_labels() -> Tuple[str, str]:
+    """Get the stage and project of the running task."""
+    task: Optional[str] = getattr(_TASK_OUTPUT, "task", None)
+    if task is None:
+        return Path(sys.argv[0]).stem, "."
+    stage, project = task.split(":", 1)
+    return stage, project
+
+
+def measure(
+    kind: str,
+    name: str,
+    start: float,
+    exit_code: int,
+    usage: Tuple[float, float, int] = (0.0, 0.0, 0),
+) -> None:
+    """Record the resources used by a command or a task.
+
+    Parameters
+    ----------
+    kind : str
+        ``command`` or ``task``.
+    name : str
+        The command (tool or script) or task name.
+    start : float
+        When it started (``time.perf_counter()``).
+    exit_code : int
+        Its exit code.
+    usage : Tuple[float, float, int]
+        Its CPU user/system time and peak RSS (KiB).
+    """
+    stage, project = _get_labels()
+    add_measurement(
+        Measurement(
+            kind,
+            stage,
+            project,
+            name,
+            round(time.perf_counter() - start, 3),
+            round(usage[0], 3),
+            round(usage[1], 3),
+            usage[2],
+            exit_code,
+        )
+    )
+
+
+def _wait(process: "subprocess.Popen[str]") -> Tuple[int, Any]:
+    """Wait for a process, getting its resource usage if possible."""
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, rusage
+
+
+def execute(
+    args: List[str], cwd: Path, capture: bool, env: Optional[Dict[str, str]]
+) -> Tuple[int, str]:
+    """Run and measure a command.
+
+    With ``--fail-fast`` the command gets its own process group,
+    so that ``cancel_running`` also stops the processes it starts.
+
+    Parameters
+    ----------
+    args : List[str]
+        The command.
+    cwd : Path
+        The directory to run it in.
+    capture : bool
+        Whether to return its output instead of printing it.
+    env : Optional[Dict[str, str]]
+        The environment, defaults to this process's environment.
+
+    Returns
+    -------
+    Tuple[int, str]
+        The exit code and the (captured) output.
+    """
+    start = time.perf_counter()
+    with _RUNNING_LOCK:
+        exit_if_cancelled()
+        # pylint: disable=consider-using-with
+        process = subprocess.Popen(  # nosemgrep # nosec
+            args,
+            cwd=cwd,
+            stdout=subprocess.PIPE if capture else sys.stdout,
+            stderr=subprocess.STDOUT,
+            env=os.environ if env is None else env,
+            encoding="utf-8",
+            # its own process group, to stop it with its children
+            start_new_session=_is_fail_fast(),
+        )
+        _RUNNING.add(process.pid)
+    try:
+        with process:
+            output = process.stdout.read() if process.stdout else ""
+            exit_code, rusage = _wait(process)
+    finally:
+        with _RUNNING_LOCK:
+            _RUNNING.discard(process.pid)
+    measure(
+        "command", _get_command_name(args), start, exit_code, get_usage(rusage)
+    )
+    return exit_code, output
+
+
+def _is_fail_fast() -> bool:
+    """Check if the running commands are stopped on the first failure."""
+    return "--fail-fast" in sys.argv and hasattr(os, "killpg")
+
+
+def _signal(pid: int, signum: int) -> None:
+    """Send a signal to a process (and its process group if it has one)."""
+    try:
+        if hasattr(os, "killpg") and os.getpgid(pid) == pid:
+            os.killpg(pid, signum)
+        else:
+            os.kill(pid, signum)
+    except OSError:
+        pass
+
+
+def exit_if_cancelled() -> None:
+    """Do not start anything after the running commands were cancelled."""
+    if _CANCELLED.is_set():
+        emit("Cancelled after a failure")
+        # like a killed command, not recorded as a failure
+        sys.exit(-signal.SIGTERM)
+
+
+@contextmanager
+def track(pid: int) -> Iterator[None]:
+    """Stop a process running a command if the commands are cancelled.
+
+    For the commands that do not run in a subprocess of their own,
+    e.g. in a lint worker (see ``_worker``).
+
+    Parameters
+    ----------
+    pid : int
+        The process running the command.
+
+    Yields
+    ------
+    None
+        While the command runs.
+
+    Raises
+    ------
+    SystemExit
+        If the commands were cancelled meanwhile.
+    """
+    with _RUNNING_LOCK:
+        _RUNNING.add(pid)
+        if _CANCELLED.is_set():
+            _signal(pid, signal.SIGTERM)
+    try:
+        yield
+    finally:
+        with _RUNNING_LOCK:
+            _RUNNING.discard(pid)
+        exit_if_cancelled()
+
+
+def cancel_running(timeout: float = 5.0) -> None:
+    """Stop the running commands and do not start new ones.
+
+    The commands get a ``SIGTERM`` (their whole process group with
+    ``--fail-fast``) and the ones still running after the timeout a
+    ``SIGKILL``.
+
+    Parameters
+    ----------
+    timeout : float
+        The seconds to wait for the commands to exit.
+    """
+    with _RUNNING_LOCK:
+        _CANCELLED.set()
+        pids = list(_RUNNING)
+    for signum in (signal.SIGTERM, getattr(signal, "SIGKILL", None)):
+        if signum is None or not pids:
+            return
+        for pid in pids:
+            _signal(pid, signum)
+        deadline = time.monotonic() + timeout
+        while pids and time.monotonic() < deadline:
+            time.sleep(0.05)
+            with _RUNNING_LOCK:
+                pids = [pid for pid in pids if pid in _RUNNING]
+
+
+def is_capturing() -> bool:
+    """Check if the output of the running task is buffered.
+
+    Returns
+    -------
+    bool
+        Whether a task runs (on the worker pool) in this thread.
+    """
+    return getattr(_TASK_OUTPUT, "lines", None) is not None
+
+
+def emit(text: str) -> None:
+    """Print, or add to the output of the running task.
+
+    Parameters
+    ----------
+    text : str
+        The text (a line is added if it does not end with one).
+    """
+    output: Optional[List[str]] = getattr(_TASK_OUTPUT, "lines", None)
+    if output is None:
+        print(text, end="" if text.endswith("\n") else "\n", flush=True)
+    else:
+        output.append(text if text.endswith("\n") else f"{text}\n")
+
+
+class Task(NamedTuple):
+    """A node in the task graph.
+
+    Attributes
+    ----------
+    name : str
+        Unique name of the task, usually ``<stage>:<project>``.
+    func : Callable[[], None]
+        What to run.
+    deps : Tuple[str, ...]
+        Names of the tasks that must finish before this one starts.
+    """
+
+    name: str
+    func: Callable[[], None]
+    deps: Tuple[str, ...] = ()
+
+
+def get_task_name(stage: str, project_dir: Path) -> str:
+    """Get the name of a (stage, project) task.
+
+    Parameters
+    ----------
+    stage : str
+        The stage (format, lint, test, ...).
+    project_dir : Path
+        The project directory.
+
+    Returns
+    -------
+    str
+        The task name, e.g. ``lint:packages/studio`` or ``lint:.``.
+    """
+    try:
+        relative = project_dir.resolve().relative_to(ROOT_DIR.resolve())
+    except ValueError:
+        relative = project_dir
+    return f"{stage}:{relative.as_posix()}"
+
+
+def sort_tasks(tasks: Sequence[Task]) -> List[Task]:
+    """Sort tasks so that every task comes after its dependencies.
+
+    The original order is kept where the dependencies allow it.
+
+    Parameters
+    ----------
+    tasks : Sequence[Task]
+        The tasks to sort.
+
+    Returns
+    -------
+    List[Task]
+        The sorted tasks.
+
+    Raises
+    ------
+    ValueError
+        If a dependency is unknown or if the graph has a cycle.
+    """
+    names = {task.name for task in tasks}
+    for task in tasks:
+        unknown = set(task.deps) - names
+        if unknown:
+            raise ValueError(f"Unknown dependencies of {task.name}: {unknown}")
+    ordered: List[Task] = []
+    done: Set[str] = set()
+    remaining = list(tasks)
+    while remaining:
+        ready = [task for task in remaining if set(task.deps) <= done]
+        if not ready:
+            cycle = ", ".join(task.name for task in remaining)
+            raise ValueError(f"Cycle in the task graph: {cycle}")
+        for task in ready:
+            remaining.remove(task)
+            done.add(task.name)
+        ordered.extend(ready)
+    return ordered
+
+
+def _run_task(task: Task, capture: bool = True) -> None:
+    """Run and measure a task.
+
+    If capturing, its output is printed at once when it is done.
+    """
+    _TASK_OUTPUT.task = task.name
+    _TASK_OUTPUT.lines = [f"[{task.name}]\n"] if capture else None
+    start = time.perf_counter()
+    exit_code = 1
+    try:
+        task.func()
+        exit_code = 0
+    except SystemExit as error:
+        exit_code = error.code if isinstance(error.code, int) else 1
+        raise
+    finally:
+        measure("task", task.name.split(":", 1)[-1], start, exit_code)
+        lines = _TASK_OUTPUT.lines
+        _TASK_OUTPUT.task = _TASK_OUTPUT.lines = None
+        if lines:
+            with _PRINT_LOCK:
+                print("".join(lines), flush=True)
+
+
+def _get_code(error: BaseException) -> int:
+    """Get the exit code of a task (or step) that raised."""
+    if isinstance(error, SystemExit):
+        if isinstance(error.code, int):
+            return error.code
+        return 1 if error.code else 0
+    print(f"{type(error).__name__}: {error}", file=sys.stderr)
+    return 1
+
+
+def _get_exit_code(future: "Future[None]") -> int:
+    """Get the exit code of a finished task."""
+    error = future.exception()
+    return 0 if error is None else _get_code(error)
+
+
+def run_steps(steps: Sequence[Tuple[str, Callable[[], None]]]) -> None:
+    """Run the independent steps of a task, the cheapest signal first.
+
+    The steps most likely to fail per second of run time (see
+    ``_metrics.get_priority``) run first. The first failure stops the
+    task, unless ``--keep-going`` is given: then all the steps run
+    and the failed ones are listed at the end.
+
+    Parameters
+    ----------
+    steps : Sequence[Tuple[str, Callable[[], None]]]
+        The steps, named after the command they run (e.g. the tool).
+
+    Raises
+    ------
+    SystemExit
+        With the exit code of the (first) failed step.
+    """
+    stage, project = _get_labels()
+    ordered = sorted(
+        steps,
+        key=lambda step: -get_priority("command", stage, project, step[0]),
+    )
+    failed: List[str] = []
+    exit_code = 0
+    for name, func in ordered:
+        try:
+            func()
+        except SystemExit as error:
+            code = _get_code(error)
+            if code and ("--keep-going" not in sys.argv or _CANCELLED.is_set()):
+                raise
+            if code:
+                failed.append(name)
+                exit_code = exit_code or code
+    if failed:
+        emit(f"Failed steps: {', '.join(failed)}")
+        sys.exit(exit_code)
+
+
+def _get_task_key(task: Task) -> float:
+    """Get the sort key of a task, the highest priority first."""
+    stage, project = task.name.split(":", 1)
+    return -get_priority("task", stage, project, project)
+
+
+def prioritize_tasks(tasks: Sequence[Task]) -> List[Task]:
+    """Sort tasks by priority, keeping them after their dependencies.
+
+    Parameters
+    ----------
+    tasks : Sequence[Task]
+        The tasks to sort.
+
+    Returns
+    -------
+    List[Task]
+        The tasks, the ones most likely to fail per second of run
+        time (see ``_metrics.get_priority``) first where the
+        dependencies allow it.
+    """
+    return sort_tasks(sorted(tasks, key=_get_task_key))
+
+
+def _run_sequentially(ordered: Sequence[Task]) -> Dict[str, int]:
+    """Run sorted tasks one by one, get the exit codes of the failed ones."""
+    done: Set[str] = set()
+    failed: Dict[str, int] = {}
+    for task in ordered:
+        if failed and "--keep-going" not in sys.argv:
+            break
+        if not set(task.deps) <= done:
+            # a dependency failed
+            continue
+        try:
+            _run_task(task, capture=False)
+        # as on the pool, a task that raised failed
+        except (SystemExit, Exception) as error:  # pylint: disable=broad-except
+            code = _get_code(error)
+            if code:
+                print(f"Task {task.name} failed", file=sys.stderr)
+                failed[task.name] = code
+                continue
+        done.add(task.name)
+    return failed
+
+
+def _run_concurrently(ordered: Sequence[Task], jobs: int) -> Dict[str, int]:
+    """Run sorted tasks on a pool, get the exit codes of the failed ones."""
+    remaining: Dict[str, Task] = {task.name: task for task in ordered}
+    running: Dict["Future[None]", str] = {}
+    done: Set[str] = set()
+    failed: Dict[str, int] = {}
+    keep_going = "--keep-going" in sys.argv
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while remaining or running:
+            for name, task in list(remaining.items()):
+                if (keep_going or not failed) and set(task.deps) <= done:
+                    del remaining[name]
+                    running[executor.submit(_run_task, task)] = name
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                code = _get_exit_code(future)
+                if code == 0:
+                    done.add(name)
+                elif failed and _CANCELLED.is_set():
+                    print(f"Task {name} cancelled", file=sys.stderr)
+                else:
+                    print(f"Task {name} failed", file=sys.stderr)
+                    failed[name] = code
+                    if _is_fail_fast():
+                        cancel_running()
+    return failed
+
+
+def run_tasks(tasks: Sequence[Task], jobs: int = 1) -> None:
+    """Run a graph of tasks.
+
+    Independent tasks run concurrently on a pool of ``jobs`` workers,
+    a task only starts after all its dependencies succeeded, the
+    tasks most likely to fail per second of run time first (see
+    ``prioritize_tasks``). After the first failure no new tasks are
+    started and the running ones are awaited, or, with ``--fail-fast``,
+    stopped (``cancel_running``). With ``--keep-going`` all the tasks
+    whose dependencies succeeded still run. The failed tasks are
+    listed at the end and the process exits with the exit code of
+    the first one.
+
+    Parameters
+    ----------
+    tasks : Sequence[Task]
+        The tasks to run.
+    jobs : int
+        The maximum number of tasks to run at the same time.
+
+    Raises
+    ------
+    KeyboardInterrupt
+        If interrupted, after the running commands are stopped.
+    """
+    ordered = prioritize_tasks(tasks)
+    try:
+        if jobs <= 1 or len(ordered) <= 1:
+            failed = _run_sequentially(ordered)
+        else:
+            failed = _run_concurrently(ordered, jobs)
+    except KeyboardInterrupt:
+        # with --fail-fast the commands are not in our process group
+        cancel_running()
+        raise
+    if not failed:
+        return
+    print(f"Failed tasks: {', '.join(failed)}", file=sys.stderr)
+    sys.exit(next(iter(failed.values())))
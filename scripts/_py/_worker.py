@@ -0,0 +1,569 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""Warm worker process for the python linters and formatters.
+
+The tools are imported once in a long lived process and executed
+in-process (their ``python -m <tool>`` entry point, or their API if
+the entry point would exit the process), instead of paying an
+interpreter startup plus the tool's imports on every call.
+
+By default ``_lib`` starts one worker per ``lint.py``/``format.py``
+invocation and talks to it over pipes. A worker can also be kept
+alive as a local daemon (listening on a UNIX socket, only usable by
+its user), which every later invocation (and the projects' own
+scripts) will then use::
+
+    python scripts/_py/_worker.py start
+    python scripts/_py/_worker.py stop
+
+The workers import the tools once and handle each request in a fork
+of themselves (where available), so that a tool's state does not leak
+into the next request, and the daemon's concurrent requests run in
+parallel. When packages are installed or upgraded in its environment,
+the daemon restarts with the new versions.
+
+The callers can stop a request (``--fail-fast``): the process running
+it (the worker's child, in its own process group, or the worker
+itself without ``fork``) is passed to their ``track`` context manager
+while it runs.
+
+Functions
+---------
+run_in_process(tool: str, args: List[str], cwd: str) -> Tuple[int, str]
+    Run a tool in this process.
+run_in_worker(tool: str, args: List[str], cwd: Path, track)
+    Run a tool in the daemon or in this process's worker.
+"""
+
+import atexit
+import contextlib
+import importlib
+import io
+import json
+import os
+import runpy
+import socket
+import subprocess  # nosemgrep # nosec
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import (
+    IO,
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+SOCKET_ENV = "HARMONY_LINT_WORKER"
+SOCKET_PATH = ROOT_DIR / ".cache" / "lint-worker.sock"
+# tools that can safely run in-process (ruff execs its own binary)
+WORKER_TOOLS = frozenset(
+    {
+        "autoflake",
+        "bandit",
+        "black",
+        "flake8",
+        "isort",
+        "mypy",
+        "pydocstyle",
+        "pylint",
+        "yamllint",
+    }
+)
+# imported by the daemon before it forks the requests
+PRELOAD_MODULES = (
+    "autoflake",
+    "bandit.cli.main",
+    "black",
+    "flake8.main.cli",
+    "isort.main",
+    "mypy.api",
+    "pydocstyle.cli",
+    "pylint.lint",
+    "yamllint.cli",
+)
+
+
+def _untracked(pid: int) -> ContextManager[None]:
+    """Do not track the process running a request."""
+    del pid
+    return contextlib.nullcontext()
+
+
+class _Output(io.BytesIO):
+    """The captured output of a tool (some tools close/check stdout)."""
+
+    name = "<stdout>"
+
+    def close(self) -> None:
+        """Keep the output readable."""
+
+
+def _get_exit_code(code: Any) -> int:
+    """Get the exit code from a SystemExit's code."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code)
+    return 1
+
+
+def _run_tool(tool: str, args: List[str]) -> int:
+    """Run a tool's entry point, returning its exit code."""
+    if tool == "mypy":
+        # the mypy entry point might hard exit the process (os._exit)
+        stdout, stderr, status = importlib.import_module("mypy.api").run(args)
+        sys.stdout.write(stdout + stderr)
+        return int(status)
+    sys.argv = [tool] + args
+    try:
+        runpy.run_module(tool, run_name="__main__", alter_sys=True)
+    except SystemExit as exc:
+        return _get_exit_code(exc.code)
+    except Exception:  # pylint: disable=broad-except
+        sys.stdout.write(traceback.format_exc())
+        return 1
+    finally:
+        if "astroid" in sys.modules:
+            # do not reuse the (maybe changed) modules on the next run
+            sys.modules["astroid"].MANAGER.clear_cache()
+    return 0
+
+
+def run_in_process(tool: str, args: List[str], cwd: str) -> Tuple[int, str]:
+    """Run a tool in this process.
+
+    Parameters
+    ----------
+    tool : str
+        The tool (module) name.
+    args : List[str]
+        The tool's arguments.
+    cwd : str
+        The directory to run the tool in.
+
+    Returns
+    -------
+    Tuple[int, str]
+        The exit code and the output of the tool.
+    """
+    buffer = _Output()
+    stream = io.TextIOWrapper(buffer, encoding="utf-8", write_through=True)
+    saved_argv, saved_path, saved_cwd = sys.argv, sys.path[:], os.getcwd()
+    os.chdir(cwd)
+    try:
+        with (
+            contextlib.redirect_stdout(stream),
+            contextlib.redirect_stderr(stream),
+        ):
+            code = _run_tool(tool, args)
+    finally:
+        sys.argv, sys.path[:] = saved_argv, saved_path
+        os.chdir(saved_cwd)
+    stream.flush()
+    return code, buffer.getvalue().decode("utf-8", errors="replace")
+
+
+def _get_self_usage() -> Tuple[float, float, int]:
+    """Get this process's CPU user/system time and peak RSS (KiB)."""
+    try:
+        resource = importlib.import_module("resource")
+    except ImportError:
+        return 0.0, 0.0, 0
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    max_rss = int(usage.ru_maxrss)
+    if sys.platform == "darwin":
+        max_rss //= 1024
+    return float(usage.ru_utime), float(usage.ru_stime), max_rss
+
+
+def _handle(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle a request."""
+    before = _get_self_usage()
+    try:
+        code, output = run_in_process(
+            request["tool"], request["args"], request["cwd"]
+        )
+    except Exception:  # pylint: disable=broad-except
+        code, output = 1, traceback.format_exc()
+    after = _get_self_usage()
+    return {
+        "code": code,
+        "output": output,
+        "usage": [after[0] - before[0], after[1] - before[1], after[2]],
+    }
+
+
+def _preload() -> None:
+    """Import the tools, before forking the requests."""
+    for module in PRELOAD_MODULES:
+        with contextlib.suppress(ImportError):
+            importlib.import_module(module)
+
+
+def _serve_forked(replies: IO[str], request: Dict[str, Any]) -> None:
+    """Handle a request in a child process and wait for it."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _handle_forked(replies, request)
+        finally:
+            os._exit(0)  # pylint: disable=protected-access
+    if os.waitpid(pid, 0)[1] != 0:
+        error = "The lint worker's request was stopped"
+        replies.write(json.dumps({"error": error}) + "\n")
+        replies.flush()
+
+
+def serve_stdio() -> None:
+    """Serve requests (json lines) from stdin until it is closed.
+
+    Each reply is preceded by the pid of the process handling the
+    request (a child of this one, where ``fork`` is available).
+    """
+    # tools (or their children) writing to fd 1 must not corrupt the replies
+    replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)
+    if hasattr(os, "fork"):
+        _preload()
+    for line in sys.stdin:
+        if hasattr(os, "fork"):
+            _serve_forked(replies, json.loads(line))
+            continue
+        replies.write(json.dumps({"pid": os.getpid()}) + "\n")
+        replies.write(json.dumps(_handle(json.loads(line))) + "\n")
+        replies.flush()
+
+
+def get_env_stamp() -> List[int]:
+    """Get the modification times of the site-packages directories.
+
+    Installing, upgrading or removing a distribution changes them.
+
+    Returns
+    -------
+    List[int]
+        The ``st_mtime_ns`` of the purelib and platlib directories.
+    """
+    stamp: List[int] = []
+    paths = sysconfig.get_paths()
+    for name in ("purelib", "platlib"):
+        try:
+            stamp.append(os.stat(paths[name]).st_mtime_ns)
+        except (KeyError, OSError):
+            stamp.append(0)
+    return stamp
+
+
+def _reap_children() -> None:
+    """Collect the exit status of the finished request processes."""
+    with contextlib.suppress(ChildProcessError):
+        while os.waitpid(-1, os.WNOHANG)[0]:
+            pass
+
+
+def _handle_forked(io_: IO[str], request: Dict[str, Any]) -> None:
+    """Handle a request in a child of the daemon, sending its pid first."""
+    # to be stopped with the processes the tool starts
+    os.setpgid(0, 0)
+    io_.write(json.dumps({"pid": os.getpid()}) + "\n")
+    io_.flush()
+    io_.write(json.dumps(_handle(request)) + "\n")
+    io_.flush()
+
+
+def _serve_connection(server: socket.socket, stamp: List[int]) -> str:
+    """Serve a connection, get ``stop``/``restart`` to stop serving."""
+    connection = server.accept()[0]
+    with connection, connection.makefile("rw", encoding="utf-8") as io_:
+        line = io_.readline()
+        request = json.loads(line) if line else {}
+        if request.get("stop"):
+            io_.write(json.dumps({"code": 0, "output": ""}) + "\n")
+            return "stop"
+        if get_env_stamp() != stamp:
+            error = "The installed packages changed, restarting"
+            io_.write(json.dumps({"error": error}) + "\n")
+            return "restart"
+        if request and os.fork() == 0:
+            server.close()
+            try:
+                _handle_forked(io_, request)
+            finally:
+                os._exit(0)  # pylint: disable=protected-access
+    _reap_children()
+    return ""
+
+
+def serve_socket(path: Path) -> bool:
+    """Serve requests on a UNIX socket until a stop request.
+
+    The tools are imported once, each request is handled in a child
+    process (forked with them already imported).
+
+    Parameters
+    ----------
+    path : Path
+        The socket path.
+
+    Returns
+    -------
+    bool
+        True if the installed packages changed (to restart).
+    """
+    stamp = get_env_stamp()
+    _preload()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        path.unlink()
+    server = socket.socket(getattr(socket, "AF_UNIX"), socket.SOCK_STREAM)
+    # only this user can connect (0600), the requests run any tool
+    umask = os.umask(0o177)
+    try:
+        server.bind(str(path))
+    finally:
+        os.umask(umask)
+    server.listen()
+    try:
+        action = ""
+        while not action:
+            action = _serve_connection(server, stamp)
+    finally:
+        server.close()
+        with contextlib.suppress(FileNotFoundError):
+            path.unlink()
+    return action == "restart"
+
+
+def _read_reply(io_: IO[str]) -> Dict[str, Any]:
+    """Read a reply of a worker."""
+    line = io_.readline()
+    if not line:
+        raise OSError("The lint worker exited unexpectedly")
+    reply: Dict[str, Any] = json.loads(line)
+    if "error" in reply:
+        raise OSError(reply["error"])
+    return reply
+
+
+def _socket_request(
+    path: str,
+    request: Dict[str, Any],
+    track: Callable[[int], ContextManager[None]],
+) -> Dict[str, Any]:
+    """Send a request to the daemon and wait for the reply."""
+    client = socket.socket(getattr(socket, "AF_UNIX"), socket.SOCK_STREAM)
+    with client, client.makefile("rw", encoding="utf-8") as io_:
+        client.connect(path)
+        io_.write(json.dumps(request) + "\n")
+        io_.flush()
+        reply = _read_reply(io_)
+        if "pid" in reply:
+            # the daemon's child handling the request
+            with track(int(reply["pid"])):
+                reply = _read_reply(io_)
+    return reply
+
+
+class _PipeWorker:
+    """A worker process talking over its stdin/stdout."""
+
+    def __init__(self) -> None:
+        """Start the worker process."""
+        self._lock = threading.Lock()
+        # pylint: disable=consider-using-with
+        self._process = subprocess.Popen(  # nosemgrep # nosec
+            [sys.executable, __file__, "serve"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            encoding="utf-8",
+        )
+        atexit.register(self.close)
+
+    def request(
+        self,
+        request: Dict[str, Any],
+        track: Callable[[int], ContextManager[None]] = _untracked,
+    ) -> Dict[str, Any]:
+        """Send a request and wait for the reply.
+
+        Parameters
+        ----------
+        request : Dict[str, Any]
+            The request.
+        track : Callable[[int], ContextManager[None]]
+            Called with the pid of the process running the request
+            while it runs.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The reply.
+
+        Raises
+        ------
+        OSError
+            If the worker is gone or the request was stopped.
+        """
+        stdin: Optional[IO[str]] = self._process.stdin
+        stdout: Optional[IO[str]] = self._process.stdout
+        if stdin is None or stdout is None:
+            raise OSError("The lint worker is not running")
+        with self._lock:
+            stdin.write(json.dumps(request) + "\n")
+            stdin.flush()
+            with track(int(_read_reply(stdout)["pid"])):
+                return _read_reply(stdout)
+
+    def is_running(self) -> bool:
+        """Check if the worker process is still running.
+
+        Returns
+        -------
+        bool
+            False if it exited (or was stopped).
+        """
+        return self._process.poll() is None
+
+    def close(self) -> None:
+        """Stop the worker process."""
+        if self._process.poll() is None and self._process.stdin:
+            self._process.stdin.close()
+            self._process.wait()
+
+
+_PIPE_WORKER: Optional[_PipeWorker] = None
+
+
+def get_socket_path() -> Optional[str]:
+    """Get the socket of a running daemon (if any).
+
+    Returns
+    -------
+    Optional[str]
+        The socket path or None.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    path = os.environ.get(SOCKET_ENV, str(SOCKET_PATH))
+    return path if os.path.exists(path) else None
+
+
+def _parse_reply(
+    reply: Dict[str, Any]
+) -> Tuple[int, str, Tuple[float, float, int]]:
+    """Get the exit code, output and resource usage from a reply."""
+    user, system, max_rss = reply.get("usage", [0.0, 0.0, 0])
+    return (
+        int(reply["code"]),
+        str(reply["output"]),
+        (float(user), float(system), int(max_rss)),
+    )
+
+
+def run_in_worker(
+    tool: str,
+    args: List[str],
+    cwd: Path,
+    track: Callable[[int], ContextManager[None]] = _untracked,
+) -> Tuple[int, str, Tuple[float, float, int]]:
+    """Run a tool in the daemon or in this process's worker.
+
+    Parameters
+    ----------
+    tool : str
+        The tool (module) name.
+    args : List[str]
+        The tool's arguments.
+    cwd : Path
+        The directory to run the tool in.
+    track : Callable[[int], ContextManager[None]]
+        Called with the pid of the process running the tool while it
+        runs (e.g. to stop it).
+
+    Returns
+    -------
+    Tuple[int, str, Tuple[float, float, int]]
+        The exit code and the output of the tool and the worker's
+        CPU user/system time for it and peak RSS (KiB).
+    """
+    global _PIPE_WORKER  # pylint: disable=global-statement
+    request = {"tool": tool, "args": args, "cwd": str(cwd)}
+    socket_path = get_socket_path()
+    if socket_path is not None:
+        try:
+            reply = _socket_request(socket_path, request, track)
+        except OSError as error:
+            print(f"Lint worker not responding on {socket_path} ({error})")
+        else:
+            # let the projects' own scripts use it too
+            os.environ[SOCKET_ENV] = socket_path
+            return _parse_reply(reply)
+    if _PIPE_WORKER is None or not _PIPE_WORKER.is_running():
+        # a new one if the previous one was stopped
+        _PIPE_WORKER = _PipeWorker()
+    return _parse_reply(_PIPE_WORKER.request(request, track))
+
+
+def start_daemon() -> None:
+    """Start the daemon in the background, if not already running."""
+    if get_socket_path() is not None:
+        print(f"Lint worker already running on {SOCKET_PATH}")
+        return
+    # pylint: disable=consider-using-with
+    subprocess.Popen(  # nosemgrep # nosec
+        [sys.executable, __file__, "serve-socket"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    for _ in range(100):
+        if SOCKET_PATH.exists():
+            print(f"Lint worker listening on {SOCKET_PATH}")
+            return
+        time.sleep(0.05)
+    print("Lint worker did not start", file=sys.stderr)
+    sys.exit(1)
+
+
+def stop_daemon() -> None:
+    """Stop the daemon (if running)."""
+    socket_path = get_socket_path()
+    if socket_path is None:
+        print("Lint worker is not running")
+        return
+    _socket_request(socket_path, {"stop": True}, _untracked)
+    print("Lint worker stopped")
+
+
+def main() -> None:
+    """Start, stop or run a worker."""
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "serve":
+        serve_stdio()
+    elif command == "serve-socket":
+        if serve_socket(SOCKET_PATH):
+            # import the new versions of the tools
+            args = [sys.executable, __file__, "serve-socket"]
+            os.execv(sys.executable, args)  # nosemgrep # nosec
+    elif command == "start":
+        start_daemon()
+    elif command == "stop":
+        stop_daemon()
+    else:
+        print(f"Usage: {sys.argv[0]} start|stop", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
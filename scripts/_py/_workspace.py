@@ -0,0 +1,483 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""The workspace model of the python scripts.
+
+The root ``package.json`` (the python/typescript packages, the ignore
+patterns and the images) and the ``pyproject.toml`` of every python
+project are parsed once into immutable records. The records are kept
+in ``.cache/workspace.json`` with the mtime and size of the files they
+were read from, so later runs only need to ``stat`` these files.
+
+Attributes
+----------
+INDEX_VERSION : int
+    The version of the on-disk index format.
+
+Classes
+-------
+Project
+    A python project and the metadata of its pyproject.toml.
+ImageConfig
+    A container image configuration.
+Workspace
+    The packages, ignore patterns and images of the repository.
+
+Functions
+---------
+load_workspace(root_dir: Path) -> Workspace
+    Load the workspace of a repository (once per process).
+"""
+
+import importlib.util
+import json
+import os
+import sys
+from functools import cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# pylint: disable=ungrouped-imports,too-many-try-statements
+try:
+    from _cache import CACHE_DIR_NAME, dump_json, load_json
+    from _provision import canonicalize_name, get_requirement_name, load_toml
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from _cache import CACHE_DIR_NAME, dump_json, load_json  # type: ignore
+    from _provision import (  # type: ignore
+        canonicalize_name,
+        get_requirement_name,
+        load_toml,
+    )
+# pylint: enable=ungrouped-imports,too-many-try-statements
+
+INDEX_VERSION = 1
+INDEX_FILE_NAME = "workspace.json"
+
+
+class Project(NamedTuple):
+    """A python project and the metadata of its pyproject.toml.
+
+    Attributes
+    ----------
+    path : Path
+        The project directory.
+    name : str
+        The normalized distribution name, empty if not declared.
+    version : str
+        The declared version, empty if dynamic or not declared.
+    dependencies : Tuple[str, ...]
+        The main requirements.
+    optional_dependencies : Tuple[Tuple[str, Tuple[str, ...]], ...]
+        The requirements of each extra.
+    build_system : Tuple[Tuple[str, Any], ...]
+        The ``build-system`` table (see ``get_build_system``).
+    """
+
+    path: Path
+    name: str = ""
+    version: str = ""
+    dependencies: Tuple[str, ...] = ()
+    optional_dependencies: Tuple[Tuple[str, Tuple[str, ...]], ...] = ()
+    build_system: Tuple[Tuple[str, Any], ...] = ()
+
+    def get_requirements(self) -> Tuple[str, ...]:
+        """Get the requirements of the project and of all its extras.
+
+        Returns
+        -------
+        Tuple[str, ...]
+            The requirement strings.
+        """
+        return self.dependencies + tuple(
+            requirement
+            for _, requirements in self.optional_dependencies
+            for requirement in requirements
+        )
+
+    def get_build_system(self) -> Dict[str, Any]:
+        """Get the ``build-system`` table of the project.
+
+        Returns
+        -------
+        Dict[str, Any]
+            A copy of the table, empty if the project does not
+            declare one.
+        """
+        return {
+            key: list(value) if isinstance(value, tuple) else value
+            for key, value in self.build_system
+        }
+
+
+class ImageConfig(NamedTuple):
+    """Container image configuration."""
+
+    name: str
+    file: Path
+    platforms: Tuple[str, ...]
+
+
+class Workspace(NamedTuple):
+    """The packages, ignore patterns and images of the repository.
+
+    Attributes
+    ----------
+    root : Path
+        The repository's root directory.
+    py_projects : Tuple[Project, ...]
+        The python projects, in the ``package.json`` order.
+    ts_packages : Tuple[Path, ...]
+        The typescript package directories.
+    ignore_patterns : Tuple[str, ...]
+        The ``packages.ignorePatterns`` globs.
+    py_images : Tuple[ImageConfig, ...]
+        The python images.
+    ts_images : Tuple[ImageConfig, ...]
+        The typescript images.
+    """
+
+    root: Path
+    py_projects: Tuple[Project, ...] = ()
+    ts_packages: Tuple[Path, ...] = ()
+    ignore_patterns: Tuple[str, ...] = ()
+    py_images: Tuple[ImageConfig, ...] = ()
+    ts_images: Tuple[ImageConfig, ...] = ()
+
+    def get_project(self, path: Path) -> Optional[Project]:
+        """Get the python project of a directory.
+
+        Parameters
+        ----------
+        path : Path
+            The project directory.
+
+        Returns
+        -------
+        Optional[Project]
+            The project, None if the directory is not a python
+            project of the workspace.
+        """
+        for project in self.py_projects:
+            if project.path == path:
+                return project
+        return None
+
+    def get_owner(self, path: Path) -> Optional[Project]:
+        """Get the python project a file belongs to.
+
+        Parameters
+        ----------
+        path : Path
+            The (resolved) file or directory.
+
+        Returns
+        -------
+        Optional[Project]
+            The innermost project that contains the path, None if
+            it is not in a python project.
+        """
+        owners = [
+            project
+            for project in self.py_projects
+            if path.is_relative_to(project.path.resolve())
+        ]
+        if not owners:
+            return None
+        return max(owners, key=lambda project: len(project.path.parts))
+
+    def get_dependencies(self, path: Path) -> List[Path]:
+        """Get the workspace projects a project depends on.
+
+        A project depends on the projects its requirements (or the
+        requirements of its extras) name.
+
+        Parameters
+        ----------
+        path : Path
+            The project directory.
+
+        Returns
+        -------
+        List[Path]
+            The directories of the projects it depends on.
+        """
+        project = self.get_project(path)
+        if project is None:
+            return []
+        names = {
+            get_requirement_name(requirement)
+            for requirement in project.get_requirements()
+        }
+        return [
+            other.path
+            for other in self.py_projects
+            if other.name in names and other.path != path
+        ]
+
+    def get_upstream(self, path: Path) -> List[Path]:
+        """Get the projects a project (transitively) depends on.
+
+        Parameters
+        ----------
+        path : Path
+            The project directory.
+
+        Returns
+        -------
+        List[Path]
+            The directories of its dependencies and of their own
+            dependencies.
+        """
+        found: List[Path] = []
+        pending = [path]
+        while pending:
+            for dependency in self.get_dependencies(pending.pop()):
+                if dependency != path and dependency not in found:
+                    found.append(dependency)
+                    pending.append(dependency)
+        return found
+
+    def get_dependents(self, paths: Iterable[Path]) -> Set[Path]:
+        """Get the projects that (transitively) depend on some projects.
+
+        Parameters
+        ----------
+        paths : Iterable[Path]
+            The project directories.
+
+        Returns
+        -------
+        Set[Path]
+            The given directories and the directories of all the
+            projects downstream of them.
+        """
+        dependents: Dict[Path, List[Path]] = {
+            project.path: [] for project in self.py_projects
+        }
+        for project in self.py_projects:
+            for dependency in self.get_dependencies(project.path):
+                dependents[dependency].append(project.path)
+        found = set(paths)
+        pending = list(found)
+        while pending:
+            for dependent in dependents.get(pending.pop(), []):
+                if dependent not in found:
+                    found.add(dependent)
+                    pending.append(dependent)
+        return found
+
+
+def _freeze(value: Any) -> Any:
+    """Convert the lists of a toml/json value to tuples."""
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _read_project(path: Path) -> Project:
+    """Parse the pyproject.toml of a project."""
+    try:
+        data = load_toml(path / "pyproject.toml")
+    except ValueError as error:
+        # the script that needs the metadata reports it
+        print(f"Invalid {path / 'pyproject.toml'}: {error}", file=sys.stderr)
+        data = {}
+    metadata = data.get("project", {})
+    extras = metadata.get("optional-dependencies", {})
+    return Project(
+        path=path,
+        name=canonicalize_name(metadata.get("name", "")),
+        version=str(metadata.get("version", "")),
+        dependencies=tuple(metadata.get("dependencies", [])),
+        optional_dependencies=tuple(
+            (extra, tuple(requirements))
+            for extra, requirements in sorted(extras.items())
+        ),
+        build_system=tuple(
+            (key, _freeze(value))
+            for key, value in sorted(data.get("build-system", {}).items())
+        ),
+    )
+
+
+def _read_images(
+    root_dir: Path, images: List[Dict[str, Any]]
+) -> Tuple[ImageConfig, ...]:
+    """Get the image configurations of a ``package.json`` section."""
+    return tuple(
+        ImageConfig(
+            name=image["name"],
+            file=root_dir / image["file"],
+            platforms=tuple(image["platforms"]),
+        )
+        for image in images
+    )
+
+
+def _parse(root_dir: Path, package_json: Dict[str, Any]) -> Workspace:
+    """Build the workspace records of a parsed ``package.json``."""
+    packages = package_json.get("packages", {})
+    images = package_json.get("images", {})
+    return Workspace(
+        root=root_dir,
+        py_projects=tuple(
+            _read_project(root_dir / name) for name in packages.get("py", [])
+        ),
+        ts_packages=tuple(root_dir / name for name in packages.get("ts", [])),
+        ignore_patterns=tuple(packages.get("ignorePatterns", [])),
+        py_images=_read_images(root_dir, images.get("py", [])),
+        ts_images=_read_images(root_dir, images.get("ts", [])),
+    )
+
+
+def _get_stamp(path: Path) -> Optional[List[int]]:
+    """Get the (mtime, size) of a file, None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _get_stamps(
+    root_dir: Path, package_json: Dict[str, Any]
+) -> Dict[str, Optional[List[int]]]:
+    """Get the stamps of the pyproject.toml files of the projects."""
+    projects = package_json.get("packages", {}).get("py", [])
+    names = [f"{name.rstrip('/')}/pyproject.toml" for name in projects]
+    return {name: _get_stamp(root_dir / name) for name in names}
+
+
+def _relative(path: Path, root_dir: Path) -> str:
+    """Get a path relative to the root as posix."""
+    return path.relative_to(root_dir).as_posix()
+
+
+def _images_to_json(
+    root_dir: Path, configs: Tuple[ImageConfig, ...]
+) -> List[Dict[str, Any]]:
+    """Get the json data of image configurations."""
+    return [
+        {
+            "name": config.name,
+            "file": _relative(config.file, root_dir),
+            "platforms": list(config.platforms),
+        }
+        for config in configs
+    ]
+
+
+def _to_json(workspace: Workspace) -> Dict[str, Any]:
+    """Get the json data of the workspace records."""
+    root_dir = workspace.root
+    return {
+        "py_projects": [
+            dict(project._asdict(), path=_relative(project.path, root_dir))
+            for project in workspace.py_projects
+        ],
+        "ts_packages": [
+            _relative(path, root_dir) for path in workspace.ts_packages
+        ],
+        "ignore_patterns": list(workspace.ignore_patterns),
+        "py_images": _images_to_json(root_dir, workspace.py_images),
+        "ts_images": _images_to_json(root_dir, workspace.ts_images),
+    }
+
+
+def _from_json(root_dir: Path, data: Dict[str, Any]) -> Workspace:
+    """Get the workspace records of their json data."""
+    return Workspace(
+        root=root_dir,
+        py_projects=tuple(
+            Project(
+                **dict(
+                    {key: _freeze(value) for key, value in project.items()},
+                    path=root_dir / project["path"],
+                )
+            )
+            for project in data["py_projects"]
+        ),
+        ts_packages=tuple(root_dir / name for name in data["ts_packages"]),
+        ignore_patterns=tuple(data["ignore_patterns"]),
+        py_images=_read_images(root_dir, data["py_images"]),
+        ts_images=_read_images(root_dir, data["ts_images"]),
+    )
+
+
+def _load_index(root_dir: Path, index_path: Path) -> Optional[Workspace]:
+    """Load the on-disk index if none of its inputs changed."""
+    index = load_json(index_path, {})
+    inputs = index.get("inputs")
+    if index.get("version") != INDEX_VERSION or not inputs:
+        return None
+    for name, stamp in inputs.items():
+        if _get_stamp(root_dir / name) != stamp:
+            return None
+    try:
+        return _from_json(root_dir, index["workspace"])
+    except (KeyError, TypeError):
+        return None
+
+
+def _store_index(
+    index_path: Path,
+    inputs: Dict[str, Optional[List[int]]],
+    workspace: Workspace,
+) -> None:
+    """Write the on-disk index of the workspace."""
+    if not any(
+        importlib.util.find_spec(module) for module in ("tomllib", "toml")
+    ):
+        # the pyproject.toml files could not be parsed
+        return
+    try:
+        dump_json(
+            index_path,
+            {
+                "version": INDEX_VERSION,
+                "inputs": inputs,
+                "workspace": _to_json(workspace),
+            },
+        )
+    except OSError:
+        pass
+
+
+@cache
+def load_workspace(root_dir: Path) -> Workspace:
+    """Load the workspace of a repository (once per process).
+
+    Parameters
+    ----------
+    root_dir : Path
+        The repository's root directory.
+
+    Returns
+    -------
+    Workspace
+        The workspace records, from the on-disk index if ``package.json``
+        and the projects' pyproject.toml files did not change.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the package.json or if a python project directory does
+        not exist.
+    """
+    package_json_path = root_dir / "package.json"
+    if not package_json_path.exists():
+        raise FileNotFoundError(f"{package_json_path} does not exist.")
+    index_path = root_dir / CACHE_DIR_NAME / INDEX_FILE_NAME
+    workspace = _load_index(root_dir, index_path)
+    if workspace is None:
+        # stamped before reading, a concurrent edit invalidates the index
+        inputs = {"package.json": _get_stamp(package_json_path)}
+        with open(package_json_path, "r", encoding="utf-8") as file:
+            package_json = json.load(file)
+        inputs.update(_get_stamps(root_dir, package_json))
+        workspace = _parse(root_dir, package_json)
+        _store_index(index_path, inputs, workspace)
+    for project in workspace.py_projects:
+        if not project.path.exists():
+            raise FileNotFoundError(f"{project.path} does not exist.")
+    return workspace
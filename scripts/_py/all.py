@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""Run the whole python pipeline as a task graph.
+
+Each (stage, project) pair is a task. Tasks of different projects
+run concurrently (``--jobs N``, default: number of cores), the order
+is only kept where it matters:
+
+- requirements before everything else,
+- format before the other stages of the same project,
+- a project after the workspace projects it requires (build).
+
+With ``--affected <ref>`` only the projects changed since the merge
+base of the ref, and the projects that depend on them, are included.
+"""
+
+import sys
+from importlib import import_module
+from pathlib import Path
+from typing import List, Sequence
+
+HAD_TO_MODIFY_SYS_PATH = False
+
+# pylint: disable=ungrouped-imports,too-many-try-statements
+try:
+    from _lib import (
+        ROOT_DIR,
+        get_affected_projects,
+        get_jobs,
+        get_python_projects,
+        run_command,
+    )
+    from _tasks import Task, get_task_name, run_tasks
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from _lib import (  # type: ignore
+        ROOT_DIR,
+        get_affected_projects,
+        get_jobs,
+        get_python_projects,
+        run_command,
+    )
+    from _tasks import Task, get_task_name, run_tasks  # type: ignore
+
+    HAD_TO_MODIFY_SYS_PATH = True
+# pylint: enable=ungrouped-imports,too-many-try-statements
+
+REQUIREMENTS_TASK = get_task_name("requirements", ROOT_DIR)
+# the modules (in this directory) of the stages after requirements
+STAGES = ["format", "lint", "test", "docs", "build"]
+
+
+def install_requirements() -> None:
+    """Generate and install the requirements of all the projects."""
+    requirements_script = Path(__file__).parent / "requirements.py"
+    run_command([sys.executable, str(requirements_script), "--install"])
+
+
+def get_stage_tasks(stage: str, projects: Sequence[Path]) -> List[Task]:
+    """Get the tasks of a stage.
+
+    Parameters
+    ----------
+    stage : str
+        The stage, the name of a script in this directory.
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[Task]
+        The tasks of the stage.
+    """
+    module = import_module(stage)
+    tasks: List[Task] = module.get_tasks(projects)
+    return tasks
+
+
+def get_tasks(projects: Sequence[Path]) -> List[Task]:
+    """Get the tasks of the whole pipeline.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[Task]
+        The tasks with their dependencies.
+    """
+    tasks = [Task(REQUIREMENTS_TASK, install_requirements)]
+    format_tasks = {}
+    for stage in STAGES:
+        for task in get_stage_tasks(stage, projects):
+            # shards of a project's tests are named <stage>:<project>#<n>
+            project = task.name.split(":", 1)[1].split("#", 1)[0]
+            deps = [REQUIREMENTS_TASK]
+            if stage == "format":
+                format_tasks[project] = task.name
+            elif project in format_tasks:
+                # not the workspace wide ones (e.g. merging the coverage)
+                deps.append(format_tasks[project])
+            tasks.append(task._replace(deps=tuple(deps) + task.deps))
+    return tasks
+
+
+def main() -> None:
+    """Run the python pipeline."""
+    projects = get_affected_projects(get_python_projects())
+    run_tasks(get_tasks(projects), jobs=get_jobs())
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        if HAD_TO_MODIFY_SYS_PATH:
+            sys.path.pop(0)
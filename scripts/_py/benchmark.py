@@ -0,0 +1,564 @@
+# SPDX-License-Identifier: Apache-2.0.
+# Copyright (c) 2024 - 2025 Harmony and contributors.
+"""Benchmark the python scripts on a synthetic workspace.
+
+A workspace shaped like ours (a ``package.json`` with ``packages.py``,
+projects with a ``pyproject.toml`` and ``scripts/*.py`` stubs, source
+files, cache debris and a ``node_modules`` tree) is generated in a
+temporary directory, together with a copy of ``scripts/_py`` and stub
+lint tools (no network and no real linting). Each scenario is then
+run a few times and the median, mean and standard deviation of its
+wall time are reported::
+
+    python scripts/_py/benchmark.py --projects 8 --files 100 --repeat 7
+    python scripts/_py/benchmark.py --rev main --rev WORKTREE
+
+Each ``--rev`` (a git ref, or ``WORKTREE`` for the current files) gets
+its own identical workspace, the first one is the baseline the others
+are compared to. Other options:
+
+- ``--scenario <name>`` (repeatable) to only run some scenarios,
+- ``--debris N`` cache files per project, ``--node-modules N`` npm
+  packages in the root ``node_modules``,
+- ``--warmup N`` untimed runs, ``--tool-delay S`` seconds each stub
+  tool sleeps,
+- ``--json <path>`` to save all the samples, ``--keep`` to keep the
+  workspaces.
+"""
+
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess  # nosemgrep # nosec
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+HAD_TO_MODIFY_SYS_PATH = False
+
+try:
+    from _lib import ROOT_DIR, get_arg_value
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from _lib import ROOT_DIR, get_arg_value  # type: ignore
+
+    HAD_TO_MODIFY_SYS_PATH = True
+
+WORKTREE = "WORKTREE"
+# the projects our scripts know by path, then synthetic extra ones
+KNOWN_PROJECTS = [
+    "packages/core/python",
+    "packages/jupyter",
+    "packages/studio",
+    "package_templates/python_only",
+    "package_templates/both",
+]
+PROJECT_SCRIPTS = ["lint", "format", "test", "build", "clean", "docs"]
+STUB_TOOLS = [
+    "autoflake",
+    "bandit",
+    "black",
+    "flake8",
+    "isort",
+    "pydocstyle",
+    "pylint",
+    "ruff",
+    "yamllint",
+]
+STUBS_DIR_NAME = ".bench_stubs"
+TOOL_DELAY_ENV = "HARMONY_BENCH_TOOL_DELAY"
+# cache directories (and files in them) left behind by the tools
+DEBRIS = [
+    "src/{package}/__pycache__/module_{index}.cpython-311.pyc",
+    ".mypy_cache/3.11/{package}/module_{index}.data.json",
+    ".ruff_cache/0.8.4/{index}",
+    ".pytest_cache/v/cache/nodeids_{index}",
+    "build/lib/{package}/module_{index}.py",
+    "htmlcov/module_{index}_py.html",
+    "src/{package}/module_{index}.py~",
+    ".coverage.host.{index}",
+]
+TOOL_STUB = f'''"""Benchmark stub of a tool."""
+import os
+import time
+
+time.sleep(float(os.environ.get("{TOOL_DELAY_ENV}", "0")))
+'''
+MYPY_API_STUB = f'''"""Benchmark stub of mypy's api."""
+import os
+import time
+
+
+def run(args):
+    """Pretend to type check."""
+    time.sleep(float(os.environ.get("{TOOL_DELAY_ENV}", "0")))
+    return "", "", 0
+'''
+SCRIPT_STUB = '''"""Benchmark stub of a project script."""
+import sys
+
+sys.exit(0)
+'''
+MODULE_TEMPLATE = '''"""Module {index} of {package}."""
+
+from typing import List
+
+
+def function_{index}(values: List[int]) -> int:
+    """Add the values.
+
+    Parameters
+    ----------
+    values : List[int]
+        The values.
+
+    Returns
+    -------
+    int
+        The sum.
+    """
+    total = 0
+    for value in values:
+        total += value * {index}
+    return total
+
+
+class Class{index}:
+    """A class."""
+
+    def method(self) -> str:
+        """Get a name.
+
+        Returns
+        -------
+        str
+            The name.
+        """
+        return "{package}.{index}"
+'''
+ROOT_PYPROJECT = """[project]
+name = "bench_root"
+version = "0.0.1"
+dependencies = ["pip==24.3.1"]
+"""
+PROJECTS_SNIPPET = """
+import sys, time
+sys.path.insert(0, "scripts/_py")
+from _lib import get_python_projects
+start = time.perf_counter()
+list(get_python_projects())
+print(time.perf_counter() - start)
+"""
+
+
+class Scenario(NamedTuple):
+    """A command to time in a workspace.
+
+    Attributes
+    ----------
+    name : str
+        The scenario name.
+    args : List[str]
+        The python arguments (relative to the workspace).
+    setup : Optional[Callable[[Path], None]]
+        Called (untimed) with the workspace before each run.
+    self_timed : bool
+        The command prints its own duration (seconds) on its last line.
+    """
+
+    name: str
+    args: List[str]
+    setup: Optional[Callable[[Path], None]] = None
+    self_timed: bool = False
+
+
+def _get_arg_values(name: str) -> List[str]:
+    """Get all the values of a repeatable command line option."""
+    return [
+        sys.argv[index + 1]
+        for index, arg in enumerate(sys.argv[:-1])
+        if arg == name
+    ]
+
+
+def _get_int_arg(name: str, default: int) -> int:
+    """Get the integer value of a command line option."""
+    return int(get_arg_value(name, str(default)) or default)
+
+
+def _write(path: Path, content: str) -> None:
+    """Write a file, creating its parent directories."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+
+
+def get_project_paths(count: int) -> List[str]:
+    """Get the (relative) paths of the synthetic projects.
+
+    Parameters
+    ----------
+    count : int
+        The number of projects.
+
+    Returns
+    -------
+    List[str]
+        The known project paths, then ``packages/extra_<n>`` ones.
+    """
+    extra = [f"packages/extra_{index}" for index in range(count)]
+    return (KNOWN_PROJECTS + extra)[:count]
+
+
+def write_project(project_dir: Path, files: int) -> None:
+    """Write a synthetic project.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+    files : int
+        The number of python modules.
+    """
+    package = project_dir.name
+    dependencies = [f'"dependency_{index}>=1.{index}"' for index in range(8)]
+    _write(
+        project_dir / "pyproject.toml",
+        f'[project]\nname = "{package}"\nversion = "0.0.1"\n'
+        f"dependencies = [{', '.join(dependencies)}]\n\n"
+        "[project.optional-dependencies]\n"
+        'dev = ["black==24.10.0", "mypy==1.14.1", "pylint==3.3.3"]\n'
+        'test = ["pytest==8.3.4", "pytest-cov==6.0.0"]\n',
+    )
+    for name in PROJECT_SCRIPTS:
+        _write(project_dir / "scripts" / f"{name}.py", SCRIPT_STUB)
+    _write(project_dir / "src" / package / "__init__.py", "")
+    for index in range(files):
+        _write(
+            project_dir / "src" / package / f"module_{index}.py",
+            MODULE_TEMPLATE.format(index=index, package=package),
+        )
+
+
+def write_debris(project_dir: Path, count: int) -> None:
+    """(Re)create the cache directories and files of a project.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+    count : int
+        The number of files per cache directory.
+    """
+    for index in range(count):
+        for pattern in DEBRIS:
+            relative = pattern.format(package=project_dir.name, index=index)
+            _write(project_dir / relative, "debris\n")
+
+
+def write_node_modules(root_dir: Path, count: int) -> None:
+    """Write a ``node_modules`` tree (with python-like debris in it).
+
+    Parameters
+    ----------
+    root_dir : Path
+        The workspace root.
+    count : int
+        The number of npm packages.
+    """
+    for index in range(count):
+        package_dir = root_dir / "node_modules" / f"package_{index}"
+        _write(package_dir / "package.json", '{"name": "package"}\n')
+        for name in ("index.js", "index.d.ts", "README.md", "cache~"):
+            _write(package_dir / "lib" / name, "// file\n")
+        _write(package_dir / "build" / "__pycache__" / "gyp.pyc", "")
+
+
+def write_stubs(stubs_dir: Path) -> None:
+    """Write stub modules (and their metadata) of the lint tools.
+
+    Parameters
+    ----------
+    stubs_dir : Path
+        The directory to put first on ``PYTHONPATH``.
+    """
+    for tool in STUB_TOOLS:
+        _write(stubs_dir / f"{tool}.py", TOOL_STUB)
+    _write(stubs_dir / "mypy" / "__init__.py", "")
+    _write(stubs_dir / "mypy" / "__main__.py", TOOL_STUB)
+    _write(stubs_dir / "mypy" / "api.py", MYPY_API_STUB)
+    for tool in STUB_TOOLS + ["mypy"]:
+        _write(
+            stubs_dir / f"{tool}-0.0.0.dist-info" / "METADATA",
+            f"Metadata-Version: 2.1\nName: {tool}\nVersion: 0.0.0\n",
+        )
+
+
+def copy_scripts(rev: str, root_dir: Path) -> None:
+    """Copy ``scripts/_py`` of a revision into a workspace.
+
+    Parameters
+    ----------
+    rev : str
+        A git ref, or ``WORKTREE`` for the current files.
+    root_dir : Path
+        The workspace root.
+    """
+    target = root_dir / "scripts" / "_py"
+    if rev == WORKTREE:
+        shutil.copytree(
+            ROOT_DIR / "scripts" / "_py",
+            target,
+            ignore=shutil.ignore_patterns("__pycache__"),
+        )
+        return
+    archive = subprocess.run(  # nosemgrep # nosec
+        ["git", "archive", "--format=tar", rev, "scripts/_py"],
+        cwd=ROOT_DIR,
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        for member in tar.getmembers():
+            source = tar.extractfile(member) if member.isfile() else None
+            if source is None or not member.name.startswith("scripts/_py/"):
+                continue
+            path = root_dir / member.name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(source.read())
+
+
+def create_workspace(rev: str, root_dir: Path) -> None:
+    """Generate a synthetic workspace.
+
+    The sizes come from ``--projects``, ``--files``, ``--debris``
+    and ``--node-modules``.
+
+    Parameters
+    ----------
+    rev : str
+        The revision of ``scripts/_py`` to use.
+    root_dir : Path
+        The (empty) workspace root.
+    """
+    projects = get_project_paths(_get_int_arg("--projects", 5))
+    package_json = {"private": True, "packages": {"py": projects, "ts": []}}
+    _write(root_dir / "package.json", json.dumps(package_json, indent=4))
+    _write(root_dir / "pyproject.toml", ROOT_PYPROJECT)
+    _write(root_dir / ".flake8", "[flake8]\nmax-line-length = 80\n")
+    _write(root_dir / ".yamllint.yaml", "extends: default\n")
+    copy_scripts(rev, root_dir)
+    write_stubs(root_dir / STUBS_DIR_NAME)
+    write_node_modules(root_dir, _get_int_arg("--node-modules", 200))
+    for project in projects:
+        write_project(root_dir / project, _get_int_arg("--files", 50))
+    reset_debris(root_dir)
+
+
+def reset_debris(root_dir: Path) -> None:
+    """Recreate the cache debris of the root and every project.
+
+    Parameters
+    ----------
+    root_dir : Path
+        The workspace root.
+    """
+    count = _get_int_arg("--debris", 20)
+    write_debris(root_dir, count)
+    for project in get_project_paths(_get_int_arg("--projects", 5)):
+        write_debris(root_dir / project, count)
+
+
+def remove_lint_caches(root_dir: Path) -> None:
+    """Remove the lint caches, so the next lint run is a cold one.
+
+    Parameters
+    ----------
+    root_dir : Path
+        The workspace root.
+    """
+    projects = get_project_paths(_get_int_arg("--projects", 5))
+    for directory in [root_dir] + [root_dir / path for path in projects]:
+        shutil.rmtree(directory / ".cache", ignore_errors=True)
+
+
+SCENARIOS = [
+    Scenario("projects", ["-c", PROJECTS_SNIPPET], self_timed=True),
+    Scenario("requirements", ["scripts/_py/requirements.py"]),
+    Scenario("format", ["scripts/_py/format.py"], remove_lint_caches),
+    Scenario("lint", ["scripts/_py/lint.py"], remove_lint_caches),
+    Scenario("lint-warm", ["scripts/_py/lint.py"]),
+    Scenario("clean", ["scripts/_py/clean.py"], reset_debris),
+]
+
+
+def get_env(root_dir: Path) -> Dict[str, str]:
+    """Get the environment to run the scenarios with.
+
+    Parameters
+    ----------
+    root_dir : Path
+        The workspace root.
+
+    Returns
+    -------
+    Dict[str, str]
+        The environment, with the stub tools first on the path.
+    """
+    env = dict(os.environ)
+    python_path = [str(root_dir / STUBS_DIR_NAME), env.get("PYTHONPATH", "")]
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, python_path))
+    env[TOOL_DELAY_ENV] = get_arg_value("--tool-delay", "0") or "0"
+    # do not talk to a lint worker daemon of the real checkout
+    env.pop("HARMONY_LINT_WORKER", None)
+    return env
+
+
+def run_scenario(scenario: Scenario, root_dir: Path) -> float:
+    """Run a scenario once.
+
+    Parameters
+    ----------
+    scenario : Scenario
+        The scenario.
+    root_dir : Path
+        The workspace root.
+
+    Returns
+    -------
+    float
+        The duration in seconds.
+
+    Raises
+    ------
+    RuntimeError
+        If the command fails.
+    """
+    if scenario.setup is not None:
+        scenario.setup(root_dir)
+    start = time.perf_counter()
+    result = subprocess.run(  # nosemgrep # nosec
+        [sys.executable] + scenario.args,
+        cwd=root_dir,
+        env=get_env(root_dir),
+        check=False,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        encoding="utf-8",
+    )
+    duration = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"{scenario.name} failed ({result.returncode}):\n"
+            f"{result.stdout[-2000:]}"
+        )
+    if scenario.self_timed:
+        return float(result.stdout.strip().splitlines()[-1])
+    return duration
+
+
+def benchmark(rev: str, scenarios: List[Scenario]) -> Dict[str, List[float]]:
+    """Time the scenarios on a fresh workspace for a revision.
+
+    Parameters
+    ----------
+    rev : str
+        The revision of ``scripts/_py``.
+    scenarios : List[Scenario]
+        The scenarios to run.
+
+    Returns
+    -------
+    Dict[str, List[float]]
+        The durations (seconds) by scenario name.
+    """
+    root_dir = Path(tempfile.mkdtemp(prefix="harmony-bench-"))
+    print(f"Benchmarking {rev} in {root_dir}", flush=True)
+    try:
+        create_workspace(rev, root_dir)
+        return _time_scenarios(scenarios, root_dir)
+    finally:
+        if "--keep" not in sys.argv:
+            shutil.rmtree(root_dir, ignore_errors=True)
+
+
+def _time_scenarios(
+    scenarios: List[Scenario], root_dir: Path
+) -> Dict[str, List[float]]:
+    """Run the warmup and the timed runs of each scenario."""
+    warmup = _get_int_arg("--warmup", 1)
+    repeat = _get_int_arg("--repeat", 5)
+    samples: Dict[str, List[float]] = {}
+    for scenario in scenarios:
+        for _ in range(warmup):
+            run_scenario(scenario, root_dir)
+        samples[scenario.name] = [
+            run_scenario(scenario, root_dir) for _ in range(repeat)
+        ]
+        print(f"  {scenario.name}: done", flush=True)
+    return samples
+
+
+def format_results(results: Dict[str, Dict[str, List[float]]]) -> str:
+    """Format the results as a table.
+
+    Parameters
+    ----------
+    results : Dict[str, Dict[str, List[float]]]
+        The samples by scenario name by revision (the first
+        revision is the baseline).
+
+    Returns
+    -------
+    str
+        The table.
+    """
+    header = (
+        f"{'scenario':<14}{'rev':<16}{'median(s)':>11}{'mean(s)':>10}"
+        f"{'stdev(s)':>10}{'min(s)':>9}{'max(s)':>9}{'vs base':>9}"
+    )
+    lines = [header, "-" * len(header)]
+    base = next(iter(results.values()))
+    for name, base_samples in base.items():
+        base_median = statistics.median(base_samples)
+        for rev, by_name in results.items():
+            samples = by_name[name]
+            median = statistics.median(samples)
+            stdev = statistics.stdev(samples) if len(samples) > 1 else 0.0
+            ratio = median / base_median if base_median else 0.0
+            lines.append(
+                f"{name:<14}{rev[:15]:<16}{median:>11.4f}"
+                f"{statistics.mean(samples):>10.4f}{stdev:>10.4f}"
+                f"{min(samples):>9.4f}{max(samples):>9.4f}{ratio:>8.2f}x"
+            )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    revs = _get_arg_values("--rev") or [WORKTREE]
+    selected = _get_arg_values("--scenario")
+    scenarios = [
+        scenario
+        for scenario in SCENARIOS
+        if not selected or scenario.name in selected
+    ]
+    results = {rev: benchmark(rev, scenarios) for rev in revs}
+    print(f"\n{format_results(results)}\n")
+    json_path = get_arg_value("--json")
+    if json_path:
+        with open(json_path, "w", encoding="utf-8", newline="\n") as file:
+            json.dump(results, file, indent=1)
+        print(f"Samples written to {json_path}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        if HAD_TO_MODIFY_SYS_PATH:
+            sys.path.pop(0)
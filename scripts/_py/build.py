@@ -1,19 +1,420 @@
 # SPDX-License-Identifier: Apache-2.0.
 # Copyright (c) 2024 - 2025 Harmony and contributors.
-"""Build python packages."""
+"""Build python packages.
 
+The builds are cached (``.cache/build/<project>/<key>``), by a hash
+of the project's files (the ones git tracks or does not ignore), its
+build system requirements and their installed versions. On a hit the
+previous artifacts are restored in ``dist/<project>`` and the build
+is skipped. Use ``--no-cache`` to always build. The projects built by
+their own build script (whose environment is not known) are only
+cached if all their build requirements are pinned (``==``). Before a
+cached build, ``dist/<project>`` is emptied so that only its artifacts
+are stored.
+
+The builds get a fixed ``SOURCE_DATE_EPOCH`` (unless already set),
+so that identical inputs give identical artifacts.
+
+The projects are built concurrently (``--jobs N``, a project after
+the workspace projects it requires), by their own ``scripts/build.py``.
+With ``--shared-env`` (and for the projects without a build script)
+they are built by their PEP 517 backend directly, in a single build
+environment (``.cache/build-env``) shared by all of them instead of
+an isolated one per build. It is provisioned once, with the build
+requirements of all the projects (pinned as in the root pyproject.toml
+``dev`` extra), and only recreated when they change. The requirements
+the backends ask for (``get_requires_for_build_*``) are installed in
+it too, they are recorded by the hash of the projects' build
+configuration.
+With ``--affected <ref>`` only the projects changed since the merge
+base of the ref, and the projects that depend on them, are built.
+"""
+
+import os
+import shutil
+import subprocess  # nosemgrep # nosec
 import sys
+from functools import partial
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 HAD_TO_MODIFY_SYS_PATH = False
 
+# pylint: disable=ungrouped-imports,too-many-try-statements
 try:
-    from _lib import ROOT_DIR, get_python_projects, run_command
+    from _cache import BuildCache, dump_json, hash_bytes, hash_files, load_json
+    from _git import git
+    from _lib import (
+        ROOT_DIR,
+        find_files,
+        get_affected_projects,
+        get_jobs,
+        get_project_dependencies,
+        get_python_projects,
+        get_workspace,
+        run_command,
+    )
+    from _provision import (
+        get_install_command,
+        get_installed_versions,
+        get_pinned_requirements,
+        get_requirement_name,
+        load_toml,
+    )
+    from _tasks import Task, emit, get_task_name, run_tasks
 except ImportError:
     sys.path.insert(0, str(Path(__file__).parent))
-    from _lib import ROOT_DIR, get_python_projects, run_command  # type: ignore
+    from _cache import (  # type: ignore
+        BuildCache,
+        dump_json,
+        hash_bytes,
+        hash_files,
+        load_json,
+    )
+    from _git import git  # type: ignore
+    from _lib import (  # type: ignore
+        ROOT_DIR,
+        find_files,
+        get_affected_projects,
+        get_jobs,
+        get_project_dependencies,
+        get_python_projects,
+        get_workspace,
+        run_command,
+    )
+    from _provision import (  # type: ignore
+        get_install_command,
+        get_installed_versions,
+        get_pinned_requirements,
+        get_requirement_name,
+        load_toml,
+    )
+    from _tasks import Task, emit, get_task_name, run_tasks  # type: ignore
 
     HAD_TO_MODIFY_SYS_PATH = True
+# pylint: enable=ungrouped-imports,too-many-try-statements
+
+BUILD_CACHE_DIR = ROOT_DIR / ".cache" / "build"
+BUILD_ENV_DIR = ROOT_DIR / ".cache" / "build-env"
+BUILD_ENV_TASK = get_task_name("build-env", ROOT_DIR)
+PEP517_SCRIPT = Path(__file__).parent / "_pep517.py"
+# the dynamic requirements of the backends, by project
+REQUIRES_DIR = BUILD_ENV_DIR / "requires"
+# they may depend on these (e.g. hatch build hooks)
+BUILD_CONFIG_FILES = ("pyproject.toml", "hatch.toml", "setup.cfg", "setup.py")
+# 1980-01-01, the earliest timestamp a zip (wheel) can store
+DEFAULT_SOURCE_DATE_EPOCH = "315532800"
+
+
+def get_source_files(project_dir: Path) -> List[Path]:
+    """Get the files of a project that can end up in its artifacts.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+
+    Returns
+    -------
+    List[Path]
+        The files git tracks or does not ignore (all the files but
+        the usual caches and outputs if git is not available).
+    """
+    try:
+        output = git(
+            ["ls-files", "--cached", "--others", "--exclude-standard", "-z"],
+            cwd=project_dir,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return find_files(project_dir, ("",))
+    names = sorted({name for name in output.split("\0") if name})
+    return [
+        project_dir / name for name in names if (project_dir / name).is_file()
+    ]
+
+
+def get_build_system(project_dir: Path) -> Dict[str, Any]:
+    """Get the ``build-system`` table of a project.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The table, empty if the project does not declare one.
+    """
+    project = get_workspace().get_project(project_dir)
+    if project is not None:
+        return project.get_build_system()
+    build_system: Dict[str, Any] = load_toml(
+        project_dir / "pyproject.toml"
+    ).get("build-system", {})
+    return build_system
+
+
+def uses_shared_env(project_dir: Path) -> bool:
+    """Check if a project is built by its backend in the shared env.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+
+    Returns
+    -------
+    bool
+        True with ``--shared-env`` or without a ``scripts/build.py``
+        (if the project declares a build backend).
+    """
+    if not get_build_system(project_dir).get("build-backend"):
+        return False
+    build_py_script = project_dir / "scripts" / "build.py"
+    return "--shared-env" in sys.argv or not build_py_script.exists()
+
+
+def _get_requires_file(project_dir: Path) -> Path:
+    """Get the record of the dynamic build requirements of a project."""
+    return REQUIRES_DIR / f"{project_dir.name}.json"
+
+
+def get_dynamic_requirements(project_dir: Path) -> List[str]:
+    """Get the requirements a project's backend asks for to build it.
+
+    The backend's hooks are only called again (in the shared build
+    environment) when the project's build configuration changed.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+
+    Returns
+    -------
+    List[str]
+        The requirements of its ``get_requires_for_build_sdist`` and
+        ``get_requires_for_build_wheel`` hooks.
+    """
+    config_files = [
+        project_dir / name
+        for name in BUILD_CONFIG_FILES
+        if (project_dir / name).is_file()
+    ]
+    key = hash_files(config_files, project_dir)
+    requires_file = _get_requires_file(project_dir)
+    recorded: Dict[str, Any] = load_json(requires_file, {})
+    if recorded.get("key") == key:
+        return list(recorded.get("requires", []))
+    build_system = get_build_system(project_dir)
+    hooks_output = requires_file.with_suffix(".hooks.json")
+    hooks_output.parent.mkdir(parents=True, exist_ok=True)
+    run_command(
+        [
+            str(get_env_python(BUILD_ENV_DIR)),
+            str(PEP517_SCRIPT),
+            "--requires",
+            str(build_system.get("build-backend")),
+            str(hooks_output),
+        ]
+        + [str(path) for path in build_system.get("backend-path", [])],
+        cwd=project_dir,
+    )
+    requires: List[str] = load_json(hooks_output, [])
+    hooks_output.unlink(missing_ok=True)
+    dump_json(requires_file, {"key": key, "requires": requires})
+    return requires
+
+
+def _is_pinned(requirement: str) -> bool:
+    """Check if a requirement is pinned to a single version."""
+    specifier = requirement.split(";", 1)[0]
+    return "==" in specifier and "," not in specifier and "*" not in specifier
+
+
+def is_build_cacheable(project_dir: Path) -> bool:
+    """Check if the inputs of a project's build are known.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+
+    Returns
+    -------
+    bool
+        True if it is built in the shared environment (whose versions
+        are known) or if all its build requirements are pinned.
+    """
+    if uses_shared_env(project_dir):
+        return True
+    requirements = get_build_system(project_dir).get("requires", [])
+    return all(_is_pinned(str(requirement)) for requirement in requirements)
+
+
+def get_build_key(
+    project_dir: Path, source_date_epoch: str, installed: Dict[str, str]
+) -> str:
+    """Get the hash of the inputs of a project's build.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+    source_date_epoch : str
+        The timestamp of the artifacts' files.
+    installed : Dict[str, str]
+        The versions installed in the shared build environment
+        (empty for a build with pinned requirements).
+
+    Returns
+    -------
+    str
+        The hex digest of the project's files (including its
+        pyproject.toml and build script) and of the build backend.
+    """
+    build_system = get_build_system(project_dir)
+    # with the dynamic ones, if it was built in the shared env
+    requirements = list(build_system.get("requires", [])) + load_json(
+        _get_requires_file(project_dir), {}
+    ).get("requires", [])
+    backend = [
+        f"{requirement}={installed.get(get_requirement_name(requirement))}"
+        for requirement in requirements
+    ]
+    return hash_bytes(
+        hash_files(get_source_files(project_dir), project_dir),
+        str(build_system.get("build-backend", "")),
+        *sorted(backend),
+        source_date_epoch,
+    )
+
+
+def get_env_requirements(projects: Sequence[Path]) -> List[str]:
+    """Get the requirements of the shared build environment.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[str]
+        The build requirements of all the projects (and hatchling),
+        pinned as in the root ``dev`` extra where it pins them.
+    """
+    pinned = get_pinned_requirements()
+    requirements = {pinned.get("hatchling", "hatchling")}
+    for project in projects:
+        for requirement in get_build_system(project).get("requires", []):
+            requirements.add(
+                pinned.get(get_requirement_name(requirement), requirement)
+            )
+    return sorted(requirements)
+
+
+def get_env_python(env_dir: Path) -> Path:
+    """Get the interpreter of a virtual environment.
+
+    Parameters
+    ----------
+    env_dir : Path
+        The environment directory.
+
+    Returns
+    -------
+    Path
+        Its python executable.
+    """
+    if sys.platform == "win32":
+        return env_dir / "Scripts" / "python.exe"
+    return env_dir / "bin" / "python"
+
+
+def get_env_versions(env_dir: Path) -> Dict[str, str]:
+    """Get the distributions installed in a virtual environment.
+
+    Parameters
+    ----------
+    env_dir : Path
+        The environment directory.
+
+    Returns
+    -------
+    Dict[str, str]
+        The installed versions by normalized name.
+    """
+    site_packages = list(env_dir.glob("lib/python*/site-packages")) + list(
+        env_dir.glob("Lib/site-packages")
+    )
+    if not site_packages:
+        return {}
+    return get_installed_versions([str(path) for path in site_packages])
+
+
+def provision_build_env(projects: Sequence[Path]) -> None:
+    """Create the shared build environment (if needed).
+
+    The requirements the projects' backends ask for are then
+    installed in it (if missing).
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+    """
+    requirements = get_env_requirements(projects)
+    manifest = BUILD_ENV_DIR / "requirements.json"
+    python = get_env_python(BUILD_ENV_DIR)
+    if python.exists() and load_json(manifest, None) == requirements:
+        emit(f"Build environment up to date in {BUILD_ENV_DIR} ...")
+    else:
+        emit(f"Provisioning the build environment in {BUILD_ENV_DIR} ...")
+        shutil.rmtree(BUILD_ENV_DIR, ignore_errors=True)
+        run_command([sys.executable, "-m", "venv", str(BUILD_ENV_DIR)])
+        run_command(get_install_command(requirements, python=str(python)))
+        dump_json(manifest, requirements)
+    pinned = get_pinned_requirements()
+    installed = get_env_versions(BUILD_ENV_DIR)
+    missing = sorted(
+        {
+            pinned.get(get_requirement_name(requirement), requirement)
+            for project in projects
+            for requirement in get_dynamic_requirements(project)
+            if get_requirement_name(requirement) not in installed
+        }
+    )
+    if missing:
+        emit(f"Installing the backends' requirements: {', '.join(missing)}")
+        run_command(get_install_command(missing, python=str(python)))
+
+
+def _run_build(
+    package_dir: Path, output_dir: Path, env: Dict[str, str]
+) -> None:
+    """Build a package in the shared or in an isolated environment."""
+    if not uses_shared_env(package_dir):
+        build_py_script = package_dir / "scripts" / "build.py"
+        run_command(
+            [sys.executable, str(build_py_script), "--output", str(output_dir)],
+            cwd=package_dir,
+            env=env,
+        )
+        return
+    build_system = get_build_system(package_dir)
+    run_command(
+        [
+            str(get_env_python(BUILD_ENV_DIR)),
+            str(PEP517_SCRIPT),
+            str(build_system.get("build-backend")),
+            str(output_dir),
+        ]
+        + [str(path) for path in build_system.get("backend-path", [])],
+        cwd=package_dir,
+        env=env,
+    )
 
 
 def build_package(package_dir: Path) -> None:
@@ -24,23 +425,74 @@ def build_package(package_dir: Path) -> None:
     package_dir : Path
         The package directory.
     """
-    docs_py_script = package_dir / "scripts" / "build.py"
-    if not docs_py_script.exists():
-        print(f"Build script not found in {package_dir}, skipping ...")
+    shared_env = uses_shared_env(package_dir)
+    build_py_script = package_dir / "scripts" / "build.py"
+    if not shared_env and not build_py_script.exists():
+        emit(f"Build script not found in {package_dir}, skipping ...")
         return
     # base_url = {this.repo_url}/{package_dir.name}
-    print(f"Building python package in {package_dir} ...")
     output_dir = ROOT_DIR / "dist" / package_dir.name
-    run_command(
-        [sys.executable, str(docs_py_script), "--output", str(output_dir)],
-        cwd=package_dir,
-    )
+    env: Dict[str, str] = dict(os.environ)
+    env.setdefault("SOURCE_DATE_EPOCH", DEFAULT_SOURCE_DATE_EPOCH)
+    cache: Optional[BuildCache] = None
+    if "--no-cache" not in sys.argv and is_build_cacheable(package_dir):
+        installed = get_env_versions(BUILD_ENV_DIR) if shared_env else {}
+        key = get_build_key(package_dir, env["SOURCE_DATE_EPOCH"], installed)
+        cache = BuildCache(BUILD_CACHE_DIR / package_dir.name, key)
+        if cache.restore(output_dir):
+            emit(f"Restored the cached build of {package_dir} ...")
+            return
+    emit(f"Building python package in {package_dir} ...")
+    if cache is not None:
+        # only this build's artifacts (to cache)
+        shutil.rmtree(output_dir, ignore_errors=True)
+    _run_build(package_dir, output_dir, env)
+    if cache is not None and output_dir.is_dir():
+        for name, digest in cache.store(output_dir).items():
+            emit(f"{name}: sha256 {digest}")
+
+
+def get_tasks(projects: Sequence[Path]) -> List[Task]:
+    """Get the build tasks for the given projects.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[Task]
+        One task per project, the core package is built before
+        the projects that depend on it, the ones built in the
+        shared build environment after it is provisioned.
+    """
+    tasks = []
+    shared = [project for project in projects if uses_shared_env(project)]
+    if shared:
+        tasks.append(Task(BUILD_ENV_TASK, partial(provision_build_env, shared)))
+    for project in projects:
+        deps: Tuple[str, ...] = tuple(
+            get_task_name("build", dependency)
+            for dependency in get_project_dependencies(project)
+            if dependency in projects
+        )
+        if project in shared:
+            deps += (BUILD_ENV_TASK,)
+        tasks.append(
+            Task(
+                get_task_name("build", project),
+                partial(build_package, project),
+                deps,
+            )
+        )
+    return tasks
 
 
 def main() -> None:
     """Build the python packages."""
-    for project in get_python_projects():
-        build_package(project)
+    projects = get_affected_projects(get_python_projects())
+    run_tasks(get_tasks(projects), jobs=get_jobs())
 
 
 if __name__ == "__main__":
@@ -1,23 +1,58 @@
 # SPDX-License-Identifier: Apache-2.0.
 # Copyright (c) 2024 - 2025 Harmony and contributors.
-"""Cleanup."""
+"""Cleanup.
+
+By default everything that matches ``DIR_PATTERNS`` and
+``FILE_PATTERNS`` in the root and in every project is removed.
+
+With ``--budget <size>`` (e.g. ``2G``, ``500M``) and/or
+``--older-than <age>`` (e.g. ``7d``, ``12h``) the directories that
+match ``DIR_PATTERNS`` are kept (so the next lint/test run is still
+incremental) and only their least recently used entries are removed:
+first the ones not used for longer than the age, then the oldest
+ones until the total size fits the budget. Add ``--dry-run`` to only
+report what would be removed.
+"""
 
 # pylint: disable=duplicate-code,broad-except
-import glob
+import fnmatch
 import os
+import re
 import shutil
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple
 
 HAD_TO_MODIFY_SYS_PATH = False
 
+# pylint: disable=ungrouped-imports,too-many-try-statements
 try:
-    from _lib import ROOT_DIR, get_python_projects, run_command
+    from _lib import (
+        ROOT_DIR,
+        get_arg_value,
+        get_jobs,
+        get_python_projects,
+        run_command,
+    )
+    from _metrics import discard_files
+    from _tasks import Task, emit, get_task_name, run_tasks
 except ImportError:
     sys.path.insert(0, str(Path(__file__).parent))
-    from _lib import ROOT_DIR, get_python_projects, run_command  # type: ignore
+    from _lib import (  # type: ignore
+        ROOT_DIR,
+        get_arg_value,
+        get_jobs,
+        get_python_projects,
+        run_command,
+    )
+    from _metrics import discard_files  # type: ignore
+    from _tasks import Task, emit, get_task_name, run_tasks  # type: ignore
 
     HAD_TO_MODIFY_SYS_PATH = True
+# pylint: enable=ungrouped-imports,too-many-try-statements
 
 DIR_PATTERNS = [
     "__pycache__",
@@ -56,40 +91,76 @@ SKIP_DIRS = [
 ]
 
 
-def _remove_dirs() -> None:
-    for pattern in DIR_PATTERNS:
-        for dirpath in glob.glob(f"./**/{pattern}", recursive=True):
-            if any(
-                f"{os.path.sep}{skip_dir}{os.path.sep}" in dirpath
-                for skip_dir in SKIP_DIRS
-            ):
-                continue
-            print(f"removing dir: {dirpath}")
-            try:
-                shutil.rmtree(dirpath)
-            except BaseException:
-                print(f"failed to remove dir: {dirpath}", file=sys.stderr)
-
-
-def _remove_files() -> None:
-    for pattern in FILE_PATTERNS:
-        for filepath in glob.glob(f"./**/{pattern}", recursive=True):
-            if any(
-                f"{os.path.sep}{skip_dir}{os.path.sep}" in filepath
-                for skip_dir in SKIP_DIRS
-            ):
-                continue
-            print(f"removing file: {filepath}")
-            try:
-                os.remove(filepath)
-            except BaseException:
-                print(f"failed to remove file: {filepath}", file=sys.stderr)
+# one regex per kind, matched against each entry's name
+_DIR_MATCHER = re.compile("|".join(map(fnmatch.translate, DIR_PATTERNS)))
+_FILE_MATCHER = re.compile("|".join(map(fnmatch.translate, FILE_PATTERNS)))
+
+
+def _is_skipped(dirname: str) -> bool:
+    """Check if a directory should not be walked."""
+    return dirname in SKIP_DIRS or dirname.startswith(".")
+
+
+def find_garbage(root: str = ".") -> Tuple[List[str], List[str]]:
+    """Find the directories and files to remove in a single walk.
+
+    ``SKIP_DIRS`` and hidden directories (like ``glob``'s ``**``)
+    are not descended into, neither are the directories that will
+    be removed. Symbolic links are not followed.
+
+    Parameters
+    ----------
+    root : str
+        The directory to walk.
+
+    Returns
+    -------
+    Tuple[List[str], List[str]]
+        The directories and the files to remove.
+    """
+    dirs: List[str] = []
+    files: List[str] = []
+    pending = [root]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                found = list(entries)
+        except OSError:
+            continue
+        for entry in found:
+            if entry.is_dir(follow_symlinks=False):
+                if _DIR_MATCHER.match(entry.name):
+                    dirs.append(entry.path)
+                elif not _is_skipped(entry.name):
+                    pending.append(entry.path)
+            elif _FILE_MATCHER.match(entry.name):
+                files.append(entry.path)
+    return sorted(dirs), sorted(files)
+
+
+def _remove_dir(dirpath: str) -> None:
+    emit(f"removing dir: {dirpath}")
+    try:
+        shutil.rmtree(dirpath)
+    except BaseException:
+        emit(f"failed to remove dir: {dirpath}")
+
+
+def _remove_file(filepath: str) -> None:
+    emit(f"removing file: {filepath}")
+    try:
+        os.remove(filepath)
+    except BaseException:
+        emit(f"failed to remove file: {filepath}")
 
 
 def cleanup_root_dir() -> None:
     """Cleanup the root directory."""
-    _remove_dirs()
-    _remove_files()
+    dirs, files = find_garbage(".")
+    with ThreadPoolExecutor(max_workers=get_jobs()) as executor:
+        # consume the results to get any (unexpected) error
+        list(executor.map(_remove_dir, dirs))
+        list(executor.map(_remove_file, files))
 
 
 def cleanup_package_dir(package_dir: Path) -> None:
@@ -111,13 +182,276 @@ def cleanup_package_dir(package_dir: Path) -> None:
     run_command([sys.executable, str(clean_py_script)], cwd=package_dir)
 
 
+class CacheEntry(NamedTuple):
+    """A file or a directory directly in a cache directory.
+
+    Attributes
+    ----------
+    path : str
+        The entry's path.
+    size : int
+        The size (in bytes) of its files.
+    last_used : float
+        The latest access/modification time of its files.
+    """
+
+    path: str
+    size: int
+    last_used: float
+
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+_AGE_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_size(value: str) -> int:
+    """Parse a size like ``500M`` or ``2G`` (binary units).
+
+    Parameters
+    ----------
+    value : str
+        The size.
+
+    Returns
+    -------
+    int
+        The size in bytes.
+
+    Raises
+    ------
+    ValueError
+        If the size is not valid.
+    """
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?", value.strip())
+    if match is None:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(match[1]) * _SIZE_UNITS[match[2]])
+
+
+def parse_age(value: str) -> float:
+    """Parse an age like ``7d``, ``12h``, ``30m`` or ``90`` (seconds).
+
+    Parameters
+    ----------
+    value : str
+        The age.
+
+    Returns
+    -------
+    float
+        The age in seconds.
+
+    Raises
+    ------
+    ValueError
+        If the age is not valid.
+    """
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([smhdw]?)", value.strip())
+    if match is None:
+        raise ValueError(f"Invalid age: {value}")
+    return float(match[1]) * _AGE_UNITS[match[2]]
+
+
+def _format_size(size: float) -> str:
+    """Format a size in bytes with a binary unit."""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+def _get_usage(path: str) -> Tuple[int, float]:
+    """Get the total size and the last use of a file or a directory."""
+    size, last_used = 0, 0.0
+    pending = [path]
+    while pending:
+        current = pending.pop()
+        try:
+            stat = os.lstat(current)
+        except OSError:
+            continue
+        last_used = max(last_used, stat.st_atime, stat.st_mtime)
+        if not os.path.isdir(current) or os.path.islink(current):
+            size += stat.st_size
+            continue
+        try:
+            with os.scandir(current) as entries:
+                pending.extend(entry.path for entry in entries)
+        except OSError:
+            continue
+    return size, last_used
+
+
+def get_cache_entries(cache_dir: str) -> List[CacheEntry]:
+    """Get the entries of a cache directory.
+
+    Parameters
+    ----------
+    cache_dir : str
+        The cache directory.
+
+    Returns
+    -------
+    List[CacheEntry]
+        Its direct children with their size and last use.
+    """
+    try:
+        with os.scandir(cache_dir) as entries:
+            paths = [entry.path for entry in entries]
+    except OSError:
+        return []
+    return [CacheEntry(path, *_get_usage(path)) for path in paths]
+
+
+def find_cache_dirs(projects: Sequence[Path]) -> List[str]:
+    """Find the cache directories of the root and the projects.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[str]
+        The directories that match ``DIR_PATTERNS``.
+    """
+    cache_dirs = find_garbage(".")[0]
+    for project_dir in projects:
+        cache_dirs.extend(find_garbage(os.path.relpath(project_dir))[0])
+    return cache_dirs
+
+
+def select_evictions(
+    entries: Sequence[CacheEntry],
+    budget: Optional[int],
+    older_than: Optional[float],
+    now: float,
+) -> List[CacheEntry]:
+    """Select the least recently used entries to remove.
+
+    Parameters
+    ----------
+    entries : Sequence[CacheEntry]
+        All the cache entries.
+    budget : Optional[int]
+        The maximum total size (in bytes) to keep.
+    older_than : Optional[float]
+        Remove the entries not used for this many seconds.
+    now : float
+        The current time.
+
+    Returns
+    -------
+    List[CacheEntry]
+        The entries to remove, least recently used first.
+    """
+    by_age = sorted(entries, key=lambda entry: entry.last_used)
+    total = sum(entry.size for entry in by_age)
+    evicted: List[CacheEntry] = []
+    for entry in by_age:
+        expired = older_than is not None and now - entry.last_used > older_than
+        over_budget = budget is not None and total > budget
+        if not expired and not over_budget:
+            break
+        evicted.append(entry)
+        total -= entry.size
+    return evicted
+
+
+def evict_caches(
+    projects: Sequence[Path],
+    budget: Optional[int],
+    older_than: Optional[float],
+    dry_run: bool,
+) -> None:
+    """Report the cache sizes and remove the least recently used entries.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+    budget : Optional[int]
+        The maximum total size (in bytes) to keep.
+    older_than : Optional[float]
+        Remove the entries not used for this many seconds.
+    dry_run : bool
+        Only report what would be removed.
+    """
+    cache_dirs = find_cache_dirs(projects)
+    with ThreadPoolExecutor(max_workers=get_jobs()) as executor:
+        inventory = list(executor.map(get_cache_entries, cache_dirs))
+    for cache_dir, entries in zip(cache_dirs, inventory):
+        size = sum(entry.size for entry in entries)
+        print(f"{_format_size(size):>12}  {cache_dir}")
+    entries = [entry for entries in inventory for entry in entries]
+    total = sum(entry.size for entry in entries)
+    evicted = select_evictions(entries, budget, older_than, time.time())
+    freed = sum(entry.size for entry in evicted)
+    print(
+        f"Total: {_format_size(total)} in {len(cache_dirs)} cache dirs, "
+        f"{'would remove' if dry_run else 'removing'} {len(evicted)} "
+        f"entries ({_format_size(freed)}), "
+        f"keeping {_format_size(total - freed)}"
+    )
+    if dry_run:
+        for entry in evicted:
+            print(f"would remove: {entry.path} ({_format_size(entry.size)})")
+        return
+    with ThreadPoolExecutor(max_workers=get_jobs()) as executor:
+        list(executor.map(_remove_entry, [entry.path for entry in evicted]))
+
+
+def _remove_entry(path: str) -> None:
+    """Remove a cache entry (a file or a directory)."""
+    if os.path.isdir(path) and not os.path.islink(path):
+        _remove_dir(path)
+    else:
+        _remove_file(path)
+
+
+def get_tasks(projects: Sequence[Path]) -> List[Task]:
+    """Get the cleanup tasks for the root and the given projects.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[Task]
+        One independent task per directory.
+    """
+    tasks = [Task(get_task_name("clean", ROOT_DIR), cleanup_root_dir)]
+    for package_dir in projects:
+        tasks.append(
+            Task(
+                get_task_name("clean", package_dir),
+                partial(cleanup_package_dir, package_dir),
+            )
+        )
+    return tasks
+
+
 def main() -> None:
     """Cleanup unnecessary files and directories."""
+    budget = get_arg_value("--budget")
+    older_than = get_arg_value("--older-than")
     _cwd = os.getcwd()
     os.chdir(ROOT_DIR)
-    cleanup_root_dir()
-    for package_dir in get_python_projects():
-        cleanup_package_dir(package_dir)
+    if budget is None and older_than is None:
+        # the timings would recreate the removed reports/ and .cache/
+        discard_files()
+        run_tasks(get_tasks(get_python_projects()), jobs=get_jobs())
+    else:
+        evict_caches(
+            get_python_projects(),
+            budget=parse_size(budget) if budget else None,
+            older_than=parse_age(older_than) if older_than else None,
+            dry_run="--dry-run" in sys.argv,
+        )
     if os.getcwd() != _cwd:
         os.chdir(_cwd)
 
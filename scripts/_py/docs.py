@@ -1,19 +1,143 @@
 # SPDX-License-Identifier: Apache-2.0.
 # Copyright (c) 2024 - 2025 Harmony and contributors.
-"""Generate docs in projects that have a mkdocs.yml file."""
+"""Generate docs in projects that have a mkdocs.yml file.
 
+The projects' docs are generated concurrently (``--jobs N``) and only
+if their inputs changed: ``mkdocs.yml``, the docs directory, the
+top level markdown files, the python modules (the docstrings) and the
+project's ``scripts/docs.py``, tracked by a content hash (with the
+installed versions of mkdocs, its plugins and the markdown extensions)
+in the project's ``.cache/docs.json``.
+Use ``--force`` to always generate them and ``--affected <ref>`` to
+only consider the projects changed since the merge base of the ref
+(and the projects that depend on them).
+"""
+
+import re
 import sys
+import time
+from functools import cache, partial
 from pathlib import Path
+from typing import List, Sequence, Tuple
 
 HAD_TO_MODIFY_SYS_PATH = False
 
+# pylint: disable=ungrouped-imports,too-many-try-statements
 try:
-    from _lib import ROOT_DIR, get_python_projects, run_command
+    from _cache import dump_json, hash_bytes, hash_files, load_json
+    from _lib import (
+        PY_SUFFIXES,
+        ROOT_DIR,
+        find_files,
+        get_affected_projects,
+        get_jobs,
+        get_python_projects,
+        run_command,
+    )
+    from _provision import get_installed_versions
+    from _tasks import Task, emit, get_task_name, run_tasks
 except ImportError:
     sys.path.insert(0, str(Path(__file__).parent))
-    from _lib import ROOT_DIR, get_python_projects, run_command  # type: ignore
+    from _cache import (  # type: ignore
+        dump_json,
+        hash_bytes,
+        hash_files,
+        load_json,
+    )
+    from _lib import (  # type: ignore
+        PY_SUFFIXES,
+        ROOT_DIR,
+        find_files,
+        get_affected_projects,
+        get_jobs,
+        get_python_projects,
+        run_command,
+    )
+    from _provision import get_installed_versions  # type: ignore
+    from _tasks import Task, emit, get_task_name, run_tasks  # type: ignore
 
     HAD_TO_MODIFY_SYS_PATH = True
+# pylint: enable=ungrouped-imports,too-many-try-statements
+
+# relative to each project directory
+MANIFEST = Path(".cache") / "docs.json"
+_DOCS_DIR = re.compile(r"^docs_dir:\s*['\"]?([^'\"#\s]+)", re.MULTILINE)
+# the distributions the docs are generated with (and mkdocs-*, mkdocstrings-*)
+DOCS_TOOLS = ("griffe", "markdown", "mkdocs", "pymdown-extensions")
+
+
+@cache
+def get_docs_tools() -> Tuple[str, ...]:
+    """Get the installed versions of the docs toolchain.
+
+    Returns
+    -------
+    Tuple[str, ...]
+        The ``name==version`` of mkdocs, its plugins and the markdown
+        extensions (``DOCS_TOOLS`` and the ``mkdocs*`` distributions).
+    """
+    return tuple(
+        f"{name}=={version}"
+        for name, version in sorted(get_installed_versions().items())
+        if name in DOCS_TOOLS or name.startswith("mkdocs")
+    )
+
+
+def get_docs_inputs(package_dir: Path) -> List[Path]:
+    """Get the files the docs of a project are generated from.
+
+    Parameters
+    ----------
+    package_dir : Path
+        The package directory.
+
+    Returns
+    -------
+    List[Path]
+        ``mkdocs.yml``, the files in the docs directory, the top level
+        markdown files, the python modules (but the tests) and the
+        project's docs script.
+    """
+    mkdocs_yml = package_dir / "mkdocs.yml"
+    inputs = [mkdocs_yml] if mkdocs_yml.exists() else []
+    try:
+        match = _DOCS_DIR.search(mkdocs_yml.read_text(encoding="utf-8"))
+    except OSError:
+        match = None
+    docs_dir = package_dir / (match[1] if match else "docs")
+    inputs.extend(find_files(docs_dir, ("",)) if docs_dir.is_dir() else [])
+    inputs.extend(sorted(package_dir.glob("*.md")))
+    docs_py_script = package_dir / "scripts" / "docs.py"
+    if docs_py_script.exists():
+        inputs.append(docs_py_script)
+    inputs.extend(
+        path
+        for path in find_files(package_dir, PY_SUFFIXES)
+        if "tests" not in path.relative_to(package_dir).parts
+    )
+    return sorted(set(inputs))
+
+
+def get_docs_key(package_dir: Path, output_dir: Path) -> str:
+    """Get the hash of the inputs of a project's docs.
+
+    Parameters
+    ----------
+    package_dir : Path
+        The package directory.
+    output_dir : Path
+        Where the docs are generated.
+
+    Returns
+    -------
+    str
+        The hex digest (of the inputs and of the docs tools).
+    """
+    return hash_bytes(
+        hash_files(get_docs_inputs(package_dir), package_dir),
+        output_dir.as_posix(),
+        *get_docs_tools(),
+    )
 
 
 def make_docs(package_dir: Path) -> None:
@@ -26,21 +150,55 @@ def make_docs(package_dir: Path) -> None:
     """
     docs_py_script = package_dir / "scripts" / "docs.py"
     if not docs_py_script.exists():
-        print(f"Docs script not found in {package_dir}, skipping ...")
+        emit(f"Docs script not found in {package_dir}, skipping ...")
         return
     # base_url = {this.repo_url}/{package_dir.name}
-    print(f"Generating docs for {package_dir.name} ...")
     output_dir = ROOT_DIR / "site" / package_dir.name
+    key = get_docs_key(package_dir, output_dir)
+    manifest = package_dir / MANIFEST
+    if (
+        "--force" not in sys.argv
+        and output_dir.is_dir()
+        and load_json(manifest, {}).get("key") == key
+    ):
+        emit(f"Docs for {package_dir.name} are up to date, skipping ...")
+        return
+    emit(f"Generating docs for {package_dir.name} ...")
+    start = time.monotonic()
     run_command(
         [sys.executable, str(docs_py_script), "--output", str(output_dir)],
         cwd=package_dir,
     )
+    dump_json(manifest, {"key": key})
+    emit(
+        f"Generated docs for {package_dir.name} "
+        f"in {time.monotonic() - start:.1f}s"
+    )
+
+
+def get_tasks(projects: Sequence[Path]) -> List[Task]:
+    """Get the docs tasks for the given projects.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[Task]
+        One independent task per project (they run concurrently).
+    """
+    return [
+        Task(get_task_name("docs", project), partial(make_docs, project))
+        for project in projects
+    ]
 
 
 def main() -> None:
     """Generate the documentation."""
-    for package_dir in get_python_projects():
-        make_docs(package_dir)
+    projects = get_affected_projects(get_python_projects())
+    run_tasks(get_tasks(projects), jobs=get_jobs())
 
 
 if __name__ == "__main__":
@@ -14,36 +14,51 @@ run_black()
     Run black.
 run_ruff()
     Run ruff.
+
+Use ``--changed-since <ref>`` or ``--staged`` to only format the files
+changed in git.
 """
 
 import sys
+from functools import partial
 from pathlib import Path
+from typing import List, Sequence
 
 HAD_TO_MODIFY_SYS_PATH = False
 
+# pylint: disable=ungrouped-imports,too-many-try-statements
 try:
     from _lib import (
         ROOT_DIR,
+        get_changed_scope,
+        get_jobs,
         get_python_projects,
+        get_scope_args,
         run_autoflake,
         run_black,
         run_command,
         run_isort,
         run_ruff,
     )
+    from _tasks import Task, emit, get_task_name, run_tasks
 except ImportError:
     sys.path.insert(0, str(Path(__file__).parent))
     from _lib import (  # type: ignore
         ROOT_DIR,
+        get_changed_scope,
+        get_jobs,
         get_python_projects,
+        get_scope_args,
         run_autoflake,
         run_black,
         run_command,
         run_isort,
         run_ruff,
     )
+    from _tasks import Task, emit, get_task_name, run_tasks  # type: ignore
 
     HAD_TO_MODIFY_SYS_PATH = True
+# pylint: enable=ungrouped-imports,too-many-try-statements
 
 
 def format_root() -> None:
@@ -70,14 +85,40 @@ def format_package(package_dir: Path) -> None:
     format_script = package_dir / "scripts" / "format.py"
     if not format_script.exists():
         raise FileNotFoundError(f"Format script not found in {package_dir}")
-    run_command([sys.executable, str(format_script)])
+    if get_changed_scope(package_dir) == set():
+        emit(f"No changes in {package_dir}, skipping ...")
+        return
+    args = [sys.executable, str(format_script)] + get_scope_args(package_dir)
+    run_command(args)
+
+
+def get_tasks(projects: Sequence[Path]) -> List[Task]:
+    """Get the format tasks for the root and the given projects.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[Task]
+        One independent task per directory.
+    """
+    tasks = [Task(get_task_name("format", ROOT_DIR), format_root)]
+    for package_dir in projects:
+        tasks.append(
+            Task(
+                get_task_name("format", package_dir),
+                partial(format_package, package_dir),
+            )
+        )
+    return tasks
 
 
 def main() -> None:
     """Run python formatters."""
-    format_root()
-    for package_dir in get_python_projects():
-        format_package(package_dir)
+    run_tasks(get_tasks(get_python_projects()), jobs=get_jobs())
 
 
 if __name__ == "__main__":
@@ -4,6 +4,9 @@
 
 In sub-projects that have either a
 scripts/image.py or scripts/image.ts file.
+With ``--affected <ref>`` only the images of the projects changed
+since the merge base of the ref (and of the projects that depend
+on them) are built.
 """
 
 import sys
@@ -14,10 +17,22 @@ DEFAULT_TAG = "latest"
 SKIP_ARM = True
 
 try:
-    from _lib import get_py_image_configs, run_command
+    from _lib import (
+        get_affected_projects,
+        get_py_image_configs,
+        get_python_projects,
+        get_workspace,
+        run_command,
+    )
 except ImportError:
     sys.path.insert(0, str(Path(__file__).parent))
-    from _lib import get_py_image_configs, run_command  # type: ignore
+    from _lib import (  # type: ignore
+        get_affected_projects,
+        get_py_image_configs,
+        get_python_projects,
+        get_workspace,
+        run_command,
+    )
 
     HAD_TO_MODIFY_SYS_PATH = True
 
@@ -69,7 +84,12 @@ def main() -> None:
     push = False
     if "--push" in sys.argv:
         push = True
+    affected = get_affected_projects(get_python_projects())
     for config in get_py_image_configs():
+        owner = get_workspace().get_owner(config.file.resolve())
+        if owner is not None and owner.path not in affected:
+            print(f"{config.name} is not affected, skipping ...")
+            continue
         for platform in config.platforms:
             if SKIP_ARM and "arm" in platform:
                 continue
@@ -13,17 +13,38 @@ This script runs the following linters:
 - ruff
 - pylint
 - eclint (if installed)
+
+Use ``--changed-since <ref>`` or ``--staged`` to only lint the files
+changed in git (mypy still checks the whole project if any python
+file changed), ``--no-cache`` to ignore the previous results and
+``--jobs N`` to limit the number of projects linted in parallel.
+Use ``--affected <ref>`` to only lint the projects changed since the
+merge base of the ref and the projects that depend on them.
+
+The linters (and the projects) that failed most often for the time
+they take run first. By default the first failure stops the run once
+the running projects are done, ``--fail-fast`` stops them right away
+and ``--keep-going`` runs everything and lists all the failures.
+The python tools run in a warm worker process (see ``_worker.py``),
+use ``--no-worker`` to run each of them in its own interpreter.
 """
 
 import sys
+from functools import partial
 from pathlib import Path
+from typing import List, Sequence
 
 HAD_TO_MODIFY_SYS_PATH = False
 
+# pylint: disable=ungrouped-imports,too-many-try-statements
 try:
     from _lib import (
         ROOT_DIR,
+        get_affected_projects,
+        get_changed_scope,
+        get_jobs,
         get_python_projects,
+        get_scope_args,
         run_bandit,
         run_black,
         run_command,
@@ -35,11 +56,16 @@ try:
         run_ruff,
         run_yamllint,
     )
+    from _tasks import Task, emit, get_task_name, run_steps, run_tasks
 except ImportError:
     sys.path.insert(0, str(Path(__file__).parent))
     from _lib import (  # type: ignore
         ROOT_DIR,
+        get_affected_projects,
+        get_changed_scope,
+        get_jobs,
         get_python_projects,
+        get_scope_args,
         run_bandit,
         run_black,
         run_command,
@@ -51,21 +77,37 @@ except ImportError:
         run_ruff,
         run_yamllint,
     )
+    from _tasks import (  # type: ignore
+        Task,
+        emit,
+        get_task_name,
+        run_steps,
+        run_tasks,
+    )
 
     HAD_TO_MODIFY_SYS_PATH = True
+# pylint: enable=ungrouped-imports,too-many-try-statements
 
 
 def lint_root() -> None:
-    """Run linters in the root directory."""
-    run_isort(in_dir=ROOT_DIR, fix=False)
-    run_black(in_dir=ROOT_DIR, fix=False)
-    run_mypy(in_dir=ROOT_DIR)
-    run_flake8(in_dir=ROOT_DIR)
-    run_pydocstyle(in_dir=ROOT_DIR)
-    run_bandit(in_dir=ROOT_DIR)
-    run_yamllint(in_dir=ROOT_DIR)
-    run_ruff(in_dir=ROOT_DIR, fix=False)
-    run_pylint(in_dir=ROOT_DIR)
+    """Run linters in the root directory.
+
+    The linters are independent, the ones that failed most often
+    for the time they take run first (see ``_tasks.run_steps``).
+    """
+    run_steps(
+        [
+            ("isort", partial(run_isort, in_dir=ROOT_DIR, fix=False)),
+            ("black", partial(run_black, in_dir=ROOT_DIR, fix=False)),
+            ("mypy", partial(run_mypy, in_dir=ROOT_DIR)),
+            ("flake8", partial(run_flake8, in_dir=ROOT_DIR)),
+            ("pydocstyle", partial(run_pydocstyle, in_dir=ROOT_DIR)),
+            ("bandit", partial(run_bandit, in_dir=ROOT_DIR)),
+            ("yamllint", partial(run_yamllint, in_dir=ROOT_DIR)),
+            ("ruff", partial(run_ruff, in_dir=ROOT_DIR, fix=False)),
+            ("pylint", partial(run_pylint, in_dir=ROOT_DIR)),
+        ]
+    )
 
 
 def lint_package(package_dir: Path) -> None:
@@ -84,16 +126,44 @@ def lint_package(package_dir: Path) -> None:
     lint_script = package_dir / "scripts" / "lint.py"
     if not lint_script.exists():
         raise FileNotFoundError(f"Lint script not found in {package_dir}")
-    run_command([sys.executable, str(lint_script)])
+    if get_changed_scope(package_dir) == set():
+        emit(f"No changes in {package_dir}, skipping ...")
+        return
+    args = [sys.executable, str(lint_script)] + get_scope_args(package_dir)
+    run_command(args)
+
+
+def get_tasks(projects: Sequence[Path]) -> List[Task]:
+    """Get the lint tasks for the root and the given projects.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[Task]
+        One independent task per directory.
+    """
+    tasks = [Task(get_task_name("lint", ROOT_DIR), lint_root)]
+    for package_dir in projects:
+        tasks.append(
+            Task(
+                get_task_name("lint", package_dir),
+                partial(lint_package, package_dir),
+            )
+        )
+    return tasks
 
 
 def main() -> None:
     """Run the linters."""
-    lint_root()
     if "--root" in sys.argv:
-        return
-    for package_dir in get_python_projects():
-        lint_package(package_dir)
+        projects = []
+    else:
+        projects = get_affected_projects(get_python_projects())
+    run_tasks(get_tasks(projects), jobs=get_jobs())
 
 
 if __name__ == "__main__":
@@ -4,15 +4,44 @@
 # flake8: noqa E501
 # pylint: disable=import-error,import-outside-toplevel,too-few-public-methods,broad-except
 # isort: skip_file
-"""Generate requirements/*txt files from pyproject.toml."""
-
+"""Generate requirements/*txt files from pyproject.toml.
+
+A manifest (``.cache/requirements.json`` in each project) keeps the
+hashes of the pyproject.toml and of the generated files, so unchanged
+projects are skipped.
+
+With ``--install``, the requirements are first checked in-process
+against the installed distributions (specifiers and markers, following
+the ``-r`` includes) and only the unsatisfied ones are installed.
+
+With ``--install --workspace``, the requirements of all the projects
+are resolved once (pinned by ``uv.lock``, or merged and resolved
+together if the lock cannot be exported), their wheels are collected
+in a wheelhouse (``--wheelhouse <dir>``, default ``.cache/wheelhouse``)
+and every project is installed from it with ``--no-index``. Add
+``--offline`` to only use an already populated wheelhouse.
+"""
+
+import hashlib
+import json
 import os
 import re
 import subprocess  # nosemgrep # nosec
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
 from pathlib import Path
-from typing import Any, Dict, List, Protocol, Tuple
-
+from typing import Any, Dict, List, Optional, Protocol, Set, Tuple
+
+try:
+    from _cache import dump_json, hash_file
+    from _lib import get_arg_value
+    from _provision import get_installed_versions, is_satisfied
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from _cache import dump_json, hash_file  # type: ignore
+    from _lib import get_arg_value  # type: ignore
+    from _provision import get_installed_versions, is_satisfied  # type: ignore
 
 ROOT_DIR = Path(__file__).parent.parent.parent
 PACKAGES_DIR = ROOT_DIR / "packages"
@@ -31,6 +60,10 @@ EXCLUDED_PACKAGES = [  # we manually do these (in order)
     "harmony_studio",
     "harmony_jupyter",
 ]
+# relative to each project directory
+MANIFEST = Path(".cache") / "requirements.json"
+WHEELHOUSE_DIR = ROOT_DIR / ".cache" / "wheelhouse"
+LOCKED = "requirements-locked.txt"
 os.environ["PYTHONUNBUFFERED"] = "1"
 os.environ["PYTHONUTF8"] = "1"
 # toml uses 'r' mode, tomllib uses 'rb' mode
@@ -44,9 +77,13 @@ class TomlLoader(Protocol):
         """Load TOML data from a file."""
 
 
+@cache
 def get_loader() -> TomlLoader:
     """Get the TOML loader.
 
+    On python 3.10 ``toml`` is installed if missing, the loader is
+    cached so that it is only done once.
+
     Returns
     -------
     TomlLoader
@@ -92,21 +129,6 @@ def get_loader() -> TomlLoader:
         raise ImportError("Failed to import the `toml` library.") from error
 
 
-def _write_all_dot_txt(project_dir: Path, extras: List[str]) -> None:
-    """Generate requirements/all.txt with references to all requirements."""
-    if not os.path.exists(project_dir / "requirements"):
-        os.makedirs(project_dir / "requirements")
-    items = extras + ["main"]
-    with open(
-        project_dir / "requirements" / "all.txt",
-        "w",
-        encoding="utf-8",
-        newline="\n",
-    ) as file:
-        for item in items:
-            file.write(f"-r {item}.txt\n")
-
-
 def get_package_name(requirement: str) -> str:
     """Get the package name from a requirement string.
 
@@ -126,58 +148,37 @@ def get_package_name(requirement: str) -> str:
     return re.split(r"[<=>;]", requirement)[0]
 
 
-def _write_main_txt(project_dir: Path, main_requirements: List[str]) -> None:
-    """Write the main requirements file."""
-    with open(
-        project_dir / "requirements" / "main.txt",
-        "w",
-        encoding="utf-8",
-        newline="\n",
-    ) as file:
-        for requirement in sorted(main_requirements):
-            raw_requirement = get_package_name(requirement)
-            if raw_requirement in EXCLUDED_PACKAGES:
-                continue
-            file.write(f"{requirement}\n")
+def _get_all_dot_txt(extras: List[str]) -> str:
+    """Get requirements/all.txt with references to all requirements."""
+    return "".join(f"-r {item}.txt\n" for item in extras + ["main"])
 
 
-def _write_extra_txt(
-    project_dir: Path, extra: str, extra_requirements: List[str], has_main: bool
-) -> None:
-    """Write an extra requirements file."""
-    with open(
-        project_dir / "requirements" / f"{extra}.txt",
-        "w",
-        encoding="utf-8",
-        newline="\n",
-    ) as file:
-        if has_main:
-            file.write("-r main.txt\n")
-        for requirement in sorted(extra_requirements):
-            raw_requirement = get_package_name(requirement)
-            if raw_requirement in EXCLUDED_PACKAGES:
-                continue
-            file.write(f"{requirement}\n")
-
-
-def _write_requirements_txt(
-    project_dir: Path, toml_data: Dict[str, Any]
-) -> Tuple[bool, List[str]]:
-    """Write requirements/*.txt file.
+def _get_lines(requirements: List[str]) -> List[str]:
+    """Get the (sorted) requirement lines, without the excluded packages."""
+    return [
+        f"{requirement}\n"
+        for requirement in sorted(requirements)
+        if get_package_name(requirement) not in EXCLUDED_PACKAGES
+    ]
+
+
+def _get_requirements_txt(
+    toml_data: Dict[str, Any]
+) -> Tuple[Dict[str, str], bool, List[str]]:
+    """Get the contents of the requirements/*.txt files.
 
     Parameters
     ----------
-    project_dir : Path
-        The project directory.
     toml_data : Dict[str, Any]
         The parsed pyproject.toml data.
 
     Returns
     -------
-    Tuple[bool, List[str]]
-        A tuple of whether the main requirements were found and
-        a list of extra keys.
+    Tuple[Dict[str, str], bool, List[str]]
+        The contents by file name, whether the main requirements
+        were found and a list of extra keys.
     """
+    contents: Dict[str, str] = {}
     has_main = True
     try:
         main_requirements = toml_data["project"]["dependencies"]
@@ -187,76 +188,418 @@ def _write_requirements_txt(
         extra_requirements = toml_data["project"]["optional-dependencies"]
     except KeyError:
         extra_requirements = {}
-    if not os.path.exists(project_dir / "requirements"):
-        os.makedirs(project_dir / "requirements")
     if has_main:
-        _write_main_txt(project_dir, main_requirements)
+        contents["main.txt"] = "".join(_get_lines(main_requirements))
     extra_keys = []
     for extra in extra_requirements:
         if extra in EXCLUDED_EXTRAS:
             continue
         extra_keys.append(extra)
-        _write_extra_txt(
-            project_dir, extra, extra_requirements[extra], has_main
+        header = ["-r main.txt\n"] if has_main else []
+        contents[f"{extra}.txt"] = "".join(
+            header + _get_lines(extra_requirements[extra])
         )
-    return has_main, extra_keys
+    if has_main:
+        contents["all.txt"] = _get_all_dot_txt(extra_keys)
+    return contents, has_main, extra_keys
+
+
+def _hash(data: bytes) -> str:
+    """Get the sha256 of some data."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _load_manifest(project_dir: Path) -> Dict[str, Any]:
+    """Load the manifest of the last generation (empty if none)."""
+    try:
+        with open(project_dir / MANIFEST, "r", encoding="utf-8") as file:
+            manifest: Dict[str, Any] = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return manifest
+
+
+def _is_up_to_date(project_dir: Path, manifest: Dict[str, Any]) -> bool:
+    """Check if the outputs of the manifest are still the generated ones."""
+    if manifest.get("pyproject") != hash_file(project_dir / "pyproject.toml"):
+        return False
+    outputs: Dict[str, str] = manifest.get("outputs", {})
+    return bool(outputs) and all(
+        hash_file(project_dir / "requirements" / name) == digest
+        for name, digest in outputs.items()
+    )
+
+
+def _write_if_changed(path: Path, content: str) -> bool:
+    """Write a file only if its content differs (keeps the mtime)."""
+    data = content.encode("utf-8")
+    try:
+        if path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    path.write_bytes(data)
+    return True
 
 
-def generate_requirements(project_dir: Path) -> None:
+def generate_requirements(project_dir: Path) -> Optional[Dict[str, Any]]:
     """Generate requirements/*txt files from pyproject.toml.
 
+    Nothing is done if the pyproject.toml and the generated files
+    did not change since the last run (see ``MANIFEST``), and only
+    the files whose content differs are written.
+
     Parameters
     ----------
     project_dir : Path
         The project directory.
+
+    Returns
+    -------
+    Optional[Dict[str, Any]]
+        The project's manifest, None if it has no pyproject.toml.
     """
-    loader = get_loader()
     py_project_toml = project_dir / "pyproject.toml"
     if not py_project_toml.exists():
         print(f"pyproject.toml not found in {project_dir}")
-        return
+        return None
+    manifest = _load_manifest(project_dir)
+    if _is_up_to_date(project_dir, manifest):
+        print(f"Requirements of {project_dir} are up to date")
+        return manifest
+    data = py_project_toml.read_bytes()
     with open(py_project_toml, OPEN_MODE) as f:
-        toml_data = loader(f)
-    if not os.path.exists(project_dir / "requirements"):
-        os.makedirs(project_dir / "requirements")
-    has_main, keys = _write_requirements_txt(project_dir, toml_data)
-    if has_main:
-        _write_all_dot_txt(project_dir, keys)
-    print("Done. Generated:")
-    for file in os.listdir(project_dir / "requirements"):
-        print(f"  - {file}")
-    if "--install" in sys.argv:
-        to_install = ["-r", os.path.join("requirements", "all.txt")]
-        if not has_main:
-            to_install = []
-            for key in keys:
-                to_install.extend(
-                    ["-r", os.path.join("requirements", f"{key}.txt")]
-                )
-        subprocess.run(  # nosemgrep # nosec
-            [
-                sys.executable,
-                "-m",
-                "pip",
-                "install",
-            ]
-            + to_install,
-            cwd=project_dir,
-            stdout=sys.stdout,
-            stderr=subprocess.STDOUT,
-            check=True,
+        toml_data = get_loader()(f)
+    contents, has_main, keys = _get_requirements_txt(toml_data)
+    os.makedirs(project_dir / "requirements", exist_ok=True)
+    written = [
+        name
+        for name, content in contents.items()
+        if _write_if_changed(project_dir / "requirements" / name, content)
+    ]
+    # a single print, the projects are generated concurrently
+    print(
+        f"Done. Generated for {project_dir}:\n"
+        + "\n".join(
+            f"  - {name}{'' if name in written else ' (unchanged)'}"
+            for name in contents
+        )
+    )
+    manifest = {
+        "pyproject": _hash(data),
+        "outputs": {
+            name: _hash(content.encode("utf-8"))
+            for name, content in contents.items()
+        },
+        "has_main": has_main,
+        "keys": keys,
+    }
+    dump_json(project_dir / MANIFEST, manifest)
+    return manifest
+
+
+def read_requirements(
+    path: Path, seen: Optional[Set[Path]] = None
+) -> List[str]:
+    """Read a requirements file, following its ``-r`` includes.
+
+    Parameters
+    ----------
+    path : Path
+        The requirements file.
+    seen : Optional[Set[Path]]
+        The files already read (to not follow include cycles).
+
+    Returns
+    -------
+    List[str]
+        The requirement lines.
+
+    Raises
+    ------
+    ValueError
+        If the file uses options (other than ``-r``) that
+        cannot be checked in-process.
+    """
+    seen = set() if seen is None else seen
+    path = path.resolve()
+    if path in seen:
+        return []
+    seen.add(path)
+    requirements: List[str] = []
+    for raw_line in path.read_text(encoding="utf-8").splitlines():
+        line = raw_line.split(" #", 1)[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        include = re.match(r"(?:-r|--requirement)\s*=?\s*(.+)", line)
+        if include:
+            requirements += read_requirements(path.parent / include[1], seen)
+        elif line.startswith("-"):
+            raise ValueError(f"Cannot check '{line}' in {path}")
+        else:
+            requirements.append(line)
+    return requirements
+
+
+def _get_install_files(manifest: Dict[str, Any]) -> List[str]:
+    """Get the requirements files to install (relative to the project)."""
+    if manifest.get("has_main"):
+        return [os.path.join("requirements", "all.txt")]
+    return [
+        os.path.join("requirements", f"{key}.txt")
+        for key in manifest.get("keys", [])
+    ]
+
+
+def get_unsatisfied(project_dir: Path, files: List[str]) -> List[str]:
+    """Get the requirements that the environment does not satisfy.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+    files : List[str]
+        The requirements files (relative to the project).
+
+    Returns
+    -------
+    List[str]
+        The unsatisfied requirements (``-r <file>`` for all the
+        files if they cannot be checked in-process).
+    """
+    installed = get_installed_versions()
+    try:
+        requirements = [
+            requirement
+            for name in files
+            for requirement in read_requirements(project_dir / name)
+        ]
+        return [
+            requirement
+            for requirement in dict.fromkeys(requirements)
+            if not is_satisfied(requirement, installed)
+        ]
+    except Exception as error:
+        print(f"Could not check the requirements: {error}")
+        return [arg for name in files for arg in ("-r", name)]
+
+
+def install_requirements(
+    project_dir: Path,
+    manifest: Dict[str, Any],
+    wheelhouse: Optional[Path] = None,
+) -> None:
+    """Install the unsatisfied requirements of a project.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+    manifest : Dict[str, Any]
+        The project's manifest.
+    wheelhouse : Optional[Path]
+        Install offline, only from this directory.
+    """
+    to_install = get_unsatisfied(project_dir, _get_install_files(manifest))
+    if not to_install:
+        print(f"Requirements of {project_dir} are already satisfied")
+        return
+    offline = (
+        ["--no-index", "--find-links", str(wheelhouse)] if wheelhouse else []
+    )
+    subprocess.run(  # nosemgrep # nosec
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+        ]
+        + offline
+        + to_install,
+        cwd=project_dir,
+        stdout=sys.stdout,
+        stderr=subprocess.STDOUT,
+        check=True,
+    )
+
+
+def export_lock(path: Path) -> bool:
+    """Export the pinned third party requirements of ``uv.lock``.
+
+    Parameters
+    ----------
+    path : Path
+        The requirements file to write.
+
+    Returns
+    -------
+    bool
+        Whether the lock could be exported (uv is installed and
+        the lock is up to date with the workspace).
+    """
+    if not (ROOT_DIR / "uv.lock").exists():
+        return False
+    result = subprocess.run(  # nosemgrep # nosec
+        [
+            sys.executable,
+            "-m",
+            "uv",
+            "export",
+            "--frozen",
+            "--all-packages",
+            "--all-extras",
+            "--no-hashes",
+            "--no-header",
+            "--no-emit-workspace",
+            "--output-file",
+            str(path),
+        ],
+        cwd=ROOT_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        encoding="utf-8",
+        check=False,
+    )
+    if result.returncode != 0:
+        print(f"Could not export uv.lock:\n{result.stdout}")
+    return result.returncode == 0
+
+
+def merge_requirements(
+    project_dirs: List[Path], manifests: List[Optional[Dict[str, Any]]]
+) -> str:
+    """Merge the generated requirements of all the projects.
+
+    Parameters
+    ----------
+    project_dirs : List[Path]
+        The project directories.
+    manifests : List[Optional[Dict[str, Any]]]
+        Their manifests (None if a project has no pyproject.toml).
+
+    Returns
+    -------
+    str
+        The requirements (one per line, without duplicates).
+    """
+    requirements: List[str] = []
+    for project_dir, manifest in zip(project_dirs, manifests):
+        if manifest is None:
+            continue
+        for name in _get_install_files(manifest):
+            requirements += read_requirements(project_dir / name)
+    return "".join(f"{line}\n" for line in dict.fromkeys(requirements))
+
+
+def populate_wheelhouse(requirements_file: Path, wheelhouse: Path) -> None:
+    """Get a wheel for every requirement in a local directory.
+
+    Nothing is downloaded if the wheelhouse is already complete.
+
+    Parameters
+    ----------
+    requirements_file : Path
+        The (resolved) requirements.
+    wheelhouse : Path
+        The directory to put the wheels in.
+    """
+    wheelhouse.mkdir(parents=True, exist_ok=True)
+    command = [
+        sys.executable,
+        "-m",
+        "pip",
+        "wheel",
+        "--wheel-dir",
+        str(wheelhouse),
+        "--find-links",
+        str(wheelhouse),
+        "--requirement",
+        str(requirements_file),
+    ]
+    # a pinned lock is complete, pip resolves the merged requirements
+    if requirements_file.name == LOCKED:
+        command.append("--no-deps")
+    offline = subprocess.run(  # nosemgrep # nosec
+        command + ["--no-index"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=False,
+    )
+    if offline.returncode == 0:
+        print(f"Wheelhouse {wheelhouse} is complete")
+        return
+    subprocess.run(  # nosemgrep # nosec
+        command,
+        stdout=sys.stdout,
+        stderr=subprocess.STDOUT,
+        check=True,
+    )
+
+
+def install_workspace(
+    project_dirs: List[Path], manifests: List[Optional[Dict[str, Any]]]
+) -> None:
+    """Resolve all the projects once and install them offline.
+
+    The requirements are pinned by ``uv.lock`` (or resolved together
+    if it cannot be used), their wheels are put in the wheelhouse and
+    then every project is installed (in order) from it only.
+
+    Parameters
+    ----------
+    project_dirs : List[Path]
+        The project directories (in install order).
+    manifests : List[Optional[Dict[str, Any]]]
+        Their manifests (None if a project has no pyproject.toml).
+    """
+    # pip runs in each project's directory
+    wheelhouse = Path(get_arg_value("--wheelhouse") or WHEELHOUSE_DIR).resolve()
+    cache_dir = ROOT_DIR / ".cache"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    requirements_file = cache_dir / LOCKED
+    if not export_lock(requirements_file):
+        requirements_file = cache_dir / "requirements-merged.txt"
+        _write_if_changed(
+            requirements_file, merge_requirements(project_dirs, manifests)
         )
+    if "--offline" not in sys.argv:
+        populate_wheelhouse(requirements_file, wheelhouse)
+    for project_dir, manifest in zip(project_dirs, manifests):
+        if manifest is not None:
+            install_requirements(project_dir, manifest, wheelhouse)
+
+
+def get_project_dirs() -> List[Path]:
+    """Get the root and the python project directories (install order).
+
+    Returns
+    -------
+    List[Path]
+        The root, the packages (core first) and the templates.
+    """
+    return (
+        [ROOT_DIR]
+        + [PACKAGES_DIR / project_dir for project_dir in PY_PROJECTS]
+        + [Path(project_dir) for project_dir in PY_TEMPLATE_PROJECTS]
+    )
 
 
 def main() -> None:
     """Run the script."""
-    for project_dir in [""] + PY_PROJECTS:
-        project_path = PACKAGES_DIR / project_dir if project_dir else ROOT_DIR
-        print(f"Generating requirements for {project_dir}")
-        generate_requirements(project_path)
-    for project_dir in PY_TEMPLATE_PROJECTS:
-        print(f"Generating requirements for {project_dir}")
-        generate_requirements(project_path)
+    project_dirs = get_project_dirs()
+    # before the threads (it may install toml)
+    get_loader()
+    # the files are generated concurrently, installed in order
+    with ThreadPoolExecutor() as executor:
+        manifests = list(executor.map(generate_requirements, project_dirs))
+    if "--install" not in sys.argv:
+        return
+    if "--workspace" in sys.argv:
+        install_workspace(project_dirs, manifests)
+        return
+    for project_dir, manifest in zip(project_dirs, manifests):
+        if manifest is not None:
+            install_requirements(project_dir, manifest)
 
 
 if __name__ == "__main__":
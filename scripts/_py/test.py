@@ -1,24 +1,287 @@
 # SPDX-License-Identifier: Apache-2.0.
 # Copyright (c) 2024 - 2025 Harmony and contributors.
-"""Run tests in the project's subdirectories."""
+"""Run tests in the project's subdirectories.
 
+The projects are tested concurrently (``--jobs N``), by their own
+``scripts/test.py``, which writes the project's ``coverage/lcov.info``.
+The projects' reports are then merged into the root
+``coverage/lcov.info`` (with the paths relative to the root) and the
+line/branch totals are printed.
+
+If ``pytest-cov`` is installed, with more than one job, the suites
+that are long enough are split into shards of test files with
+balanced durations (``.cache/test-durations.json`` in each project).
+The shards run ``pytest`` directly as separate tasks and their
+coverage reports are merged into the project's ``coverage/lcov.info``.
+Use ``--no-shard`` to always run the projects' own scripts.
+
+The shards record the duration of each test file, the failures and
+which lines each test executed (``--cov-context=test``) in a test
+impact index (``.cache/test-impact.json``, see ``_impact.py``). With
+``--record``, the projects' own scripts record them too: ``pytest``
+then gets ``--junitxml``, ``-o junit_family=xunit1`` and
+``--cov-context=test`` through ``PYTEST_ADDOPTS`` and ``COVERAGE_FILE``
+is set, so the script must run ``pytest`` once and keep these (not
+set its own junit report or coverage data file). A plain run does not
+change the environment of the projects' scripts.
+
+With ``--affected-by <ref>`` (and ``pytest-cov``) only the tests
+affected by the changes since the merge base of the ref (plus the new
+and the previously failed ones) are run, with ``pytest`` directly.
+The changes of the projects it depends on count too: they select the
+tests that executed them, or all the tests if the index did not
+record them. The coverage of such a partial run is written to
+``coverage/lcov-affected.info``, the project's ``coverage/lcov.info``
+is kept. With ``--affected <ref>`` only the projects changed since the
+merge base of the ref, and the projects that depend on them, are
+tested.
+"""
+
+import heapq
+import importlib.util
+import os
 import sys
+import threading
+import xml.etree.ElementTree as ET  # nosec
+from functools import partial
 from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
 HAD_TO_MODIFY_SYS_PATH = False
 
+# pylint: disable=ungrouped-imports,too-many-try-statements
 try:
-    from _lib import get_python_projects, run_command
+    from _cache import dump_json, load_json
+    from _coverage import merge_lcov
+    from _git import get_changed_lines
+    from _impact import ImpactIndex, read_contexts
+    from _lib import (
+        ROOT_DIR,
+        find_files,
+        get_affected_projects,
+        get_arg_value,
+        get_jobs,
+        get_python_projects,
+        get_workspace,
+        run_command,
+    )
+    from _tasks import Task, emit, get_task_name, run_tasks
 except ImportError:
     sys.path.insert(0, str(Path(__file__).parent))
-    from _lib import run_command  # type: ignore
+    from _cache import dump_json, load_json  # type: ignore
+    from _coverage import merge_lcov  # type: ignore
+    from _git import get_changed_lines  # type: ignore
+    from _impact import ImpactIndex, read_contexts  # type: ignore
+    from _lib import (  # type: ignore
+        ROOT_DIR,
+        find_files,
+        get_affected_projects,
+        get_arg_value,
+        get_jobs,
+        get_python_projects,
+        get_workspace,
+        run_command,
+    )
+    from _tasks import Task, emit, get_task_name, run_tasks  # type: ignore
 
     HAD_TO_MODIFY_SYS_PATH = True
+# pylint: enable=ungrouped-imports,too-many-try-statements
+
+# relative to each project directory
+DURATIONS_FILE = Path(".cache") / "test-durations.json"
+REPORTS_DIR = Path(".cache") / "test-reports"
+COVERAGE_DIR = Path(".cache") / "test-coverage"
+# the shards of a project record their results concurrently
+_RECORD_LOCK = threading.Lock()
+# do not shard suites (or make shards) shorter than this (seconds)
+SHARD_SECONDS = 30.0
+
+
+def find_test_files(project_dir: Path) -> List[str]:
+    """Find the test files of a project.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+
+    Returns
+    -------
+    List[str]
+        The ``test_*.py``/``*_test.py`` files in its ``tests``
+        directory (relative to the project).
+    """
+    tests_dir = project_dir / "tests"
+    if not tests_dir.is_dir():
+        return []
+    return [
+        path.relative_to(project_dir).as_posix()
+        for path in find_files(tests_dir, [".py"])
+        if path.name.startswith("test_") or path.stem.endswith("_test")
+    ]
+
+
+def _get_test_file(project_dir: Path, classname: str) -> Optional[str]:
+    """Get the file of a junit test case from its dotted class name."""
+    parts = classname.split(".")
+    while parts:
+        candidate = project_dir.joinpath(*parts).with_suffix(".py")
+        if candidate.is_file():
+            return candidate.relative_to(project_dir).as_posix()
+        parts.pop()
+    return None
+
+
+def read_report(
+    project_dir: Path, report: Path
+) -> Tuple[Dict[str, float], Set[str]]:
+    """Read the duration and the failures of each test file.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+    report : Path
+        The junit xml report (of our own pytest runs).
+
+    Returns
+    -------
+    Tuple[Dict[str, float], Set[str]]
+        The seconds by test file (relative to the project) and the
+        test files with failures or errors.
+    """
+    durations: Dict[str, float] = {}
+    failed: Set[str] = set()
+    try:
+        tree = ET.parse(report)  # nosec
+    except (OSError, ET.ParseError):
+        return durations, failed
+    for case in tree.iter("testcase"):
+        test_file = case.get("file") or _get_test_file(
+            project_dir, case.get("classname", "")
+        )
+        if not test_file:
+            continue
+        test_file = Path(test_file).as_posix()
+        duration = float(case.get("time") or 0)
+        durations[test_file] = durations.get(test_file, 0.0) + duration
+        if case.find("failure") is not None or case.find("error") is not None:
+            failed.add(test_file)
+    return durations, failed
+
+
+def record_run(project_dir: Path, report: Path, data_file: Path) -> None:
+    """Record the durations, failures and per test coverage of a run.
+
+    Parameters
+    ----------
+    project_dir : Path
+        The project directory.
+    report : Path
+        The junit report of the run.
+    data_file : Path
+        The coverage data file of the run.
+    """
+    durations, failed = read_report(project_dir, report)
+    contexts = read_contexts(data_file, project_dir)
+    test_files = find_test_files(project_dir)
+    with _RECORD_LOCK:
+        stored: Dict[str, float] = load_json(project_dir / DURATIONS_FILE, {})
+        stored.update(durations)
+        dump_json(
+            project_dir / DURATIONS_FILE,
+            {name: stored[name] for name in test_files if name in stored},
+        )
+        ImpactIndex(project_dir).update(contexts, durations, failed, test_files)
+
+
+def has_pytest_cov() -> bool:
+    """Check if ``pytest-cov`` is installed (to run ``pytest`` directly).
+
+    Returns
+    -------
+    bool
+        Whether the shards can get ``--cov`` and ``--cov-context``.
+    """
+    return importlib.util.find_spec("pytest_cov") is not None
+
+
+def _get_env(report: Path, data_file: Path) -> Dict[str, str]:
+    """Get the environment of a run that records its results."""
+    env = dict(os.environ)
+    data_file.parent.mkdir(parents=True, exist_ok=True)
+    data_file.unlink(missing_ok=True)
+    env["COVERAGE_FILE"] = str(data_file)
+    options = [f"--junitxml={report}", "-o junit_family=xunit1"]
+    if has_pytest_cov():
+        options.append("--cov-context=test")
+    env["PYTEST_ADDOPTS"] = " ".join(
+        filter(None, [env.get("PYTEST_ADDOPTS", "")] + options)
+    )
+    return env
+
+
+def plan_shards(
+    files: Sequence[str], durations: Dict[str, float], jobs: int
+) -> List[List[str]]:
+    """Split the tests into shards with balanced durations.
+
+    The longest files are placed first, each in the currently
+    shortest shard. Files without a recorded duration count as
+    the average one, the tests (ids) of a file share its duration.
+
+    Parameters
+    ----------
+    files : Sequence[str]
+        The test files (or test ids).
+    durations : Dict[str, float]
+        The recorded seconds by test file.
+    jobs : int
+        The maximum number of shards.
+
+    Returns
+    -------
+    List[List[str]]
+        The shards (a single one if the suite is short).
+    """
+    known = [durations[name] for name in files if name in durations]
+    default = sum(known) / len(known) if known else 0.0
+    per_file: Dict[str, int] = {}
+    for name in files:
+        test_file = name.split("::", 1)[0]
+        per_file[test_file] = per_file.get(test_file, 0) + 1
+    weights = {
+        name: durations.get(name.split("::", 1)[0], default)
+        / per_file[name.split("::", 1)[0]]
+        for name in files
+    }
+    total = sum(weights.values())
+    count = min(jobs, len(files), int(total // SHARD_SECONDS))
+    if count <= 1:
+        return [list(files)]
+    bins = [(0.0, index) for index in range(count)]
+    shards: List[List[str]] = [[] for _ in range(count)]
+    for name in sorted(files, key=lambda name: -weights[name]):
+        load, index = heapq.heappop(bins)
+        shards[index].append(name)
+        heapq.heappush(bins, (load + weights[name], index))
+    return shards
+
+
+def _get_report(in_dir: Path, name: str) -> Path:
+    """Get the path of a junit report (removing a previous one)."""
+    report = in_dir / REPORTS_DIR / f"{name}.xml"
+    report.parent.mkdir(parents=True, exist_ok=True)
+    report.unlink(missing_ok=True)
+    return report
 
 
 def run_tests(in_dir: Path) -> None:
     """Run tests in the specified directory.
 
+    With ``--record``, the results of the ``pytest`` run of the
+    project's script are recorded (see the module's docstring).
+
     Parameters
     ----------
     in_dir : Path
@@ -33,18 +296,254 @@ def run_tests(in_dir: Path) -> None:
     test_py_script = in_dir / "scripts" / "test.py"
     if not test_py_script.exists():
         raise FileNotFoundError(f"test.py not found in {in_dir}")
-    run_command([sys.executable, str(test_py_script)], cwd=in_dir)
+    command = [sys.executable, str(test_py_script)]
+    if "--record" not in sys.argv:
+        run_command(command, cwd=in_dir)
+    else:
+        report = _get_report(in_dir, "all")
+        data_file = in_dir / COVERAGE_DIR / "all"
+        try:
+            run_command(command, cwd=in_dir, env=_get_env(report, data_file))
+        finally:
+            record_run(in_dir, report, data_file)
     # also gather lcov.info in the coverage directory
     lcov_info = in_dir / "coverage" / "lcov.info"
     if not lcov_info.exists():
         raise FileNotFoundError(f"lcov.info not found in {in_dir}")
-    # later: gather all lcov.info files and merge them (in root/coverage)
+
+
+def _get_shard_lcov(in_dir: Path, index: int) -> Path:
+    """Get the coverage report of a shard."""
+    return in_dir / "coverage" / "shards" / f"lcov-{index}.info"
+
+
+def run_shard(in_dir: Path, index: int, files: Sequence[str]) -> None:
+    """Run a shard of a project's tests with pytest.
+
+    Parameters
+    ----------
+    in_dir : Path
+        The project directory.
+    index : int
+        The shard's index.
+    files : Sequence[str]
+        The test files (or test ids) of the shard.
+    """
+    lcov = _get_shard_lcov(in_dir, index)
+    lcov.parent.mkdir(parents=True, exist_ok=True)
+    lcov.unlink(missing_ok=True)
+    report = _get_report(in_dir, f"shard-{index}")
+    data_file = in_dir / COVERAGE_DIR / f"shard-{index}"
+    try:
+        run_command(
+            [
+                sys.executable,
+                "-m",
+                "pytest",
+                "--cov",
+                f"--cov-report=lcov:{lcov}",
+            ]
+            + list(files),
+            cwd=in_dir,
+            env=_get_env(report, data_file),
+        )
+    finally:
+        record_run(in_dir, report, data_file)
+
+
+def merge_shards(in_dir: Path, count: int, output: Path) -> None:
+    """Merge the coverage reports of a project's shards.
+
+    Parameters
+    ----------
+    in_dir : Path
+        The project directory.
+    count : int
+        The number of shards.
+    output : Path
+        The merged report.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the coverage report of a shard is not found.
+    """
+    lcov_files = [_get_shard_lcov(in_dir, index) for index in range(count)]
+    for lcov in lcov_files:
+        if not lcov.exists():
+            raise FileNotFoundError(f"{lcov} not found")
+    merge_lcov([(lcov, in_dir) for lcov in lcov_files], output, in_dir)
+
+
+def _get_upstream_changes(
+    project: Path, ref: str
+) -> Optional[Dict[Path, Set[int]]]:
+    """Get the changed lines of the projects a project depends on."""
+    changed: Dict[Path, Set[int]] = {}
+    for dependency in get_workspace().get_upstream(project):
+        changed_lines = get_changed_lines(dependency, ref)
+        if changed_lines is None:
+            return None
+        # the dependency's own tests and docs do not affect this project
+        ignored = [dependency.resolve() / name for name in ("tests", "docs")]
+        changed.update(
+            (path, lines)
+            for path, lines in changed_lines.items()
+            if not any(path.is_relative_to(other) for other in ignored)
+        )
+    return changed
+
+
+def select_tests(project: Path, ref: str) -> Optional[List[str]]:
+    """Select the tests of a project affected by the changes since a ref.
+
+    The changes of the projects it depends on are included.
+
+    Parameters
+    ----------
+    project : Path
+        The project directory.
+    ref : str
+        The git ref to compare against (its merge base).
+
+    Returns
+    -------
+    Optional[List[str]]
+        The test files and test ids to run, None to run everything.
+    """
+    changed_lines = get_changed_lines(project, ref)
+    upstream_lines = _get_upstream_changes(project, ref)
+    if changed_lines is None or upstream_lines is None:
+        return None
+    changed_lines.update(upstream_lines)
+    project_dir = project.resolve()
+    # as in the index, the dependencies' files are relative (../core/...)
+    changed = {
+        Path(os.path.relpath(path, project_dir)).as_posix(): lines
+        for path, lines in changed_lines.items()
+    }
+    return ImpactIndex(project).select(changed, find_test_files(project))
+
+
+def _get_shard_tasks(
+    name: str, project: Path, shards: List[List[str]], output: Path
+) -> List[Task]:
+    """Get a task per shard and a task that merges their results."""
+    tasks = [
+        Task(f"{name}#{index}", partial(run_shard, project, index, shard))
+        for index, shard in enumerate(shards)
+    ]
+    tasks.append(
+        Task(
+            name,
+            partial(merge_shards, project, len(shards), output),
+            tuple(task.name for task in tasks),
+        )
+    )
+    return tasks
+
+
+def get_project_tasks(project: Path, jobs: int) -> List[Task]:
+    """Get the test tasks of a project (its shards and their merge).
+
+    Parameters
+    ----------
+    project : Path
+        The project directory.
+    jobs : int
+        The maximum number of shards.
+
+    Returns
+    -------
+    List[Task]
+        A single task, or one task per shard and a task that
+        depends on them.
+    """
+    name = get_task_name("test", project)
+    if not has_pytest_cov():
+        # the shards need it, run the project's own script
+        return [Task(name, partial(run_tests, project))]
+    durations: Dict[str, float] = load_json(project / DURATIONS_FILE, {})
+    ref = get_arg_value("--affected-by")
+    selected = select_tests(project, ref) if ref else None
+    if selected is not None:
+        if not selected:
+            message = f"No tests affected in {project}, skipping ..."
+            return [Task(name, partial(emit, message))]
+        # a partial run, do not replace the coverage of the whole suite
+        return _get_shard_tasks(
+            name,
+            project,
+            plan_shards(selected, durations, jobs),
+            project / "coverage" / "lcov-affected.info",
+        )
+    files = [] if "--no-shard" in sys.argv else find_test_files(project)
+    shards = plan_shards(files, durations, jobs) if files else []
+    if len(shards) <= 1:
+        return [Task(name, partial(run_tests, project))]
+    return _get_shard_tasks(
+        name, project, shards, project / "coverage" / "lcov.info"
+    )
+
+
+def merge_coverage(projects: Sequence[Path]) -> None:
+    """Merge the projects' coverage into ``coverage/lcov.info``.
+
+    The source paths are made relative to the root directory.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories (the ones without a report are skipped).
+    """
+    inputs = [
+        (project / "coverage" / "lcov.info", project)
+        for project in projects
+        if (project / "coverage" / "lcov.info").exists()
+    ]
+    if not inputs:
+        emit("No coverage reports to merge, skipping ...")
+        return
+    output = ROOT_DIR / "coverage" / "lcov.info"
+    summary = merge_lcov(inputs, output, ROOT_DIR)
+    emit(f"Coverage ({output}): {summary.format()}")
+
+
+def get_tasks(projects: Sequence[Path]) -> List[Task]:
+    """Get the test tasks for the given projects.
+
+    Parameters
+    ----------
+    projects : Sequence[Path]
+        The project directories.
+
+    Returns
+    -------
+    List[Task]
+        The tasks of each project (independent of the other projects)
+        and a task that merges their coverage.
+    """
+    jobs = get_jobs()
+    tasks = [
+        task
+        for project in projects
+        for task in get_project_tasks(project, jobs)
+    ]
+    project_tasks = {get_task_name("test", project) for project in projects}
+    tasks.append(
+        Task(
+            get_task_name("coverage", ROOT_DIR),
+            partial(merge_coverage, projects),
+            tuple(task.name for task in tasks if task.name in project_tasks),
+        )
+    )
+    return tasks
 
 
 def main() -> None:
     """Run the tests."""
-    for project_dir in get_python_projects():
-        run_tests(project_dir)
+    projects = get_affected_projects(get_python_projects())
+    run_tasks(get_tasks(projects), jobs=get_jobs())
 
 
 if __name__ == "__main__":
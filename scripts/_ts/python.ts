@@ -1,6 +1,9 @@
 /**
  * Run python commands using the compatible python version.
  * If no virtual environment is found, it creates one.
+ * The resolved interpreter is kept in .cache/python.json (with the PATH,
+ * VIRTUAL_ENV and virtual environments it was resolved with), so later runs
+ * skip probing the interpreters.
  */
 import { execSync } from "child_process";
 import fs from "fs-extra";
@@ -14,6 +17,7 @@ const __me = path.relative(rootDir, __filename);
 const isWindows = process.platform === "win32";
 const possibleVenvNames = [".venv", "venv"];
 const possiblePys = ["python", "python3", "python3.10", "python3.11", "python3.12"];
+const stateFile = path.join(rootDir, ".cache", "python.json");
 
 /**
  * Check if the python version is greater than or equal to 3.10 and less than 3.13
@@ -126,10 +130,61 @@ function tryGetPythonExecutable(): string | null {
 }
 
 /**
- * Get the python executable
+ * Get what the python executable is resolved with
+ * @returns the PATH and VIRTUAL_ENV variables and the existing virtual environments
+ */
+function getResolveEnv() {
+    return {
+        path: process.env.PATH || "",
+        virtualEnv: process.env.VIRTUAL_ENV || "",
+        venvs: possibleVenvNames
+            .filter(venvName => fs.existsSync(path.join(rootDir, venvName)))
+            .join(","),
+    };
+}
+
+/**
+ * Get the previously resolved python executable
+ * @returns the python executable if resolved with the same environment and still existing, null otherwise
+ */
+function getCachedPythonExecutable(): string | null {
+    try {
+        const state = fs.readJsonSync(stateFile);
+        const env = getResolveEnv();
+        if (
+            typeof state.python === "string" &&
+            state.path === env.path &&
+            state.virtualEnv === env.virtualEnv &&
+            state.venvs === env.venvs &&
+            fs.existsSync(state.python)
+        ) {
+            return state.python;
+        }
+    } catch (_) {
+        // no (valid) state file
+    }
+    return null;
+}
+
+/**
+ * Remember the resolved python executable
+ * @param pythonExec the python executable (command or path)
+ */
+function cachePythonExecutable(pythonExec: string) {
+    try {
+        const toRun = "import sys; print(sys.executable)";
+        const executable = execSync(`${pythonExec} -c "${toRun}"`).toString().trim();
+        fs.outputJsonSync(stateFile, { python: executable, ...getResolveEnv() });
+    } catch (_) {
+        // not cached, resolved again next time
+    }
+}
+
+/**
+ * Resolve the python executable
  * @returns the python executable
  */
-function getPythonExecutable(): string {
+function resolvePythonExecutable(): string {
     const pythonExec = tryGetPythonExecutable();
     if (!pythonExec) {
         console.error("No compatible python found");
@@ -147,6 +202,20 @@ function getPythonExecutable(): string {
     return pythonExec;
 }
 
+/**
+ * Get the python executable
+ * @returns the python executable
+ */
+function getPythonExecutable(): string {
+    const cached = getCachedPythonExecutable();
+    if (cached) {
+        return cached;
+    }
+    const pythonExec = resolvePythonExecutable();
+    cachePythonExecutable(pythonExec);
+    return pythonExec;
+}
+
 /**
  * Show help
  */
@@ -156,7 +225,8 @@ function showHelp() {
         "\x1b[36m\nExamples: \n" +
             "\nyarn python --version\n" +
             "node --import=tsx scripts/python.ts -m pip install -r requirements/all.txt\n" +
-            "bun scripts/python.ts path/to/file.py\n",
+            "bun scripts/python.ts path/to/file.py\n" +
+            "bun python -m scripts._py format lint\n",
     );
     process.exit(0);
 }
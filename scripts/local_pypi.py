@@ -1,13 +1,45 @@
 # SPDX-License-Identifier: Apache-2.0.
 # Copyright (c) 2024 - 2025 Harmony and contributors.
-"""Start a local PyPI server for testing packages."""
+"""Start a local PyPI server for testing packages.
 
+The server is built in (asyncio, no extra dependencies): it serves
+``.local/pypi`` as a simple repository, both as PEP 503 HTML and
+PEP 691 JSON (``/simple/``), with the sha256 of each file and the
+PEP 658 core metadata of the wheels (``<file>.metadata``), so that
+the resolvers do not need to download whole wheels. The index is kept
+in memory and refreshed when the directory changes. Files can be
+uploaded (e.g. ``twine upload --repository-url http://localhost:8080``)
+and replace the existing ones with the same name.
+
+The port is ``$PYPI_SERVER_PORT`` (8080 by default) or ``--port N``
+(0 for any free port). The server writes its PID and port to
+``.local/pypi/.server.json`` once it listens::
+
+    python scripts/local_pypi.py start --background [--port N]
+    python scripts/local_pypi.py stop
+
+``--background`` returns as soon as the server answers (its output
+goes to ``.local/pypi/.server.log``) and ``stop`` gracefully stops
+exactly that process.
+"""
+
+import asyncio
+import hashlib
+import html
+import json
 import os
+import re
 import signal
 import subprocess  # nosemgrep # nosec
 import sys
+import threading
+import time
+import zipfile
+from email.parser import BytesParser
 from pathlib import Path
-from types import FrameType
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+from urllib.request import urlopen
 
 try:
     from dotenv import load_dotenv
@@ -22,48 +54,752 @@ else:
 os.environ["PYTHONUTF8"] = "1"
 os.environ["PYTHONUNBUFFERED"] = "1"
 ROOT_DIR = Path(__file__).resolve().parent.parent
+PYPI_DIR = ROOT_DIR / ".local" / "pypi"
+JSON_TYPE = "application/vnd.pypi.simple.v1+json"
+HTML_TYPE = "application/vnd.pypi.simple.v1+html"
+# seconds between checks for changes in the directory
+WATCH_INTERVAL = 1.0
+DIST_SUFFIXES = (".whl", ".tar.gz", ".zip")
+# in the served directory (ignored by the index)
+STATE_FILE_NAME = ".server.json"
+LOG_FILE_NAME = ".server.log"
+_PAGE = (
+    "<!DOCTYPE html>\n<html><head>"
+    '<meta name="pypi:repository-version" content="1.1">'
+    "<title>{title}</title></head><body>\n{body}\n</body></html>\n"
+)
+
+
+def normalize(name: str) -> str:
+    """Normalize a project name (PEP 503).
+
+    Parameters
+    ----------
+    name : str
+        The project name.
+
+    Returns
+    -------
+    str
+        The normalized name.
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
 
 
-def ensure_pypiserver_installed(py_executable: str) -> None:
-    """Ensure that the pypiserver package is installed.
+def parse_filename(filename: str) -> Tuple[str, str]:
+    """Get the project name and version of a distribution file.
 
     Parameters
     ----------
-    py_executable : str
-        Path to the Python executable.
+    filename : str
+        A wheel or sdist file name.
+
+    Returns
+    -------
+    Tuple[str, str]
+        The normalized project name and the version.
     """
+    if filename.endswith(".whl"):
+        name, version = filename.split("-")[:2]
+    else:
+        stem = (
+            filename[: -len(".tar.gz")]
+            if filename.endswith(".tar.gz")
+            else filename[: -len(".zip")]
+        )
+        name, _, version = stem.rpartition("-")
+    return normalize(name), version
+
+
+class Distribution(NamedTuple):
+    """A distribution file of the index.
+
+    Attributes
+    ----------
+    filename : str
+        The file name.
+    project : str
+        The normalized project name.
+    version : str
+        The version.
+    size : int
+        The file size.
+    mtime_ns : int
+        The file's modification time.
+    sha256 : str
+        The sha256 of the file.
+    metadata : Optional[bytes]
+        The core metadata (wheels only).
+    requires_python : Optional[str]
+        The ``Requires-Python`` of the metadata.
+    """
+
+    filename: str
+    project: str
+    version: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    metadata: Optional[bytes] = None
+    requires_python: Optional[str] = None
+
+    @property
+    def metadata_sha256(self) -> Optional[str]:
+        """Get the sha256 of the core metadata."""
+        if self.metadata is None:
+            return None
+        return hashlib.sha256(self.metadata).hexdigest()
+
+
+def _read_metadata(path: Path) -> Optional[bytes]:
+    """Get the METADATA of a wheel."""
     try:
-        subprocess.run(  # nosemgrep # nosec
-            [py_executable, "-m", "pip", "install", "pypiserver"], check=True
+        with zipfile.ZipFile(path) as wheel:
+            for name in wheel.namelist():
+                parts = name.split("/")
+                if (
+                    len(parts) == 2
+                    and parts[0].endswith(".dist-info")
+                    and parts[1] == "METADATA"
+                ):
+                    return wheel.read(name)
+    except (OSError, zipfile.BadZipFile):
+        return None
+    return None
+
+
+def read_distribution(path: Path) -> Distribution:
+    """Read (hash) a distribution file.
+
+    Parameters
+    ----------
+    path : Path
+        The file.
+
+    Returns
+    -------
+    Distribution
+        The file's entry in the index.
+    """
+    stat = path.stat()
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    metadata = _read_metadata(path) if path.name.endswith(".whl") else None
+    requires_python = None
+    if metadata is not None:
+        parsed = BytesParser().parsebytes(metadata, headersonly=True)
+        requires_python = parsed.get("Requires-Python")
+    project, version = parse_filename(path.name)
+    return Distribution(
+        filename=path.name,
+        project=project,
+        version=version,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        sha256=digest.hexdigest(),
+        metadata=metadata,
+        requires_python=requires_python,
+    )
+
+
+class PackageIndex:
+    """The in-memory index of a directory of distributions."""
+
+    def __init__(self, directory: Path) -> None:
+        """Create an (empty) index.
+
+        Parameters
+        ----------
+        directory : Path
+            The directory with the distribution files.
+        """
+        self.directory = directory
+        self.files: Dict[str, Distribution] = {}
+        self._pages: Dict[Tuple[str, bool], bytes] = {}
+        # refresh and add (in threads) must not drop each other's files
+        self._lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Re-scan the directory, only reading new or changed files.
+
+        Returns
+        -------
+        bool
+            Whether the index changed.
+        """
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> bool:
+        """Re-scan the directory (holding the lock)."""
+        files: Dict[str, Distribution] = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(DIST_SUFFIXES):
+                    continue
+                stat = entry.stat()
+                known = self.files.get(entry.name)
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if known and (known.size, known.mtime_ns) == signature:
+                    files[entry.name] = known
+                    continue
+                try:
+                    files[entry.name] = read_distribution(Path(entry.path))
+                except (OSError, ValueError):
+                    continue
+        if files == self.files:
+            return False
+        # swap (the server reads it concurrently)
+        self.files, self._pages = files, {}
+        return True
+
+    def add(self, filename: str, content: bytes) -> Distribution:
+        """Add (or replace) a distribution file.
+
+        Parameters
+        ----------
+        filename : str
+            The file name.
+        content : bytes
+            The file's content.
+
+        Returns
+        -------
+        Distribution
+            The file's entry in the index.
+        """
+        path = self.directory / filename
+        tmp_path = path.with_name(f".{filename}.{os.getpid()}.tmp")
+        with self._lock:
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, path)
+            distribution = read_distribution(path)
+            self.files = {**self.files, filename: distribution}
+            self._pages = {}
+        return distribution
+
+    def get_projects(self) -> List[str]:
+        """Get the (normalized) names of the projects.
+
+        Returns
+        -------
+        List[str]
+            The sorted project names.
+        """
+        return sorted({item.project for item in self.files.values()})
+
+    def get_files(self, project: str) -> List[Distribution]:
+        """Get the files of a project.
+
+        Parameters
+        ----------
+        project : str
+            The normalized project name.
+
+        Returns
+        -------
+        List[Distribution]
+            The project's files, sorted by name.
+        """
+        return sorted(
+            (item for item in self.files.values() if item.project == project),
+            key=lambda item: item.filename,
         )
-    except subprocess.CalledProcessError:
-        print("Failed to install pypiserver.", file=sys.stderr)
-        sys.exit(1)
 
+    def render(self, project: Optional[str], as_json: bool) -> Optional[bytes]:
+        """Render the root or a project page (cached until a change).
+
+        Parameters
+        ----------
+        project : Optional[str]
+            The normalized project name, None for the root page.
+        as_json : bool
+            Render PEP 691 JSON instead of PEP 503 HTML.
+
+        Returns
+        -------
+        Optional[bytes]
+            The page, None if the project is not in the index.
+        """
+        key = (project or "", as_json)
+        page = self._pages.get(key)
+        if page is not None:
+            return page
+        if project is None:
+            page = _render_root(self.get_projects(), as_json)
+        else:
+            files = self.get_files(project)
+            if not files:
+                return None
+            page = _render_project(project, files, as_json)
+        self._pages[key] = page
+        return page
+
+
+def _render_root(projects: List[str], as_json: bool) -> bytes:
+    """Render the list of projects."""
+    if as_json:
+        data = {
+            "meta": {"api-version": "1.1"},
+            "projects": [{"name": name} for name in projects],
+        }
+        return json.dumps(data).encode("utf-8")
+    links = "\n".join(
+        f'<a href="/simple/{name}/">{name}</a><br/>' for name in projects
+    )
+    return _PAGE.format(title="Simple index", body=links).encode("utf-8")
+
+
+def _render_project(
+    project: str, files: List[Distribution], as_json: bool
+) -> bytes:
+    """Render the files of a project."""
+    if as_json:
+        entries = []
+        for item in files:
+            entry: Dict[str, object] = {
+                "filename": item.filename,
+                "url": f"/packages/{item.filename}",
+                "hashes": {"sha256": item.sha256},
+                "size": item.size,
+            }
+            if item.requires_python:
+                entry["requires-python"] = item.requires_python
+            if item.metadata is not None:
+                entry["core-metadata"] = {"sha256": item.metadata_sha256}
+                entry["dist-info-metadata"] = {"sha256": item.metadata_sha256}
+            entries.append(entry)
+        data = {
+            "meta": {"api-version": "1.1"},
+            "name": project,
+            "files": entries,
+            "versions": sorted({item.version for item in files}),
+        }
+        return json.dumps(data).encode("utf-8")
+    links = []
+    for item in files:
+        attributes = f'href="/packages/{item.filename}#sha256={item.sha256}"'
+        if item.requires_python:
+            attributes += (
+                f' data-requires-python="{html.escape(item.requires_python)}"'
+            )
+        if item.metadata is not None:
+            value = f"sha256={item.metadata_sha256}"
+            attributes += f' data-core-metadata="{value}"'
+            attributes += f' data-dist-info-metadata="{value}"'
+        links.append(f"<a {attributes}>{item.filename}</a><br/>")
+    body = "\n".join([f"<h1>Links for {project}</h1>"] + links)
+    title = f"Links for {project}"
+    return _PAGE.format(title=title, body=body).encode("utf-8")
 
-def start_pypi_server(py_executable: str) -> None:
-    """Start the PyPI server in the foreground with signal handling.
+
+def wants_json(accept: str) -> bool:
+    """Negotiate the format of a page from an Accept header (PEP 691).
 
     Parameters
     ----------
-    py_executable : str
-        Path to the Python executable
+    accept : str
+        The Accept header.
+
+    Returns
+    -------
+    bool
+        Whether JSON is preferred over HTML.
     """
-    root_dir = Path(__file__).resolve().parent.parent
-    local_pypi_dir = root_dir / ".local" / "pypi"
-    local_pypi_dir.mkdir(parents=True, exist_ok=True)
+    best_json, best_html = 0.0, 0.0
+    for item in accept.split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type == JSON_TYPE:
+            best_json = max(best_json, quality)
+        elif media_type in (HTML_TYPE, "text/html", "*/*"):
+            best_html = max(best_html, quality)
+    return best_json > 0 and best_json >= best_html
+
+
+class _Request(NamedTuple):
+    """An HTTP request."""
+
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: bytes
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[_Request]:
+    """Read a request, None if the connection was closed."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except (
+        asyncio.IncompleteReadError,
+        asyncio.LimitOverrunError,
+        ConnectionError,
+    ):
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _ = (lines[0].split(" ", 2) + ["", ""])[:3]
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0") or 0)
+    body = await reader.readexactly(length) if length else b""
+    return _Request(method, unquote(urlsplit(target).path), headers, body)
+
+
+async def _send(
+    writer: asyncio.StreamWriter,
+    status: str,
+    body: bytes = b"",
+    headers: Optional[Dict[str, str]] = None,
+) -> None:
+    """Send a response with a body."""
+    lines = [f"HTTP/1.1 {status}", f"Content-Length: {len(body)}"]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def _send_file(
+    writer: asyncio.StreamWriter, path: Path, head: bool
+) -> None:
+    """Send a file, zero-copy (sendfile) where the platform allows it."""
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        lines = [
+            "HTTP/1.1 200 OK",
+            f"Content-Length: {size}",
+            "Content-Type: application/octet-stream",
+        ]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+        if not head:
+            loop = asyncio.get_running_loop()
+            await loop.sendfile(writer.transport, file, 0, size)
+
+
+def _parse_upload(request: _Request) -> Optional[Tuple[str, bytes]]:
+    """Get the file name and content of an upload (multipart form)."""
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        return None
+    head = f"Content-Type: {content_type}\r\n\r\n".encode("latin-1")
+    message = BytesParser().parsebytes(head + request.body)
+    for part in message.walk():
+        if part.get_param("name", header="content-disposition") != "content":
+            continue
+        filename = part.get_filename()
+        content = part.get_payload(decode=True)
+        if filename and isinstance(content, bytes):
+            return Path(filename).name, content
+    return None
+
+
+class IndexServer:
+    """The HTTP server of a package index."""
+
+    def __init__(self, index: PackageIndex, overwrite: bool = True) -> None:
+        """Create the server.
+
+        Parameters
+        ----------
+        index : PackageIndex
+            The index to serve.
+        overwrite : bool
+            Whether uploads can replace existing files.
+        """
+        self.index = index
+        self.overwrite = overwrite
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve the requests of a (keep-alive) connection.
 
-    port = os.getenv("PYPI_SERVER_PORT", "8080")
+        Parameters
+        ----------
+        reader : asyncio.StreamReader
+            The connection's reader.
+        writer : asyncio.StreamWriter
+            The connection's writer.
+        """
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                await self.respond(request, writer)
+                if request.headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(
+        self, request: _Request, writer: asyncio.StreamWriter
+    ) -> None:
+        """Respond to a request.
+
+        Parameters
+        ----------
+        request : _Request
+            The request.
+        writer : asyncio.StreamWriter
+            The connection's writer.
+        """
+        path = request.path
+        if request.method == "POST":
+            await self._upload(request, writer)
+        elif request.method not in ("GET", "HEAD"):
+            await _send(writer, "405 Method Not Allowed")
+        elif path in ("", "/"):
+            await _send(
+                writer, "303 See Other", headers={"Location": "/simple/"}
+            )
+        elif path.startswith("/packages/"):
+            await self._serve_file(path[len("/packages/") :], request, writer)
+        elif path.startswith("/simple/"):
+            await self._serve_page(request, writer)
+        else:
+            await _send(writer, "404 Not Found")
+
+    async def _serve_page(
+        self, request: _Request, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve the root or a project page."""
+        name = request.path[len("/simple/") :].strip("/")
+        if name and (name != normalize(name) or not request.path.endswith("/")):
+            await _send(
+                writer,
+                "301 Moved Permanently",
+                headers={"Location": f"/simple/{normalize(name)}/"},
+            )
+            return
+        as_json = wants_json(request.headers.get("accept", ""))
+        page = self.index.render(name or None, as_json)
+        if page is None:
+            await _send(writer, "404 Not Found")
+            return
+        content_type = JSON_TYPE if as_json else "text/html; charset=utf-8"
+        await _send(
+            writer,
+            "200 OK",
+            b"" if request.method == "HEAD" else page,
+            {"Content-Type": content_type, "Vary": "Accept"},
+        )
+
+    async def _serve_file(
+        self, filename: str, request: _Request, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve a distribution file or its core metadata."""
+        if filename.endswith(".metadata"):
+            item = self.index.files.get(filename[: -len(".metadata")])
+            if item is None or item.metadata is None:
+                await _send(writer, "404 Not Found")
+                return
+            body = b"" if request.method == "HEAD" else item.metadata
+            await _send(writer, "200 OK", body, {"Content-Type": "text/plain"})
+            return
+        if filename not in self.index.files:
+            await _send(writer, "404 Not Found")
+            return
+        await _send_file(
+            writer, self.index.directory / filename, request.method == "HEAD"
+        )
+
+    async def _upload(
+        self, request: _Request, writer: asyncio.StreamWriter
+    ) -> None:
+        """Store an uploaded file."""
+        upload = _parse_upload(request)
+        if upload is None or not upload[0].endswith(DIST_SUFFIXES):
+            await _send(writer, "400 Bad Request")
+            return
+        filename, content = upload
+        if not self.overwrite and filename in self.index.files:
+            await _send(writer, "409 Conflict")
+            return
+        await asyncio.to_thread(self.index.add, filename, content)
+        print(f"Uploaded {filename}")
+        await _send(writer, "200 OK")
+
+
+async def watch(index: PackageIndex, interval: float = WATCH_INTERVAL) -> None:
+    """Refresh an index when its directory changes.
+
+    Parameters
+    ----------
+    index : PackageIndex
+        The index.
+    interval : float
+        Seconds between checks.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        # cheap (a directory scan), only new or changed files are read
+        await asyncio.to_thread(index.refresh)
+
+
+async def serve(port: int, directory: Path) -> None:
+    """Serve a directory as a package index until cancelled.
+
+    The server's PID and port are written to the state file
+    (``.server.json`` in the directory) once it listens.
+
+    Parameters
+    ----------
+    port : int
+        The port to listen on (0 for any free port).
+    directory : Path
+        The directory with the distribution files.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    index = PackageIndex(directory)
+    index.refresh()
+    server = await asyncio.start_server(
+        IndexServer(index).handle, "0.0.0.0", port  # nosec
+    )
+    port = server.sockets[0].getsockname()[1]
+    state_file = directory / STATE_FILE_NAME
+    write_state(state_file, {"pid": os.getpid(), "port": port})
+    url = f"http://localhost:{port}/simple/"
+    print(f"PyPI server listening on {url} ({len(index.files)} files)")
+    try:
+        async with server:
+            await asyncio.gather(server.serve_forever(), watch(index))
+    finally:
+        if (read_state(state_file) or {}).get("pid") == os.getpid():
+            state_file.unlink(missing_ok=True)
+
+
+def get_port() -> int:
+    """Get the port to listen on.
+
+    Returns
+    -------
+    int
+        ``--port N``, ``$PYPI_SERVER_PORT`` or 8080.
+    """
+    if "--port" in sys.argv[:-1]:
+        return int(sys.argv[sys.argv.index("--port") + 1])
+    return int(os.getenv("PYPI_SERVER_PORT", "8080"))
+
+
+def write_state(path: Path, state: Dict[str, int]) -> None:
+    """Atomically write the server's state file.
+
+    Parameters
+    ----------
+    path : Path
+        The state file.
+    state : Dict[str, int]
+        The server's ``pid`` and ``port``.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def read_state(path: Path) -> Optional[Dict[str, int]]:
+    """Read the server's state file.
+
+    Parameters
+    ----------
+    path : Path
+        The state file.
+
+    Returns
+    -------
+    Optional[Dict[str, int]]
+        The server's ``pid`` and ``port``, None if there is none
+        (or it is malformed).
+    """
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return {"pid": int(data["pid"]), "port": int(data["port"])}
+    except (OSError, KeyError, ValueError, TypeError):
+        return None
+
+
+def is_ready(port: int, timeout: float = 1.0) -> bool:
+    """Check if the server answers on a port (the readiness probe).
+
+    Parameters
+    ----------
+    port : int
+        The port.
+    timeout : float
+        Seconds to wait for the answer.
+
+    Returns
+    -------
+    bool
+        Whether ``/simple/`` answered with 200.
+    """
+    url = f"http://127.0.0.1:{port}/simple/"
+    try:
+        with urlopen(url, timeout=timeout) as response:  # nosec
+            return bool(response.status == 200)
+    except OSError:
+        return False
+
+
+def _is_alive(pid: int) -> bool:
+    """Check if a process is still running."""
+    if sys.platform == "win32":
+        # os.kill(pid, 0) would terminate it, rely on the probe
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def get_running_server() -> Optional[Dict[str, int]]:
+    """Get the state of the running (and answering) server.
+
+    Returns
+    -------
+    Optional[Dict[str, int]]
+        The server's ``pid`` and ``port``, None if not running.
+    """
+    state = read_state(PYPI_DIR / STATE_FILE_NAME)
+    if state is None or not _is_alive(state["pid"]):
+        return None
+    return state if is_ready(state["port"]) else None
+
+
+def start_pypi_server(port: int) -> None:
+    """Start the PyPI server in the foreground with signal handling.
+
+    Parameters
+    ----------
+    port : int
+        The port to listen on.
+    """
     print(f"Starting PyPI server on port {port}...")
 
-    def cleanup_and_exit(signum: int, frame: FrameType) -> None:
+    def cleanup_and_exit(signum: int, frame: object) -> None:
         """Cleanup logic for signal termination.
 
         Parameters
         ----------
         signum : int
             Signal number
-        frame : signal.FrameType
+        frame : object
             Signal frame
         """
         print("\nReceived termination signal. Stopping PyPI server...")
@@ -72,90 +808,107 @@ def start_pypi_server(py_executable: str) -> None:
     # Register signal handlers for graceful shutdown
     signal.signal(signal.SIGTERM, cleanup_and_exit)
     signal.signal(signal.SIGINT, cleanup_and_exit)
-
     try:
-        subprocess.run(
-            [
-                py_executable,
-                "-m",
-                "pypiserver",
-                "run",
-                "-p",
-                port,
-                "-a",
-                ".",
-                "-P",
-                ".",
-                "--overwrite",
-                str(local_pypi_dir),
-            ],
-            check=True,
-        )
-    except subprocess.CalledProcessError as e:
+        asyncio.run(serve(port, PYPI_DIR))
+    except OSError as e:
         print(f"Error starting PyPI server: {e}", file=sys.stderr)
         sys.exit(1)
 
 
-def _stop_using_tasklist() -> None:
-    cmd = [
-        "powershell",
-        "-Command",
-        "Get-CimInstance Win32_Process | Where-Object { $_.CommandLine -match 'pypi-server' } | Select-Object -ExpandProperty ProcessId",  # noqa: E501
-    ]
-    try:
-        result = subprocess.run(  # nosemgrep # nosec
-            cmd,
-            shell=True,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        if result.stdout.strip():
-            pid_entries = result.stdout.decode("utf-8").strip().split("\n")
-            for pid_entry in pid_entries:
-                try:
-                    subprocess.run(  # nosemgrep # nosec
-                        ["taskkill", "/F", "/PID", pid_entry], check=True
-                    )
-                except BaseException:
-                    pass
-            print("Stopped PyPI server.")
-    except BaseException:
-        pass
+def start_in_background(port: int, timeout: float = 10.0) -> Dict[str, int]:
+    """Start the PyPI server in the background, once it is ready.
 
+    Parameters
+    ----------
+    port : int
+        The port to listen on (0 for any free port).
+    timeout : float
+        Seconds to wait for the server to answer.
 
-def _stop_using_ps() -> None:
-    """Stop the PyPI server using the `ps` command."""
-    cmd = "ps aux | grep -v grep | grep pypiserver | awk '{print $2}' | xargs kill -9 > /dev/null 2>&1 || true"  # noqa: E501
-    try:
-        subprocess.run(cmd, shell=True, check=True)  # nosemgrep # nosec
-    except BaseException:
-        pass
+    Returns
+    -------
+    Dict[str, int]
+        The server's ``pid`` and ``port``.
+
+    Raises
+    ------
+    RuntimeError
+        If the server exited or did not answer in time.
+    """
+    running = get_running_server()
+    if running is not None:
+        print(f"PyPI server already running on port {running['port']}")
+        return running
+    PYPI_DIR.mkdir(parents=True, exist_ok=True)
+    state_file = PYPI_DIR / STATE_FILE_NAME
+    state_file.unlink(missing_ok=True)
+    log_file = PYPI_DIR / LOG_FILE_NAME
+    with open(log_file, "wb") as log:
+        process = subprocess.Popen(  # nosemgrep # nosec
+            [sys.executable, __file__, "start", "--port", str(port)],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        state = read_state(state_file)
+        if state and state["pid"] == process.pid and is_ready(state["port"]):
+            print(f"PyPI server (pid {process.pid}) ready on {state['port']}")
+            return state
+        time.sleep(0.05)
+    if process.poll() is None:
+        process.terminate()
+    output = log_file.read_text(encoding="utf-8", errors="replace")
+    raise RuntimeError(f"The PyPI server did not start:\n{output}")
 
 
-def stop_pypi_server() -> None:
-    """Stop the PyPI server if it is running."""
-    if sys.platform == "win32":
-        _stop_using_tasklist()
+def stop_pypi_server(timeout: float = 5.0) -> None:
+    """Stop the PyPI server of the state file (if it is running).
+
+    Parameters
+    ----------
+    timeout : float
+        Seconds to wait for it to exit before killing it.
+    """
+    state_file = PYPI_DIR / STATE_FILE_NAME
+    state = read_state(state_file)
+    if state is None or not _is_alive(state["pid"]):
+        print("PyPI server is not running.")
+        state_file.unlink(missing_ok=True)
         return
-    _stop_using_ps()
+    pid = state["pid"]
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError:
+        pass
+    deadline = time.monotonic() + timeout
+    while _is_alive(pid) and time.monotonic() < deadline:
+        if sys.platform == "win32" and not is_ready(state["port"], 0.2):
+            break
+        time.sleep(0.05)
+    if sys.platform != "win32" and _is_alive(pid):
+        os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+    state_file.unlink(missing_ok=True)
+    print(f"Stopped PyPI server (pid {pid}).")
 
 
 def main() -> None:
-    """Start a local PyPI server."""
+    """Start (``--background`` to return once ready) or stop the server."""
     if "stop" in sys.argv:
         stop_pypi_server()
         return
-    venv_path = ROOT_DIR / ".venv"
-    py_executable = (
-        venv_path / "Scripts" / "python.exe"
-        if os.name == "nt"
-        else venv_path / "bin" / "python"
-    )
-    if not py_executable.exists():
-        py_executable = sys.executable
-    ensure_pypiserver_installed(py_executable)
-    start_pypi_server(py_executable)
+    if "--background" in sys.argv:
+        try:
+            start_in_background(get_port())
+        except RuntimeError as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+        return
+    start_pypi_server(get_port())
 
 
 if __name__ == "__main__":
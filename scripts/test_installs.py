@@ -1,10 +1,520 @@
 # SPDX-License-Identifier: Apache-2.0.
 # Copyright (c) 2024 - 2025 Harmony and contributors.
-"""Test installs using local pypi server."""
+"""Test installs using local pypi server.
+
+Every package in the local index (``.local/pypi``, seeded from
+``dist/`` if empty) is installed, pinned to the version of its newest
+wheel there (not a newer release from the other index), without and
+with each of its extras, with each of the python 3.10/3.11/3.12
+interpreters found locally, in its own virtual environment. The
+environments are clones (hard links, copies of the few files that
+name their location) of a template environment created once per
+interpreter, instead of a new ``venv`` and pip bootstrap each time.
+The installs run concurrently (``--jobs N``) from the local index
+(started in the background if it is not running), sharing a single
+wheel cache. In each environment the package's modules are imported
+and its commands are run with ``--help`` (``harmony convert --help``).
+
+Options: ``--python 3.11`` and ``--package <name>`` (repeatable) to
+narrow the matrix, ``--keep`` to keep the environments.
+"""
 
 import os
+import shutil
+import subprocess  # nosemgrep # nosec
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from local_pypi import (
+    PYPI_DIR,
+    PackageIndex,
+    get_running_server,
+    start_in_background,
+    stop_pypi_server,
+)
 
 os.environ["PYTHONUTF8"] = "1"
 os.environ["PYTHONUNBUFFERED"] = "1"
+ROOT_DIR = Path(__file__).resolve().parent.parent
+WORK_DIR = ROOT_DIR / ".cache" / "install-tests"
+PYTHON_VERSIONS = ("3.10", "3.11", "3.12")
+# the arguments to check each command with (default: --help)
+COMMAND_CHECKS: Dict[str, List[str]] = {"harmony": ["convert", "--help"]}
+# where the other requirements come from
+FALLBACK_INDEX_URL = "https://pypi.org/simple"
+
+
+class Interpreter(NamedTuple):
+    """A local python interpreter."""
+
+    version: str
+    executable: str
+
+
+class Package(NamedTuple):
+    """A package of the local index (from its newest wheel)."""
+
+    name: str
+    version: str
+    extras: Tuple[str, ...]
+    modules: Tuple[str, ...]
+    commands: Tuple[str, ...]
+
+
+class Result(NamedTuple):
+    """The outcome of an install test."""
+
+    label: str
+    ok: bool
+    seconds: float
+    output: str
+
+
+def get_arg_values(name: str) -> List[str]:
+    """Get the values of a (repeatable) command line option.
+
+    Parameters
+    ----------
+    name : str
+        The option, e.g. ``--python``.
+
+    Returns
+    -------
+    List[str]
+        Its values.
+    """
+    return [
+        sys.argv[index + 1]
+        for index, arg in enumerate(sys.argv[:-1])
+        if arg == name
+    ]
+
+
+def find_interpreters(versions: Sequence[str]) -> List[Interpreter]:
+    """Find the local interpreters of some python versions.
+
+    Parameters
+    ----------
+    versions : Sequence[str]
+        The versions, e.g. ``3.11``.
+
+    Returns
+    -------
+    List[Interpreter]
+        The interpreters found (with their real executables).
+    """
+    found = []
+    for version in versions:
+        candidates = [shutil.which(f"python{version}")]
+        if sys.version.startswith(f"{version}."):
+            candidates.insert(0, sys.executable)
+        for candidate in filter(None, candidates):
+            try:
+                executable = subprocess.run(  # nosemgrep # nosec
+                    [candidate, "-c", "import sys; print(sys.executable)"],
+                    check=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    encoding="utf-8",
+                ).stdout.strip()
+            except (OSError, subprocess.CalledProcessError):
+                continue
+            found.append(Interpreter(version, executable))
+            break
+    return found
+
+
+def _read_wheel(path: Path) -> Package:
+    """Get the extras, top level modules and commands of a wheel."""
+    with zipfile.ZipFile(path) as wheel:
+        names = wheel.namelist()
+        dist_info = next(
+            name.split("/")[0]
+            for name in names
+            if name.split("/")[0].endswith(".dist-info")
+        )
+        metadata = BytesParser().parsebytes(
+            wheel.read(f"{dist_info}/METADATA"), headersonly=True
+        )
+        try:
+            entry_points = wheel.read(f"{dist_info}/entry_points.txt")
+        except KeyError:
+            entry_points = b""
+    modules = {
+        name.split("/")[0].removesuffix(".py")
+        for name in names
+        if not name.split("/")[0].endswith((".dist-info", ".data"))
+        and (name.endswith(".py") or "/" in name)
+    }
+    commands, section = [], ""
+    for line in entry_points.decode("utf-8").splitlines():
+        line = line.strip()
+        if line.startswith("["):
+            section = line.strip("[]")
+        elif section == "console_scripts" and "=" in line:
+            commands.append(line.split("=", 1)[0].strip())
+    return Package(
+        name=str(metadata["Name"]),
+        version=str(metadata["Version"]),
+        extras=tuple(metadata.get_all("Provides-Extra") or []),
+        modules=tuple(sorted(modules)),
+        commands=tuple(commands),
+    )
+
+
+def seed_index() -> None:
+    """Copy the built packages (``dist/``) to the index if it is empty."""
+    PYPI_DIR.mkdir(parents=True, exist_ok=True)
+    index = PackageIndex(PYPI_DIR)
+    index.refresh()
+    if index.files:
+        return
+    for path in sorted((ROOT_DIR / "dist").glob("*/*")):
+        if path.name.endswith((".whl", ".tar.gz")):
+            shutil.copy2(path, PYPI_DIR / path.name)
+
+
+def get_packages(names: Sequence[str]) -> List[Package]:
+    """Get the packages of the local index.
+
+    Parameters
+    ----------
+    names : Sequence[str]
+        Only these packages (all if empty).
+
+    Returns
+    -------
+    List[Package]
+        The packages with a wheel (their newest one).
+    """
+    index = PackageIndex(PYPI_DIR)
+    index.refresh()
+    wanted = {name.lower().replace("_", "-") for name in names}
+    packages = []
+    for project in index.get_projects():
+        if wanted and project not in wanted:
+            continue
+        wheels = [
+            item.filename
+            for item in index.get_files(project)
+            if item.filename.endswith(".whl")
+        ]
+        if wheels:
+            newest = max(wheels, key=lambda name: index.files[name].mtime_ns)
+            packages.append(_read_wheel(PYPI_DIR / newest))
+    return packages
+
+
+def _use_uv() -> bool:
+    """Check if uv is available (it does not need pip in the venvs)."""
+    try:
+        subprocess.run(  # nosemgrep # nosec
+            [sys.executable, "-m", "uv", "--version"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+def get_env_python(env_dir: Path) -> Path:
+    """Get the interpreter of a virtual environment.
+
+    Parameters
+    ----------
+    env_dir : Path
+        The environment directory.
+
+    Returns
+    -------
+    Path
+        Its python executable.
+    """
+    if sys.platform == "win32":
+        return env_dir / "Scripts" / "python.exe"
+    return env_dir / "bin" / "python"
+
+
+def get_template(interpreter: Interpreter, with_pip: bool) -> Path:
+    """Get (create once) the template environment of an interpreter.
+
+    Parameters
+    ----------
+    interpreter : Interpreter
+        The interpreter.
+    with_pip : bool
+        Whether to bootstrap pip in it.
+
+    Returns
+    -------
+    Path
+        The template environment.
+    """
+    template = WORK_DIR / f"template-{interpreter.version}"
+    marker = template / ".template"
+    expected = f"{interpreter.executable}\n{with_pip}\n"
+    if marker.exists() and marker.read_text(encoding="utf-8") == expected:
+        return template
+    shutil.rmtree(template, ignore_errors=True)
+    args = [interpreter.executable, "-m", "venv", str(template)]
+    subprocess.run(  # nosemgrep # nosec
+        args if with_pip else args + ["--without-pip"],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    marker.write_text(expected, encoding="utf-8")
+    return template
+
+
+def _link_or_copy(source: str, destination: str) -> None:
+    """Hard link a file, copy it if it cannot be linked."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def clone_env(template: Path, env_dir: Path) -> None:
+    """Clone a template environment.
+
+    The files are hard linked (installs replace files, they never
+    write into them), but the text files that name the template's
+    location (``pyvenv.cfg``, the scripts), which are rewritten.
+
+    Parameters
+    ----------
+    template : Path
+        The template environment.
+    env_dir : Path
+        The new environment.
+    """
+    shutil.rmtree(env_dir, ignore_errors=True)
+    shutil.copytree(
+        template,
+        env_dir,
+        symlinks=True,
+        copy_function=_link_or_copy,
+        ignore=shutil.ignore_patterns(".template", "__pycache__"),
+    )
+    old, new = str(template).encode(), str(env_dir).encode()
+    scripts = env_dir / ("Scripts" if sys.platform == "win32" else "bin")
+    for path in [env_dir / "pyvenv.cfg"] + list(scripts.iterdir()):
+        if path.is_symlink() or not path.is_file():
+            continue
+        content = path.read_bytes()
+        if old in content and b"\0" not in content:
+            # a new file, not the (linked) template's
+            mode = path.stat().st_mode
+            path.unlink()
+            path.write_bytes(content.replace(old, new))
+            path.chmod(mode)
+
+
+def _run(args: List[str], env: Dict[str, str]) -> str:
+    """Run a command, raising with its output if it fails."""
+    result = subprocess.run(  # nosemgrep # nosec
+        args,
+        check=False,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        encoding="utf-8",
+        errors="replace",
+        env=env,
+    )
+    if result.returncode:
+        raise RuntimeError(f"$ {' '.join(args)}\n{result.stdout}")
+    return result.stdout
+
+
+def _get_install_command(
+    python: Path, requirement: str, port: int, use_uv: bool
+) -> List[str]:
+    """Get the command that installs a requirement in an environment."""
+    extra_index_url = os.environ.get(
+        "PIP_EXTRA_INDEX_URL",
+        os.environ.get("PIP_INDEX_URL", FALLBACK_INDEX_URL),
+    )
+    index_args = [
+        "--index-url",
+        f"http://127.0.0.1:{port}/simple/",
+        "--extra-index-url",
+        extra_index_url,
+    ]
+    if use_uv:
+        return [
+            sys.executable,
+            "-m",
+            "uv",
+            "pip",
+            "install",
+            "--python",
+            str(python),
+            "--cache-dir",
+            str(WORK_DIR / "uv-cache"),
+            # our index first, then the others
+            "--index-strategy",
+            "unsafe-first-match",
+            requirement,
+        ] + index_args
+    return [
+        str(python),
+        "-m",
+        "pip",
+        "install",
+        "--disable-pip-version-check",
+        "--cache-dir",
+        str(WORK_DIR / "pip-cache"),
+        requirement,
+    ] + index_args
+
+
+def _get_checks(package: Package, python: Path) -> List[List[str]]:
+    """Get the smoke checks of a package (imports and commands)."""
+    checks = []
+    if package.modules:
+        imports = "; ".join(f"import {name}" for name in package.modules)
+        checks.append([str(python), "-c", imports])
+    for command in package.commands:
+        executable = shutil.which(command, path=str(python.parent))
+        checks.append(
+            [executable or command] + COMMAND_CHECKS.get(command, ["--help"])
+        )
+    return checks
+
+
+def _install_and_check(
+    package: Package, requirement: str, env_dir: Path, port: int, use_uv: bool
+) -> str:
+    """Install a requirement in an environment and smoke check it."""
+    python = get_env_python(env_dir)
+    env = dict(os.environ, VIRTUAL_ENV=str(env_dir))
+    output = _run(_get_install_command(python, requirement, port, use_uv), env)
+    for check in _get_checks(package, python):
+        output += _run(check, env)
+    return output
+
+
+def check_install(
+    package: Package,
+    extra: Optional[str],
+    interpreter: Interpreter,
+    port: int,
+    use_uv: bool,
+) -> Result:
+    """Install a package in a new environment and smoke check it.
+
+    Parameters
+    ----------
+    package : Package
+        The package.
+    extra : Optional[str]
+        The extra to install, if any.
+    interpreter : Interpreter
+        The interpreter of the environment.
+    port : int
+        The local index's port.
+    use_uv : bool
+        Install with uv instead of pip.
+
+    Returns
+    -------
+    Result
+        The outcome.
+    """
+    name = f"{package.name}[{extra}]" if extra else package.name
+    # the local index's version, not a newer one from the other index
+    requirement = f"{name}=={package.version}"
+    label = f"{requirement} (python {interpreter.version})"
+    start = time.monotonic()
+    env_dir = (
+        WORK_DIR
+        / "envs"
+        / (f"{package.name}-{extra or 'base'}-{interpreter.version}")
+    )
+    try:
+        clone_env(get_template(interpreter, not use_uv), env_dir)
+        output = _install_and_check(package, requirement, env_dir, port, use_uv)
+    except (OSError, RuntimeError, subprocess.CalledProcessError) as error:
+        return Result(label, False, time.monotonic() - start, str(error))
+    finally:
+        if "--keep" not in sys.argv:
+            shutil.rmtree(env_dir, ignore_errors=True)
+    return Result(label, True, time.monotonic() - start, output)
+
+
+def run_matrix(port: int) -> List[Result]:
+    """Run the install tests of the whole matrix.
+
+    Parameters
+    ----------
+    port : int
+        The local index's port.
+
+    Returns
+    -------
+    List[Result]
+        The outcome of each test.
+    """
+    interpreters = find_interpreters(
+        get_arg_values("--python") or PYTHON_VERSIONS
+    )
+    packages = get_packages(get_arg_values("--package"))
+    use_uv = _use_uv()
+    # the templates first (once per interpreter, not per test)
+    for interpreter in interpreters:
+        get_template(interpreter, not use_uv)
+    matrix = [
+        (package, extra, interpreter)
+        for package in packages
+        for extra in (None,) + package.extras
+        for interpreter in interpreters
+    ]
+    print(
+        f"Testing {len(matrix)} installs ({len(packages)} packages, "
+        f"python {', '.join(item.version for item in interpreters)}) ..."
+    )
+    jobs = int((get_arg_values("--jobs") or [str(os.cpu_count() or 1)])[0])
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [
+            executor.submit(check_install, *cell, port, use_uv)
+            for cell in matrix
+        ]
+        return [future.result() for future in futures]
+
+
+def main() -> None:
+    """Test the installs of the local index's packages."""
+    print("Testing installs using local pypi server ...")
+    seed_index()
+    running = get_running_server()
+    state = running or start_in_background(0)
+    start = time.monotonic()
+    try:
+        results = run_matrix(state["port"])
+    finally:
+        if running is None:
+            stop_pypi_server()
+    for result in results:
+        if not result.ok:
+            print(f"\n{result.label} failed:\n{result.output}")
+    for result in results:
+        status = "ok" if result.ok else "FAILED"
+        print(f"{status:<8}{result.seconds:>8.1f}s  {result.label}")
+    failed = sum(1 for result in results if not result.ok)
+    print(
+        f"{len(results) - failed} passed, {failed} failed "
+        f"in {time.monotonic() - start:.1f}s"
+    )
+    if failed or not results:
+        sys.exit(1)
+
 
-print("Testing installs using local pypi server ...")
+if __name__ == "__main__":
+    main()